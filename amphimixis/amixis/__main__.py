@@ -10,6 +10,7 @@ from amphimixis.amixis.console_animation_printer import ConsoleAnimationPrinter
 from amphimixis.amixis.parser import MAIN_EXAMPLES, create_parser
 from amphimixis.core import general
 from amphimixis.core.general.constants import DEFAULT_CONFIG_PATH
+from amphimixis.core.shell.metrics import ShellMetrics
 
 
 def print_help(commands, full=False) -> None:
@@ -27,7 +28,8 @@ def print_help(commands, full=False) -> None:
     )
     print("options:")
     print("  -h, --short-help  show short help without examples")
-    print("  --help           show full help with examples\n")
+    print("  --help           show full help with examples")
+    print("  --metrics FILE   save metrics of shell commands to FILE (.json or .csv)\n")
     print("subcommands:")
     for name, cmd in commands.items():
         print(f"  {name:12} - {cmd.HELP_MESSAGE}")
@@ -78,30 +80,35 @@ def main() -> bool:
             config_file = Path(args.config).expanduser().resolve()
 
     target_events = args.events if hasattr(args, "events") else None
-    match args.command:
-        case "init":
-            return cmd.run_init(args.sample_name)
-        case "run":
-            return cmd.run_full_pipeline(project, config_file, ui, events=target_events)
-        case "analyze":
-            return cmd.run_analyze(project, ui)
-        case "build":
-            return cmd.run_build(project, config_file, ui)
-        case "profile":
-            return cmd.run_profile(project, config_file, ui, events=target_events)
-        case "compare":
-            return cmd.run_compare(
-                args.file1, args.file2, target_events, args.max_rows, ui
-            )
-        case "validate":
-            return cmd.validate_cmd(args, ui)
-        case "clean":
-            return cmd.run_clean(args)
-        case "add":
-            return cmd.run_add(args)
-        case _:
-            parser.print_help()
-            return False
+    try:
+        match args.command:
+            case "init":
+                return cmd.run_init(args.sample_name)
+            case "run":
+                return cmd.run_full_pipeline(
+                    project, config_file, ui, events=target_events
+                )
+            case "analyze":
+                return cmd.run_analyze(project, ui)
+            case "build":
+                return cmd.run_build(project, config_file, ui)
+            case "profile":
+                return cmd.run_profile(project, config_file, ui, events=target_events)
+            case "compare":
+                return cmd.run_compare(
+                    args.file1, args.file2, target_events, args.max_rows, ui
+                )
+            case "validate":
+                return cmd.validate_cmd(args, ui)
+            case "clean":
+                return cmd.run_clean(args)
+            case "add":
+                return cmd.run_add(args)
+            case _:
+                parser.print_help()
+                return False
+    finally:
+        ShellMetrics.export(args.metrics)
 
 
 if __name__ == "__main__":
@@ -3,8 +3,8 @@
 from argparse import ArgumentParser
 
 from amphimixis.amixis.utils import add_config_arg, add_path_arg
-from amphimixis.core import Builder, parse_config
-from amphimixis.core.general import IUI, NULL_UI, Project
+from amphimixis.core import Builder, BuildScheduler, JobsTuner, parse_config
+from amphimixis.core.general import IUI, NULL_UI, Build, Project
 
 HELP_MESSAGE = "Build the project according to the generated configuration files"
 
@@ -32,12 +32,19 @@ def run_build(project: Project, config_file_path: str, ui: IUI = NULL_UI) -> boo
     ):
         return False
 
-    there_are_built = False
-    for build in project.builds:
-        if Builder.build_for_linux(project, build, ui):
-            there_are_built = True
-            ui.mark_success("Build passed!")
+    def show_result(build: Build, success: bool) -> None:
+        if success:
+            ui.mark_success(build_id=build.build_name, message="Build passed!")
         else:
             ui.mark_failed(build_id=build.build_name, error_message="Building failed")
 
-    return there_are_built
+    results = BuildScheduler.run(
+        project,
+        lambda project, build: Builder.build_for_linux(
+            project, build, ui, sync_sources=False
+        ),
+        show_result,
+        lambda project, machine: Builder.sync_sources(project, machine, ui),
+        JobsTuner.choose_jobs,
+    )
+    return any(results)
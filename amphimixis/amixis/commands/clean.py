@@ -1,9 +1,8 @@
 """Clean command."""
 
-import pickle
 from argparse import ArgumentParser, Namespace
 
-from amphimixis.core import Builder
+from amphimixis.core import Builder, BuildRegistry
 from amphimixis.core.general import Build, Project, tools
 
 HELP_MESSAGE = "Clean build directories"
@@ -63,25 +62,24 @@ def interactive_clean() -> bool:
     :return: True if all selected builds were cleaned successfully, False otherwise
     :rtype: bool
     """
-    builds: dict[str, Build] = {}
     project: Project
     try:
         project = tools.get_cache_project()
-        with open(Builder.BUILDS_LIST_FILE_NAME, "rb") as file:
-            builds = pickle.load(file)
     except FileNotFoundError:
-        pass
+        print("Project file .project not found")
+        return False
+    builds = [record.build for record in BuildRegistry.find()]
 
     success = True
     try:
-        for i, build_name in enumerate(builds.keys()):
-            print(f"{i + 1}.\t{build_name}")
+        for i, build in enumerate(builds):
+            print(f"{i + 1}.\t{build.build_name}")
         nums_input = input(
             "Enter the builds numbers to clean (separate by spaces): "
         ).split()
         nums = [int(n) - 1 for n in nums_input]
 
-        for i, build in enumerate(builds.values()):
+        for i, build in enumerate(builds):
             if i in nums:
                 if Builder.clean(project, build):
                     print(f"{build.build_name} was successfully cleaned")
@@ -102,18 +100,15 @@ def run_clean(args: Namespace) -> bool:
     :return: True if command succeeded, False otherwise
     :rtype: bool
     """
-    builds_dict: dict[str, Build] = {}
-    try:
-        with open(Builder.BUILDS_LIST_FILE_NAME, "rb") as f:
-            builds_dict = pickle.load(f)
-    except FileNotFoundError:
-        print("No builds remembered.")
-        return False
-
     if args.all:
-        return clean(*builds_dict.values())
+        builds = [record.build for record in BuildRegistry.find()]
+        if not builds:
+            print("No builds remembered.")
+            return False
+        return clean(*builds)
     if args.build_names:
-        to_clean = [b for b in builds_dict.values() if b.build_name in args.build_names]
+        records = [BuildRegistry.get(name) for name in args.build_names]
+        to_clean = [record.build for record in records if record is not None]
         if not to_clean:
             print("No matching builds found")
             return False
@@ -1,13 +1,17 @@
 """Profile command."""
 
-import shutil
-import tempfile
 from argparse import ArgumentParser
 from os import path
 
 from amphimixis.amixis.utils import add_config_arg, add_path_arg
-from amphimixis.core import Profiler, Shell, parse_config
-from amphimixis.core.general import IUI, NULL_UI, Project
+from amphimixis.core import BuildRegistry, Profiler, Shell, parse_config
+from amphimixis.core.general import IUI, NULL_UI, Build, Project
+from amphimixis.core.shell import (
+    SessionKey,
+    copy_between_machines,
+    session_key,
+    sync_directory,
+)
 
 HELP_MESSAGE = "Profile the performance of builds"
 
@@ -29,40 +33,51 @@ def add_args(parser: ArgumentParser) -> None:
 def setup_profiling_environment(project: Project, ui: IUI) -> bool:
     """Set up the profiling environment by copying the built binaries to the run machines.
 
+    Builds are copied once per pair of build and run machines, straight from
+    the build machine without storing them on the host.
+    The source code is sent once per run machine.
+
     :param Project project: Project instance
     :param IUI ui: User interface for progress display
     :return: True if setup succeeded, False otherwise
     :rtype: bool
     """
     success = True
-    tmpdir = tempfile.mkdtemp("_amphimixis")
+    pairs: dict[tuple[SessionKey, SessionKey], list[Build]] = {}
     for build in project.builds:
         if build.build_machine != build.run_machine:
+            key = (session_key(build.build_machine), session_key(build.run_machine))
+            pairs.setdefault(key, []).append(build)
+
+    synced_run_machines: set[SessionKey] = set()
+    for (_, run_machine_key), builds in pairs.items():
+        for build in builds:
             ui.update_message(build.build_name, "Copying built files to run machine")
-            shell_build_machine = Shell(project, build.build_machine, ui=ui)
-            shell_run_machine = Shell(project, build.run_machine, ui=ui)
+        shell_build_machine = Shell(project, builds[0].build_machine, ui=ui)
+        shell_run_machine = Shell(project, builds[0].run_machine, ui=ui)
+
+        if not copy_between_machines(
+            shell_build_machine,
+            shell_build_machine.get_project_workdir(),
+            [build.build_name for build in builds],
+            shell_run_machine,
+            shell_run_machine.get_project_workdir(),
+        ):
+            ui.mark_failed("Can't transfer built files to run machine")
+            success = False
+
+        if run_machine_key in synced_run_machines or builds[0].run_machine.auth is None:
+            continue
+
+        synced_run_machines.add(run_machine_key)
+        if not sync_directory(
+            shell_run_machine,
+            project.path,
+            path.dirname(shell_run_machine.get_source_dir()),
+        ):
+            ui.mark_failed("Can't transfer source code to run machine")
+            success = False
 
-            build_path = path.join(
-                shell_build_machine.get_project_workdir(), build.build_name
-            )
-            if not shell_build_machine.copy_to_host(build_path, tmpdir):
-                ui.mark_failed("Can't download built files from build machine")
-                success = False
-
-            if not shell_run_machine.copy_to_remote(
-                path.join(tmpdir, build.build_name),
-                shell_run_machine.get_project_workdir(),
-            ):
-                ui.mark_failed("Can't transfer built files to run machine")
-                success = False
-
-            if not shell_run_machine.copy_to_remote(
-                project.path, path.dirname(shell_run_machine.get_source_dir())
-            ):
-                ui.mark_failed("Can't transfer source code to run machine")
-                success = False
-
-    shutil.rmtree(tmpdir)
     return success
 
 
@@ -91,12 +106,30 @@ def run_profile(
     success = True
 
     for build in project.builds:
+        record = BuildRegistry.get(build.build_name)
+        if record is not None and not record.build.successfully_built:
+            ui.send_warning(
+                build.build_name, "Last building has failed, profiling is skipped"
+            )
+            continue
         if not build.successfully_built:
             continue
         profiler_ = Profiler(project, build, ui)
         successful_execs = profiler_.profile_all(events=events)
         profiler_.save_stats()
         profiler_.cleanup()
+        BuildRegistry.record_run(
+            build,
+            successful_execs,
+            [
+                filename
+                for executable in successful_execs
+                for filename in (
+                    profiler_.get_record_filename(executable),
+                    profiler_.get_archive_filename(executable),
+                )
+            ],
+        )
         if not successful_execs or (
             build.executables and successful_execs != build.executables
         ):
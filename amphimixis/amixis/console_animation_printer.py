@@ -1,6 +1,7 @@
 """Single-line spinner for build progress display."""
 
 import sys
+import threading
 
 from amphimixis.core.general import IUI
 
@@ -11,7 +12,11 @@ FG_DEFAULT_COLOR = "\033[39m"
 
 
 class ConsoleAnimationPrinter(IUI):
-    """Single-line console spinner implementation of IUI."""
+    """Single-line console spinner implementation of IUI.
+
+    Builds report their progress from the threads of `BuildScheduler`,
+    so the state and the line are changed under a lock.
+    """
 
     braille: list[str] = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
     build_id: str
@@ -20,6 +25,8 @@ class ConsoleAnimationPrinter(IUI):
     status: str
 
     def __init__(self):
+        # reentrant, marking draws the line under the same lock
+        self._lock = threading.RLock()
         self.build_id = ""
         self.index = 0
         self.message = ""
@@ -31,9 +38,10 @@ class ConsoleAnimationPrinter(IUI):
         :param str sender: Identifier name of sender module
         :param str message: Message to user
         """
-        word_len = len(sender) + INVITATION_TEMPLATE_LEN
-        to_insert = f"\n{" " * word_len}"
-        print(f"\r\033[K[{sender}][I] {message.replace("\n", to_insert)}")
+        with self._lock:
+            word_len = len(sender) + INVITATION_TEMPLATE_LEN
+            to_insert = f"\n{" " * word_len}"
+            print(f"\r\033[K[{sender}][I] {message.replace("\n", to_insert)}")
 
     def send_warning(self, sender: str, warning: str) -> None:
         """Print warning to user with status mark 'W' and 'WARNING: ' in begin of message.
@@ -41,12 +49,13 @@ class ConsoleAnimationPrinter(IUI):
         :param str sender: Identifier name of sender module
         :param str warning: Warning to user
         """
-        word_len = len(sender) + INVITATION_TEMPLATE_LEN
-        to_insert = f"\n{" " * word_len}"
-        print(
-            f"\r\033[K{FG_YELLOW_COLOR}[{sender}][W] WARNING: "
-            f"{warning.replace("\n", to_insert)}{FG_DEFAULT_COLOR}"
-        )
+        with self._lock:
+            word_len = len(sender) + INVITATION_TEMPLATE_LEN
+            to_insert = f"\n{" " * word_len}"
+            print(
+                f"\r\033[K{FG_YELLOW_COLOR}[{sender}][W] WARNING: "
+                f"{warning.replace("\n", to_insert)}{FG_DEFAULT_COLOR}"
+            )
 
     def send_error(self, sender: str, error: str) -> None:
         """Print error to user with status mark 'E' and 'ERROR: ' in begin of message.
@@ -54,12 +63,13 @@ class ConsoleAnimationPrinter(IUI):
         :param str sender: Identifier name of sender module
         :param str error: Error message to user
         """
-        word_len = len(sender) + INVITATION_TEMPLATE_LEN
-        to_insert = f"\n{" " * word_len}"
-        print(
-            f"\r\033[K{FG_RED_COLOR}[{sender}][E] ERROR: "
-            f"{error.replace("\n", to_insert)}{FG_DEFAULT_COLOR}"
-        )
+        with self._lock:
+            word_len = len(sender) + INVITATION_TEMPLATE_LEN
+            to_insert = f"\n{" " * word_len}"
+            print(
+                f"\r\033[K{FG_RED_COLOR}[{sender}][E] ERROR: "
+                f"{error.replace("\n", to_insert)}{FG_DEFAULT_COLOR}"
+            )
 
     def update_message(self, build_id: str, message: str) -> None:
         """Update build_id and message.
@@ -67,18 +77,20 @@ class ConsoleAnimationPrinter(IUI):
         :param str build_id: Build identifier
         :param str message: Message describing current build phase
         """
-        if self.build_id != build_id:
-            self.status = "running"
-            self.index = 0
+        with self._lock:
+            if self.build_id != build_id:
+                self.status = "running"
+                self.index = 0
 
-        self.build_id = build_id
-        self.message = message
-        self.draw()
+            self.build_id = build_id
+            self.message = message
+            self.draw()
 
     def step(self) -> None:
         """Move to next spinner."""
-        self.index = (self.index + 1) % len(self.braille)
-        self.draw()
+        with self._lock:
+            self.index = (self.index + 1) % len(self.braille)
+            self.draw()
 
     def mark_success(self, message: str = "", build_id: str = "") -> None:
         """Mark as successful.
@@ -86,15 +98,16 @@ class ConsoleAnimationPrinter(IUI):
         :param str message: message to display. If empty, leaves the previous message
         :param str build_id: Build identifier. If empty, leaves the previous identifier
         """
-        self.status = "success"
-        if build_id:
-            self.build_id = build_id
+        with self._lock:
+            self.status = "success"
+            if build_id:
+                self.build_id = build_id
 
-        if message:
-            self.message = message
+            if message:
+                self.message = message
 
-        self.draw()
-        self.finalize()
+            self.draw()
+            self.finalize()
 
     def mark_failed(self, error_message: str = "", build_id: str = "") -> None:
         """Mark as failed and optionally update message.
@@ -102,30 +115,33 @@ class ConsoleAnimationPrinter(IUI):
         :param str error_message: Message for failed build (if empty, keep previous)
         :param str build_id: Build identifier. If empty, leaves the previous identifier
         """
-        self.status = "failed"
+        with self._lock:
+            self.status = "failed"
 
-        if build_id:
-            self.build_id = build_id
+            if build_id:
+                self.build_id = build_id
 
-        if error_message:
-            self.message = error_message
+            if error_message:
+                self.message = error_message
 
-        self.draw()
-        self.finalize()
+            self.draw()
+            self.finalize()
 
     def draw(self) -> None:
         """Draw current state to stdout."""
-        if self.status == "success":
-            symbol = "✓"
-        elif self.status == "failed":
-            symbol = "✗"
-        else:
-            symbol = self.braille[self.index]
+        with self._lock:
+            if self.status == "success":
+                symbol = "✓"
+            elif self.status == "failed":
+                symbol = "✗"
+            else:
+                symbol = self.braille[self.index]
 
-        sys.stdout.write(f"\r\033[K[{self.build_id}][{symbol}] {self.message}")
-        sys.stdout.flush()
+            sys.stdout.write(f"\r\033[K[{self.build_id}][{symbol}] {self.message}")
+            sys.stdout.flush()
 
     def finalize(self) -> None:
         """Move to next line."""
-        sys.stdout.write("\n")
-        sys.stdout.flush()
+        with self._lock:
+            sys.stdout.write("\n")
+            sys.stdout.flush()
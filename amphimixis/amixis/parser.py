@@ -4,6 +4,7 @@ import argparse
 from argparse import ArgumentParser
 
 from amphimixis.amixis.commands import COMMANDS
+from amphimixis.core.general.constants import SHELL_METRICS_FILE_NAME
 
 MAIN_EXAMPLES = """
 Examples:
@@ -138,6 +139,13 @@ def create_parser() -> ArgumentParser:
         dest="full_help",
         help="show full help with examples",
     )
+    parser.add_argument(
+        "--metrics",
+        default=SHELL_METRICS_FILE_NAME,
+        metavar="FILE",
+        help="file to save metrics of shell commands and copies to, "
+        f"CSV if it ends with .csv, JSON otherwise (default: {SHELL_METRICS_FILE_NAME})",
+    )
 
     subparsers = parser.add_subparsers(
         dest="command",
@@ -5,6 +5,7 @@ CONFIG_TEMPLATE = """# Amphimixis Configuration Template
 
 # build_system:                 # Optional
 # runner:                       # Low-level build system (optional)
+# max_parallel_builds:          # Builds running at once on all machines (default: no limit)
 
 platforms:
 - id: 1                         # Unique platform id
@@ -13,6 +14,8 @@ platforms:
 #   username:                   # SSH username (required for remote)
 #   password:                   # SSH password (or use SSH keys)
 #   port: 22                    # SSH port (optional, default: 22)
+#   max_builds: 1               # Builds running at once on this machine (default: 1)
+#   transfer: rsync             # Copying files: rsync or sftp over the SSH session (default: rsync)
 
 recipes:
 - id: 1                                              # Unique recipe id
@@ -22,7 +25,12 @@ recipes:
 #   toolchain:                                       # Toolchain configuration (dict or name)
 #     cxx_compiler:
 #   sysroot:                                         # Path to system headers/libraries
-#   jobs:                                            # Number of parallel jobs (default: determined by build system)
+#   jobs:                                            # Number of parallel jobs (default: chosen from processors and memory)
+#   build_timeout:                                   # Seconds allowed for building (default: no limit)
+#   run_timeout:                                     # Seconds allowed for each run of an executable (default: no limit)
+#   compiler_cache:                                  # ccache or sccache (default: compilers run directly)
+#   incremental: false                               # Reuse configuration and object files of the previous build
+#   time_trace: false                                # Merge clang -ftime-trace files of the build
 
 # Reusable executables list (YAML anchor)
 # executables: &common_exe
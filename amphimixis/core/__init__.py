@@ -2,6 +2,9 @@
 
 from amphimixis.core import general
 from amphimixis.core.analyzer import analyze
+from amphimixis.core.build_cache import BuildCache
+from amphimixis.core.build_registry import BuildRegistry
+from amphimixis.core.build_scheduler import BuildScheduler
 from amphimixis.core.build_systems import build_systems_dict
 from amphimixis.core.builder import Builder
 from amphimixis.core.configurator import (
@@ -10,6 +13,7 @@ from amphimixis.core.configurator import (
     create_toolchain,
     parse_config,
 )
+from amphimixis.core.jobs_tuner import JobsTuner
 from amphimixis.core.laboratory_assistant import LaboratoryAssistant
 from amphimixis.core.profiler import Profiler
 from amphimixis.core.shell import Shell
@@ -25,6 +29,10 @@ __all__ = [
     "create_toolchain",
     "parse_config",
     "Builder",
+    "BuildCache",
+    "BuildRegistry",
+    "BuildScheduler",
+    "JobsTuner",
     "Profiler",
     "Shell",
     "LaboratoryAssistant",
@@ -0,0 +1,245 @@
+"""Module that detects builds whose output on the build machine is up to date."""
+
+import hashlib
+import json
+import os
+import pickle
+import shlex
+import threading
+from typing import Any
+
+from amphimixis.core import logger
+from amphimixis.core.general import Build, Project
+from amphimixis.core.general.constants import (
+    ANALYZED_FILE_NAME,
+    BUILD_LOG_EXT,
+    BUILD_REGISTRY_FILE_NAME,
+    BUILD_TIMES_EXT,
+    BUILD_TRACE_EXT,
+    PERF_ARCHIVE_EXT,
+    PERF_RECORD_EXT,
+    PERF_SCRIPT_EXT,
+    PERF_STATS_EXT,
+    SHELL_METRICS_FILE_NAME,
+    SOURCE_STATES_FILE_NAME,
+    SYNC_MANIFEST_EXT,
+    TIME_TRACE_EXT,
+)
+from amphimixis.core.shell import Shell
+from amphimixis.core.shell.source_sync import SyncManifest, scan_directory
+
+_logger = logger.setup_logger("BUILD_CACHE")
+
+# files written by amphimixis to its working directory, which may be inside the project
+_OUTPUT_NAMES = frozenset(
+    {
+        ".builds",
+        BUILD_REGISTRY_FILE_NAME,
+        f"{BUILD_REGISTRY_FILE_NAME}-journal",
+        logger.LOG_FILE_NAME,
+        ANALYZED_FILE_NAME,
+        SHELL_METRICS_FILE_NAME,
+        SOURCE_STATES_FILE_NAME,
+    }
+)
+_OUTPUT_SUFFIXES = (
+    BUILD_LOG_EXT,
+    BUILD_TIMES_EXT,
+    BUILD_TRACE_EXT,
+    PERF_ARCHIVE_EXT,
+    PERF_RECORD_EXT,
+    PERF_SCRIPT_EXT,
+    PERF_STATS_EXT,
+    SYNC_MANIFEST_EXT,
+    TIME_TRACE_EXT,
+)
+
+
+class BuildCache:
+    """Keys identifying the output of a build.
+
+    The key of a successful build is saved to `BUILD_KEY_FILE_NAME` in its folder
+    on the build machine. The build is skipped while the key stays the same
+    and its executables exist.
+    """
+
+    BUILD_KEY_FILE_NAME = ".amphimixis_build_key"
+    # changed when the content of the key changes
+    KEY_VERSION = 2
+
+    _states_lock = threading.Lock()
+
+    @staticmethod
+    def build_key(project: Project, build: Build) -> str | None:
+        """Compute the key of the build.
+
+        The key covers the sources of the project, the recipe of the build
+        (`config_flags`, `compiler_flags`, `toolchain`, `sysroot`, `compiler_cache`
+        and `incremental`), the build system with its runner
+        and the architectures of the machines. The number of jobs is left out,
+        it doesn't change the output and is chosen anew on every run.
+
+        :param Project project: project of the build
+        :param Build build: the build
+        :rtype: str | None
+        :return: SHA-256 of the key in hex, None if the sources can't be read
+        """
+        try:
+            sources = BuildCache.source_digest(project)
+        except OSError as e:
+            _logger.warning("Can't hash sources of %s: %s", project.path, e)
+            return None
+
+        recipe: dict[str, Any] = {
+            "version": BuildCache.KEY_VERSION,
+            "sources": sources,
+            "build_system": type(project.build_system).__name__,
+            "runner": type(getattr(project.build_system, "runner", None)).__name__,
+            **BuildCache._recipe(build),
+        }
+        return hashlib.sha256(json.dumps(recipe, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def recipe_hash(build: Build) -> str:
+        """Hash the recipe of the build.
+
+        The hash covers `config_flags`, `compiler_flags`, `toolchain`, `sysroot`,
+        `compiler_cache`, `incremental` and the architectures of the machines,
+        builds of one recipe share it.
+
+        :param Build build: the build
+        :rtype: str
+        :return: SHA-256 of the recipe in hex
+        """
+        recipe = BuildCache._recipe(build)
+        return hashlib.sha256(json.dumps(recipe, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def source_digest(project: Project) -> str:
+        """Hash the sources of the project.
+
+        Hashes of files are saved to `SOURCE_STATES_FILE_NAME` in the working directory,
+        so only files whose size or modification time has changed are read again.
+        Builds and other files written by amphimixis are skipped
+        if the working directory is inside the project.
+
+        :param Project project: the project
+        :rtype: str
+        :return: SHA-256 of paths and contents of the files in hex
+        :raises OSError: if the sources can't be read
+        """
+        source = os.path.abspath(project.path)
+        with BuildCache._states_lock:
+            states = BuildCache._load_states()
+            state, _ = scan_directory(
+                source,
+                states.get(source, SyncManifest()),
+                BuildCache._local_outputs(project),
+            )
+            states[source] = state
+            BuildCache._save_states(states)
+
+        digest = hashlib.sha256()
+        for path in sorted(state.files):
+            digest.update(f"{path}\0{state.files[path].digest}\n".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def is_up_to_date(shell: Shell, build: Build, path: str, key: str) -> bool:
+        """Check that the build folder on the machine holds the output for the key.
+
+        :param Shell shell: shell of the build machine
+        :param Build build: the build
+        :param str path: path to the folder of the build on the machine
+        :param str key: key of the build, see `build_key`
+        :rtype: bool
+        :return: True if the saved key matches and all executables exist
+        """
+        checks = [
+            f"cat {shlex.quote(os.path.join(path, BuildCache.BUILD_KEY_FILE_NAME))}"
+        ]
+        checks.extend(
+            f"test -e {shlex.quote(os.path.join(path, executable))}"
+            for executable in build.executables
+        )
+        error, stdout, _ = shell.execute(" && ".join(checks))
+        return error == 0 and "".join(stdout).strip() == key
+
+    @staticmethod
+    def store(shell: Shell, path: str, key: str) -> bool:
+        """Save the key of a successful build to its folder on the machine.
+
+        :param Shell shell: shell of the build machine
+        :param str path: path to the folder of the build on the machine
+        :param str key: key of the build, see `build_key`
+        :rtype: bool
+        :return: True if the key has been saved
+        """
+        key_file = shlex.quote(os.path.join(path, BuildCache.BUILD_KEY_FILE_NAME))
+        error, _, stderr = shell.execute(f"echo {key} > {key_file}")
+        if error != 0:
+            _logger.warning("Can't save the build key to %s: %s", path, "".join(stderr))
+        return error == 0
+
+    @staticmethod
+    def invalidate(shell: Shell, path: str) -> None:
+        """Remove the key from the folder of a build before its output is changed.
+
+        :param Shell shell: shell of the build machine
+        :param str path: path to the folder of the build on the machine
+        """
+        key_file = shlex.quote(os.path.join(path, BuildCache.BUILD_KEY_FILE_NAME))
+        shell.execute(f"rm -f {key_file}")
+
+    @staticmethod
+    def _local_outputs(project: Project) -> set[str]:
+        workdir = os.path.relpath(os.getcwd(), os.path.abspath(project.path))
+        if workdir == os.pardir or workdir.startswith(os.pardir + os.sep):
+            return set()
+
+        outputs = {
+            os.path.normpath(os.path.join(workdir, build.build_name))
+            for build in project.builds
+        }
+        outputs.update(
+            os.path.normpath(os.path.join(workdir, name))
+            for name in os.listdir(os.getcwd())
+            if name in _OUTPUT_NAMES or name.endswith(_OUTPUT_SUFFIXES)
+        )
+        return outputs
+
+    @staticmethod
+    def _load_states() -> dict[str, SyncManifest]:
+        try:
+            with open(SOURCE_STATES_FILE_NAME, "rb") as file:
+                return pickle.load(file)
+        except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+            return {}
+
+    @staticmethod
+    def _save_states(states: dict[str, SyncManifest]) -> None:
+        with open(SOURCE_STATES_FILE_NAME, "wb") as file:
+            pickle.dump(states, file)
+
+    @staticmethod
+    def _recipe(build: Build) -> dict[str, Any]:
+        return {
+            "config_flags": build.config_flags,
+            "compiler_flags": (
+                build.compiler_flags.data if build.compiler_flags is not None else None
+            ),
+            "toolchain": (
+                {
+                    "name": build.toolchain.name,
+                    "sysroot": build.toolchain.sysroot,
+                    "attrs": build.toolchain.data,
+                }
+                if build.toolchain is not None
+                else None
+            ),
+            "sysroot": build.sysroot,
+            "compiler_cache": build.compiler_cache,
+            "incremental": build.incremental,
+            "build_arch": build.build_machine.arch.value,
+            "run_arch": build.run_machine.arch.value,
+        }
@@ -0,0 +1,423 @@
+"""Module remembering builds and their profiling runs in an SQLite database."""
+
+import json
+import os
+import pickle
+import sqlite3
+import time
+from collections.abc import Iterator
+from contextlib import closing, contextmanager, suppress
+from dataclasses import dataclass
+
+from amphimixis.core import logger
+from amphimixis.core.build_cache import BuildCache
+from amphimixis.core.general import Build, BuildResources, MachineInfo
+from amphimixis.core.general.constants import BUILD_REGISTRY_FILE_NAME
+from amphimixis.core.general.tools import (
+    build_log_filename,
+    build_times_filename,
+    build_trace_filename,
+    time_trace_filename,
+)
+
+_logger = logger.setup_logger("BUILD_REGISTRY")
+
+# file the builds were pickled to before the registry, imported on the first use
+LEGACY_BUILDS_FILE_NAME = ".builds"
+
+# seconds to wait for another writer to finish its transaction
+_BUSY_TIMEOUT = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    build_name TEXT PRIMARY KEY,
+    build_machine TEXT NOT NULL,
+    run_machine TEXT NOT NULL,
+    recipe_hash TEXT NOT NULL,
+    successfully_built INTEGER NOT NULL,
+    finished_at REAL NOT NULL,
+    duration_s REAL,
+    build_path TEXT,
+    artifacts TEXT NOT NULL,
+    build BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS builds_by_machine ON builds (build_machine);
+CREATE INDEX IF NOT EXISTS builds_by_recipe ON builds (recipe_hash);
+CREATE TABLE IF NOT EXISTS buildings (
+    id INTEGER PRIMARY KEY,
+    build_name TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    timed INTEGER NOT NULL,
+    jobs INTEGER,
+    duration_s REAL,
+    peak_memory_kb INTEGER,
+    oom_killed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buildings_by_build ON buildings (build_name);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    build_name TEXT NOT NULL,
+    run_machine TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    executables TEXT NOT NULL,
+    profiled TEXT NOT NULL,
+    artifacts TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_build ON runs (build_name);
+"""
+
+_UPSERT_BUILD = """
+INSERT INTO builds VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (build_name) DO UPDATE SET
+    build_machine = excluded.build_machine,
+    run_machine = excluded.run_machine,
+    recipe_hash = excluded.recipe_hash,
+    successfully_built = excluded.successfully_built,
+    finished_at = excluded.finished_at,
+    duration_s = COALESCE(excluded.duration_s, builds.duration_s),
+    build_path = COALESCE(excluded.build_path, builds.build_path),
+    artifacts = excluded.artifacts,
+    build = excluded.build
+"""
+
+_BUILD_COLUMNS = (
+    "build, build_machine, recipe_hash, finished_at, duration_s, build_path, artifacts"
+)
+
+
+@dataclass
+class BuildRecord:
+    """A build remembered by the registry.
+
+    :var Build build: the build as it was after its last building
+    :var str build_machine: machine the build is on, see `machine_id`
+    :var str recipe_hash: hash of the recipe, see `BuildCache.recipe_hash`
+    :var float finished_at: time the last building finished, seconds since the epoch
+    :var float | None duration_s: wall time of the last building that has run,
+        None if it is unknown
+    :var str | None build_path: folder of the build on the build machine
+    :var list[str] artifacts: local files written by building
+    """
+
+    build: Build
+    build_machine: str
+    recipe_hash: str
+    finished_at: float
+    duration_s: float | None
+    build_path: str | None
+    artifacts: list[str]
+
+
+@dataclass
+class RunRecord:
+    """A profiling run of a build remembered by the registry.
+
+    :var str build_name: name of the profiled build
+    :var str run_machine: machine the executables ran on, see `machine_id`
+    :var float finished_at: time profiling finished, seconds since the epoch
+    :var list[str] executables: executables that had to be profiled
+    :var list[str] profiled: executables whose profiling succeeded
+    :var list[str] artifacts: local files written by profiling
+    """
+
+    build_name: str
+    run_machine: str
+    finished_at: float
+    executables: list[str]
+    profiled: list[str]
+    artifacts: list[str]
+
+
+class BuildRegistry:
+    """Builds, their buildings and profiling runs saved to `BUILD_REGISTRY_FILE_NAME`.
+
+    The database is in the working directory. Every change is one transaction,
+    so builders running at once in threads or processes don't lose the changes
+    of each other.
+    """
+
+    @staticmethod
+    def remember(build: Build, build_path: str | None = None) -> None:
+        """Save the build after its building, successful or not.
+
+        `Build.resources` of a building that has run are added to the history
+        of the build, see `resources`.
+
+        :param Build build: the build
+        :param str | None build_path: folder of the build on the build machine,
+            None to keep the saved one
+        """
+        artifacts = [
+            os.path.abspath(name)
+            for name in (
+                build_log_filename(build.build_name),
+                build_times_filename(build.build_name),
+                build_trace_filename(build.build_name),
+                time_trace_filename(build.build_name),
+            )
+            if os.path.exists(name)
+        ]
+        finished_at = time.time()
+        resources = build.resources
+        with BuildRegistry._connect() as connection:
+            connection.execute(
+                _UPSERT_BUILD,
+                BuildRegistry._build_row(
+                    build,
+                    finished_at,
+                    resources.seconds if resources is not None else None,
+                    build_path,
+                    artifacts,
+                ),
+            )
+            if resources is not None:
+                connection.execute(
+                    "INSERT INTO buildings (build_name, finished_at, timed, jobs, "
+                    "duration_s, peak_memory_kb, oom_killed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        build.build_name,
+                        finished_at,
+                        int(BuildRegistry._timed(build)),
+                        resources.jobs,
+                        resources.seconds,
+                        resources.peak_memory_kb,
+                        int(resources.oom_killed),
+                    ),
+                )
+
+    @staticmethod
+    def forget(build_name: str) -> None:
+        """Remove the build, its profiling runs are kept.
+
+        :param str build_name: name of the build
+        """
+        with BuildRegistry._connect() as connection:
+            connection.execute("DELETE FROM builds WHERE build_name = ?", (build_name,))
+
+    @staticmethod
+    def get(build_name: str) -> BuildRecord | None:
+        """Find the build by its name.
+
+        :param str build_name: name of the build
+        :rtype: BuildRecord | None
+        :return: the build, None if it is not remembered
+        """
+        with BuildRegistry._connect() as connection:
+            row = connection.execute(
+                f"SELECT {_BUILD_COLUMNS} FROM builds WHERE build_name = ?",
+                (build_name,),
+            ).fetchone()
+        return BuildRegistry._build_record(row) if row is not None else None
+
+    @staticmethod
+    def find(
+        build_machine: MachineInfo | None = None,
+        recipe_hash: str | None = None,
+        successfully_built: bool | None = None,
+    ) -> list[BuildRecord]:
+        """Find the builds matching all the given conditions.
+
+        :param MachineInfo | None build_machine: machine the builds are on
+        :param str | None recipe_hash: hash of the recipe of the builds
+        :param bool | None successfully_built: result of the last building
+        :rtype: list[BuildRecord]
+        :return: the builds ordered by name
+        """
+        conditions = []
+        parameters: list[str | int] = []
+        if build_machine is not None:
+            conditions.append("build_machine = ?")
+            parameters.append(machine_id(build_machine))
+        if recipe_hash is not None:
+            conditions.append("recipe_hash = ?")
+            parameters.append(recipe_hash)
+        if successfully_built is not None:
+            conditions.append("successfully_built = ?")
+            parameters.append(int(successfully_built))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with BuildRegistry._connect() as connection:
+            rows = connection.execute(
+                f"SELECT {_BUILD_COLUMNS} FROM builds {where} ORDER BY build_name",
+                parameters,
+            ).fetchall()
+        return [BuildRegistry._build_record(row) for row in rows]
+
+    @staticmethod
+    def resources(build_name: str, count: int) -> list[BuildResources]:
+        """Get the resources used by the last buildings of the build.
+
+        Wall time is None if the building has failed or has reused the work
+        of the previous buildings, as it doesn't tell how fast the jobs are.
+
+        :param str build_name: name of the build
+        :param int count: maximum number of buildings
+        :rtype: list[BuildResources]
+        :return: the resources, the oldest first
+        """
+        with BuildRegistry._connect() as connection:
+            rows = connection.execute(
+                "SELECT jobs, CASE WHEN timed THEN duration_s END, peak_memory_kb, "
+                "oom_killed FROM buildings WHERE build_name = ? "
+                "ORDER BY id DESC LIMIT ?",
+                (build_name, count),
+            ).fetchall()
+        return [
+            BuildResources(jobs, seconds, peak_memory_kb, bool(oom_killed))
+            for jobs, seconds, peak_memory_kb, oom_killed in reversed(rows)
+        ]
+
+    @staticmethod
+    def record_run(build: Build, profiled: list[str], artifacts: list[str]) -> None:
+        """Save a profiling run of the build.
+
+        :param Build build: the profiled build
+        :param list[str] profiled: executables whose profiling succeeded
+        :param list[str] artifacts: local files written by profiling,
+            only the existing ones are saved
+        """
+        with BuildRegistry._connect() as connection:
+            connection.execute(
+                "INSERT INTO runs (build_name, run_machine, finished_at, executables, "
+                "profiled, artifacts) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    build.build_name,
+                    machine_id(build.run_machine),
+                    time.time(),
+                    json.dumps(build.executables),
+                    json.dumps(profiled),
+                    json.dumps(
+                        [
+                            os.path.abspath(name)
+                            for name in artifacts
+                            if os.path.exists(name)
+                        ]
+                    ),
+                ),
+            )
+
+    @staticmethod
+    def runs(build_name: str) -> list[RunRecord]:
+        """Get the profiling runs of the build.
+
+        :param str build_name: name of the build
+        :rtype: list[RunRecord]
+        :return: the runs, the oldest first
+        """
+        with BuildRegistry._connect() as connection:
+            rows = connection.execute(
+                "SELECT build_name, run_machine, finished_at, executables, profiled, "
+                "artifacts FROM runs WHERE build_name = ? ORDER BY id",
+                (build_name,),
+            ).fetchall()
+        return [
+            RunRecord(
+                name,
+                run_machine,
+                finished_at,
+                json.loads(executables),
+                json.loads(profiled),
+                json.loads(artifacts),
+            )
+            for name, run_machine, finished_at, executables, profiled, artifacts in rows
+        ]
+
+    @staticmethod
+    @contextmanager
+    def _connect() -> Iterator[sqlite3.Connection]:
+        with closing(
+            sqlite3.connect(BUILD_REGISTRY_FILE_NAME, timeout=_BUSY_TIMEOUT)
+        ) as connection:
+            connection.executescript(_SCHEMA)
+            BuildRegistry._import_legacy(connection)
+            # commits the transaction, or rolls it back on an exception
+            with connection:
+                yield connection
+
+    @staticmethod
+    def _import_legacy(connection: sqlite3.Connection) -> None:
+        try:
+            with open(LEGACY_BUILDS_FILE_NAME, "rb") as file:
+                builds: dict[str, Build] = pickle.load(file)
+        except FileNotFoundError:
+            return
+        except (pickle.UnpicklingError, EOFError, AttributeError) as e:
+            _logger.warning("Can't import %s: %s", LEGACY_BUILDS_FILE_NAME, e)
+            return
+
+        with connection:
+            # builds remembered by the registry are newer than the imported ones
+            connection.executemany(
+                "INSERT OR IGNORE INTO builds VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    BuildRegistry._build_row(build, time.time(), None, None, [])
+                    for build in builds.values()
+                ],
+            )
+        with suppress(FileNotFoundError):
+            os.remove(LEGACY_BUILDS_FILE_NAME)
+        _logger.info("Imported %d builds from %s", len(builds), LEGACY_BUILDS_FILE_NAME)
+
+    @staticmethod
+    def _timed(build: Build) -> bool:
+        reused = (build.incremental and build.rebuild_reason is None) or (
+            build.compiler_cache_stats is not None
+            and build.compiler_cache_stats.hits > 0
+        )
+        return build.successfully_built and not reused
+
+    @staticmethod
+    def _build_row(
+        build: Build,
+        finished_at: float,
+        duration: float | None,
+        build_path: str | None,
+        artifacts: list[str],
+    ) -> tuple:
+        return (
+            build.build_name,
+            machine_id(build.build_machine),
+            machine_id(build.run_machine),
+            BuildCache.recipe_hash(build),
+            int(build.successfully_built),
+            finished_at,
+            duration,
+            build_path,
+            json.dumps(artifacts),
+            pickle.dumps(build),
+        )
+
+    @staticmethod
+    def _build_record(row: tuple) -> BuildRecord:
+        (
+            build,
+            build_machine,
+            recipe_hash,
+            finished_at,
+            duration,
+            build_path,
+            artifacts,
+        ) = row
+        return BuildRecord(
+            pickle.loads(build),
+            build_machine,
+            recipe_hash,
+            finished_at,
+            duration,
+            build_path,
+            json.loads(artifacts),
+        )
+
+
+def machine_id(machine: MachineInfo) -> str:
+    """Get the identifier of the machine saved by the registry.
+
+    :param MachineInfo machine: the machine
+    :rtype: str
+    :return: `user@address:port`, `localhost` for the local machine
+    """
+    if machine.auth is None:
+        return machine.address or "localhost"
+
+    return f"{machine.auth.username}@{machine.address}:{machine.auth.port}"
@@ -0,0 +1,249 @@
+"""Module that runs builds of a project concurrently on their build machines."""
+
+import dataclasses
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import paramiko
+
+from amphimixis.core import logger
+from amphimixis.core.general import Build, MachineInfo, Project
+from amphimixis.core.shell import SessionKey, Shell, session_key
+
+_logger = logger.setup_logger("SCHEDULER")
+
+# fields of `Build` set by building, copied back from the build with split jobs
+_RESULT_FIELDS = (
+    "successfully_built",
+    "timed_out",
+    "compiler_cache_stats",
+    "rebuild_reason",
+    "target_times",
+    "time_trace_summary",
+    "resources",
+)
+
+
+class BuildScheduler:
+    """Run builds of a project at the same time within the concurrency limits.
+
+    At most `MachineInfo.max_builds` builds run on one build machine,
+    only one if the build system builds in the sources,
+    and at most `Project.max_parallel_builds` builds run at all.
+    Builds start in the order of `Project.builds` once their machine has a free slot.
+    """
+
+    @staticmethod
+    def run(
+        project: Project,
+        build_function: Callable[[Project, Build], bool],
+        on_finished: Callable[[Build, bool], None] | None = None,
+        prepare_machine: Callable[[Project, MachineInfo], bool] | None = None,
+        choose_jobs: Callable[[Project, Build, int], int | None] | None = None,
+    ) -> list[bool]:
+        """Run all builds of the project.
+
+        When several builds run on one machine, `jobs` of each of them is
+        divided by their number, see `split_jobs`. Builds without `jobs`
+        get them from `choose_jobs` if it is set. `Build` objects of the project
+        are not changed, except for the results of building:
+        `successfully_built`, `timed_out`, `compiler_cache_stats`, `rebuild_reason`,
+        `target_times`, `time_trace_summary` and `resources`.
+
+        :param Project project: project whose builds must be built
+        :param Callable[[Project, Build], bool] build_function: builds one build,
+            returns True on success, e.g. `Builder.build_for_linux`
+        :param Callable[[Build, bool], None] | None on_finished: called with a build
+            and its result once it has finished
+        :param Callable[[Project, MachineInfo], bool] | None prepare_machine: called
+            once for every build machine before its first build starts,
+            e.g. `Builder.sync_sources`. Builds of the machine wait for it
+            and fail without being started if it returns False.
+        :param Callable[[Project, Build, int], int | None] | None choose_jobs: called
+            with a build without `jobs` and the number of builds running on its
+            machine at once, returns the jobs of the build, e.g. `JobsTuner.choose_jobs`
+        :rtype: list[bool]
+        :return: results of the builds in the order of `Project.builds`
+        :raises Exception: the first exception raised by `build_function`
+            or `prepare_machine`, after the other started tasks have finished
+        """
+        return _Schedule(
+            project, build_function, on_finished, prepare_machine, choose_jobs
+        ).run()
+
+    @staticmethod
+    def concurrency(project: Project) -> dict[SessionKey, int]:
+        """Get the number of builds that run at once on each build machine.
+
+        :param Project project: project with builds
+        :rtype: dict[SessionKey, int]
+        :return: number of concurrent builds by the key of the build machine
+        """
+        counts = Counter(session_key(build.build_machine) for build in project.builds)
+        limit = project.max_parallel_builds or len(project.builds)
+        concurrency: dict[SessionKey, int] = {}
+        for build in project.builds:
+            key = session_key(build.build_machine)
+            concurrency[key] = max(
+                1,
+                min(
+                    BuildScheduler.max_builds(project, build.build_machine),
+                    counts[key],
+                    limit,
+                ),
+            )
+        return concurrency
+
+    @staticmethod
+    def max_builds(project: Project, machine: MachineInfo) -> int:
+        """Get the number of builds of the project allowed to run at once on the machine.
+
+        :param Project project: project with builds
+        :param MachineInfo machine: build machine
+        :rtype: int
+        :return: `MachineInfo.max_builds`, 1 if builds of the build system
+            would overwrite each other in the shared sources
+        """
+        if project.build_system.builds_in_sources:
+            return 1
+
+        return machine.max_builds
+
+    @staticmethod
+    def split_jobs(jobs: int | None, nproc: int, concurrent: int) -> int | None:
+        """Get the number of jobs of one of the builds running on a machine at once.
+
+        :param int | None jobs: jobs of the build, None if the build system chooses it
+        :param int nproc: number of processors of the machine
+        :param int concurrent: number of builds running on the machine at once
+        :rtype: int | None
+        :return: `jobs`, or the processors if they are not set, divided between
+            the builds, at least 1. `jobs` unchanged if the build runs alone.
+        """
+        if concurrent <= 1:
+            return jobs
+
+        return max(1, (jobs or nproc) // concurrent)
+
+
+class _Schedule:
+    """State of one `BuildScheduler.run`."""
+
+    def __init__(
+        self,
+        project: Project,
+        build_function: Callable[[Project, Build], bool],
+        on_finished: Callable[[Build, bool], None] | None,
+        prepare_machine: Callable[[Project, MachineInfo], bool] | None,
+        choose_jobs: Callable[[Project, Build, int], int | None] | None,
+    ) -> None:
+        self._project = project
+        self._build_function = build_function
+        self._on_finished = on_finished
+        self._prepare_machine = prepare_machine
+        self._choose_jobs = choose_jobs
+        self._concurrency = BuildScheduler.concurrency(project)
+        self._limit = project.max_parallel_builds or len(project.builds) or 1
+        self._pending = list(range(len(project.builds)))
+        self._results: list[bool] = [False] * len(project.builds)
+        self._running: dict[Future, int] = {}
+        self._preparing: dict[Future, SessionKey] = {}
+        self._prepared: dict[SessionKey, bool] = {}
+        self._busy: Counter[SessionKey] = Counter()
+        self._error: BaseException | None = None
+
+    def run(self) -> list[bool]:
+        """Run the builds, see `BuildScheduler.run`."""
+        with ThreadPoolExecutor(max_workers=self._limit) as executor:
+            while self._pending or self._running or self._preparing:
+                self._start(executor)
+                if self._running or self._preparing:
+                    done, _ = wait(
+                        [*self._running, *self._preparing],
+                        return_when=FIRST_COMPLETED,
+                    )
+                    for future in done:
+                        self._collect(future)
+
+        if self._error is not None:
+            raise self._error
+
+        return self._results
+
+    def _start(self, executor: ThreadPoolExecutor) -> None:
+        for index in list(self._pending):
+            if len(self._running) + len(self._preparing) >= self._limit:
+                return
+
+            build = self._project.builds[index]
+            key = session_key(build.build_machine)
+            if self._prepare_machine is not None and key not in self._prepared:
+                if key not in self._preparing.values():
+                    _logger.info(
+                        "Prepare %s", build.build_machine.address or "localhost"
+                    )
+                    future = executor.submit(
+                        self._prepare_machine, self._project, build.build_machine
+                    )
+                    self._preparing[future] = key
+                continue
+
+            if not self._prepared.get(key, True):
+                self._pending.remove(index)
+                build.successfully_built = False
+                self._finish(index, False)
+            elif self._busy[key] < BuildScheduler.max_builds(
+                self._project, build.build_machine
+            ):
+                self._pending.remove(index)
+                self._busy[key] += 1
+                _logger.info("Build the %s", build.build_name)
+                future = executor.submit(self._build, build, self._concurrency[key])
+                self._running[future] = index
+
+    def _collect(self, future: Future) -> None:
+        exception = future.exception()
+        if future in self._preparing:
+            key = self._preparing.pop(future)
+            self._prepared[key] = exception is None and bool(future.result())
+        else:
+            index = self._running.pop(future)
+            self._busy[session_key(self._project.builds[index].build_machine)] -= 1
+            if exception is None:
+                self._finish(index, future.result())
+
+        if exception is not None:
+            _logger.error("Building raised %r", exception)
+            self._error = self._error or exception
+
+    def _finish(self, index: int, success: bool) -> None:
+        self._results[index] = success
+        if self._on_finished is not None:
+            self._on_finished(self._project.builds[index], success)
+
+    def _build(self, build: Build, concurrent: int) -> bool:
+        project = self._project
+        scheduled = build
+        if build.jobs is None and self._choose_jobs is not None:
+            jobs = self._choose_jobs(project, build, concurrent)
+            scheduled = dataclasses.replace(build, jobs=jobs)
+        elif concurrent > 1:
+            try:
+                shell = Shell(project, build.build_machine).connect()
+                nproc = shell.machine_profile().nproc
+            except (OSError, RuntimeError, paramiko.SSHException) as e:
+                _logger.warning(
+                    "Can't get processors of %s, jobs are not split: %s",
+                    build.build_name,
+                    e,
+                )
+            else:
+                jobs = BuildScheduler.split_jobs(build.jobs, nproc, concurrent)
+                _logger.info("Build %s with %s jobs", build.build_name, jobs)
+                scheduled = dataclasses.replace(build, jobs=jobs)
+
+        success = self._build_function(project, scheduled)
+        for name in _RESULT_FIELDS:
+            setattr(build, name, getattr(scheduled, name))
+        return success
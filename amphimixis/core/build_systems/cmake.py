@@ -3,6 +3,13 @@
 import os
 
 from amphimixis.core import logger
+from amphimixis.core.build_systems import (
+    compiler_cache,
+    incremental,
+    ninja_log,
+    peak_memory,
+    time_trace,
+)
 from amphimixis.core.build_systems.make import Make
 from amphimixis.core.build_systems.ninja import Ninja
 from amphimixis.core.general.general import (
@@ -13,7 +20,8 @@ from amphimixis.core.general.general import (
     ILowLevelBuildSystem,
     Toolchain,
 )
-from amphimixis.core.shell import Shell
+from amphimixis.core.general.tools import build_log_filename
+from amphimixis.core.shell import OutputSink, Shell
 
 _logger = logger.setup_logger("CMAKE")
 
@@ -41,9 +49,19 @@ class CMake(BuildSystem, IHighLevelBuildSystem):
     def build(self, build: Build) -> tuple[int, str, str]:
         """Configure and build via CMake.
 
+        The full output is saved to the build log file, only its tail is returned.
+        With `Build.compiler_cache`, C and C++ compilers are launched through it.
+        With `Build.incremental`, configuring is skipped if the configure command
+        is the same as in the last successful build, otherwise
+        `Build.rebuild_reason` is set.
+        With the Ninja runner, times of targets are read from its log,
+        see `ninja_log.collect`.
+        With `Build.time_trace`, the clang time traces are merged,
+        see `time_trace.collect`.
+
         :param Build build: Build to build
         :rtype: tuple[int, str, str]
-        :return: Tuple of error_code, stdout, stderr
+        :return: Tuple of error_code, stdout tail, stderr tail
         """
         shell = Shell(self._project, build.build_machine, self._ui).connect()
 
@@ -52,6 +70,55 @@ class CMake(BuildSystem, IHighLevelBuildSystem):
             shell.get_source_dir(),
             self.find_relative_path("CMakeLists.txt"),
         )
+        cache_env = compiler_cache.environment(shell, build.compiler_cache)
+        conf_cmd = cache_env + self._configure_command(
+            build, build_path, cmakelists_dir
+        )
+
+        run_cmd = f"{cache_env}cmake --build {build_path} "
+        if build.jobs:
+            run_cmd += f"--parallel {build.jobs} "
+
+        run_cmd = peak_memory.measure(shell, run_cmd, build_path)
+        commands = [conf_cmd, run_cmd]
+        config = incremental.config_hash(conf_cmd)
+        if build.incremental:
+            build.rebuild_reason = incremental.rebuild_reason(
+                shell, build_path, config, "CMakeCache.txt"
+            )
+            if build.rebuild_reason is None:
+                commands = [run_cmd]
+            else:
+                _logger.info(
+                    "Configure %s again: %s", build.build_name, build.rebuild_reason
+                )
+                incremental.forget_config_hash(shell, build_path)
+
+        _logger.info("Run building with '%s'", "' and '".join(commands))
+        with (
+            OutputSink(build_log_filename(build.build_name)) as sink,
+            compiler_cache.collect_stats(shell, build),
+        ):
+            err, _, _ = shell.run(
+                f"cd {cmakelists_dir}",
+                *commands,
+                sink=sink,
+                pipelined=True,
+                total_timeout=build.build_timeout,
+            )
+
+        if err == 0 and build.incremental:
+            incremental.save_config_hash(shell, build_path, config)
+        if isinstance(self.runner, Ninja):
+            ninja_log.collect(shell, build, build_path)
+        if err == 0 and build.time_trace:
+            time_trace.collect(shell, build, build_path)
+
+        return (err, sink.stdout_tail, sink.stderr_tail)
+
+    def _configure_command(
+        self, build: Build, build_path: str, cmakelists_dir: str
+    ) -> str:
         conf_cmd = (
             f"cmake -G {self._generator_names_map[type(self.runner)]} "
             f"-B {build_path} -S {cmakelists_dir} "
@@ -64,22 +131,12 @@ class CMake(BuildSystem, IHighLevelBuildSystem):
             if build.toolchain.sysroot is not None:
                 conf_cmd += f"-DCMAKE_SYSROOT='{build.toolchain.sysroot}' "
             conf_cmd += f"{self._generate_toolchain_flags(build.toolchain)} "
-
-        err, stdout, stderr = shell.run(f"cd {cmakelists_dir}")
-        if err != 0:
-            return (err, "".join(stdout[0]), "".join(stderr[0]))
-
-        run_cmd = f"cmake --build {build_path} "
-        if build.jobs:
-            run_cmd += f"--parallel {build.jobs} "
-
-        _logger.info("Run building with '%s' and '%s'", conf_cmd, run_cmd)
-        err, stdout, stderr = shell.run(conf_cmd, run_cmd)
-        if len(stdout) > 1:
-            stdout[0].extend(stdout[1])
-            stderr[0].extend(stderr[1])
-
-        return (err, "".join(stdout[0]), "".join(stderr[0]))
+        if build.compiler_cache is not None:
+            conf_cmd += (
+                f"-DCMAKE_C_COMPILER_LAUNCHER={build.compiler_cache} "
+                f"-DCMAKE_CXX_COMPILER_LAUNCHER={build.compiler_cache} "
+            )
+        return conf_cmd
 
     def _normbase(self, path: str) -> str:
         return os.path.basename(os.path.normpath(path))
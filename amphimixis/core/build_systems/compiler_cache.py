@@ -0,0 +1,150 @@
+"""Module launching compilers through a compiler cache shared by builds of a machine."""
+
+import json
+import os
+import shlex
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from amphimixis.core import logger
+from amphimixis.core.general import Build, CompilerCache, CompilerCacheStats
+from amphimixis.core.general.constants import AMPHIMIXIS_DIRECTORY_NAME
+from amphimixis.core.shell import Shell
+
+_logger = logger.setup_logger("COMPILER_CACHE")
+
+COMPILER_CACHE_DIRECTORY_NAME = "compiler_cache"
+
+_CACHE_DIR_VARIABLES = {
+    CompilerCache.CCACHE: "CCACHE_DIR",
+    CompilerCache.SCCACHE: "SCCACHE_DIR",
+}
+_STATS_COMMANDS = {
+    CompilerCache.CCACHE: "ccache --print-stats",
+    CompilerCache.SCCACHE: "sccache --show-stats --stats-format=json",
+}
+# `ccache --print-stats` counters, names before and since ccache 4.5
+_CCACHE_HITS = frozenset(
+    {
+        "direct_cache_hit",
+        "preprocessed_cache_hit",
+        "cache_hit_direct",
+        "cache_hit_preprocessed",
+    }
+)
+_CCACHE_MISSES = frozenset({"cache_miss"})
+
+
+def cache_dir(shell: Shell, cache: CompilerCache) -> str:
+    """Get the folder of the cache on the machine, shared by all its builds.
+
+    :param Shell shell: shell of the build machine
+    :param CompilerCache cache: the compiler cache
+    :rtype: str
+    :return: `~/${AMPHIMIXIS_DIRECTORY_NAME}/compiler_cache/${cache}`
+    """
+    return os.path.join(
+        shell.get_home(),
+        AMPHIMIXIS_DIRECTORY_NAME,
+        COMPILER_CACHE_DIRECTORY_NAME,
+        cache.value,
+    )
+
+
+def environment(shell: Shell, cache: CompilerCache | None) -> str:
+    """Get variables to prefix building commands with to use the folder of the cache.
+
+    :param Shell shell: shell of the build machine
+    :param CompilerCache | None cache: the compiler cache, None if it isn't used
+    :rtype: str
+    :return: `VARIABLE=value ` or an empty string if `cache` is None
+    """
+    if cache is None:
+        return ""
+
+    return f"{_CACHE_DIR_VARIABLES[cache]}={shlex.quote(cache_dir(shell, cache))} "
+
+
+def read_stats(shell: Shell, cache: CompilerCache) -> CompilerCacheStats | None:
+    """Read the counters of the cache.
+
+    :param Shell shell: shell of the build machine
+    :param CompilerCache cache: the compiler cache
+    :rtype: CompilerCacheStats | None
+    :return: hits and misses since the cache was created, None if they can't be read
+    """
+    error, stdout, stderr = shell.execute(
+        environment(shell, cache) + _STATS_COMMANDS[cache]
+    )
+    if error != 0:
+        _logger.warning("Can't read statistics of %s: %s", cache, "".join(stderr))
+        return None
+
+    try:
+        if cache == CompilerCache.CCACHE:
+            return _parse_ccache_stats(stdout)
+        return _parse_sccache_stats("".join(stdout))
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        _logger.warning("Can't parse statistics of %s: %s", cache, e)
+        return None
+
+
+@contextmanager
+def collect_stats(shell: Shell, build: Build) -> Iterator[None]:
+    """Save the work done by the compiler cache of the build inside the block.
+
+    Sets `Build.compiler_cache_stats` to the difference of the counters
+    before and after the block. Builds running on the machine at the same time
+    share the cache, so their compilations are counted too.
+
+    :param Shell shell: shell of the build machine
+    :param Build build: build using `Build.compiler_cache`
+    """
+    if build.compiler_cache is None:
+        yield
+        return
+
+    before = read_stats(shell, build.compiler_cache)
+    try:
+        yield
+    finally:
+        after = read_stats(shell, build.compiler_cache)
+        build.compiler_cache_stats = None
+        if before is not None and after is not None:
+            build.compiler_cache_stats = CompilerCacheStats(
+                hits=after.hits - before.hits,
+                misses=after.misses - before.misses,
+                size_kb=after.size_kb,
+            )
+            _logger.info(
+                "%s of %s: %d hits, %d misses, %s KiB",
+                build.compiler_cache,
+                build.build_name,
+                build.compiler_cache_stats.hits,
+                build.compiler_cache_stats.misses,
+                after.size_kb,
+            )
+
+
+def _parse_ccache_stats(lines: list[str]) -> CompilerCacheStats:
+    stats = CompilerCacheStats()
+    for line in lines:
+        name, _, value = line.strip().partition("\t")
+        if name in _CCACHE_HITS:
+            stats.hits += int(value)
+        elif name in _CCACHE_MISSES:
+            stats.misses += int(value)
+        elif name == "cache_size_kibibyte":
+            stats.size_kb = int(value)
+    return stats
+
+
+def _parse_sccache_stats(output: str) -> CompilerCacheStats:
+    report = json.loads(output)
+    stats = report["stats"]
+    size = report.get("cache_size")
+    return CompilerCacheStats(
+        hits=sum(stats["cache_hits"]["counts"].values()),
+        misses=sum(stats["cache_misses"]["counts"].values()),
+        size_kb=int(size) // 1024 if size is not None else None,
+    )
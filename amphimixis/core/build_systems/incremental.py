@@ -0,0 +1,69 @@
+"""Module detecting whether a build can reuse the configuration of the previous one."""
+
+import hashlib
+import os
+import shlex
+
+from amphimixis.core.shell import Shell
+
+CONFIG_HASH_FILE_NAME = ".amphimixis_config_hash"
+
+
+def config_hash(command: str) -> str:
+    """Hash the command configuring a build.
+
+    :param str command: command with all options affecting the configuration
+    :rtype: str
+    :return: SHA-256 of the command in hex
+    """
+    return hashlib.sha256(command.encode()).hexdigest()
+
+
+def rebuild_reason(
+    shell: Shell, folder: str, value: str, required: str | None = None
+) -> str | None:
+    """Get the reason to configure and build from scratch.
+
+    :param Shell shell: shell of the build machine
+    :param str folder: folder the configuration hash is saved to
+    :param str value: hash of the current configuration, see `config_hash`
+    :param str | None required: file in `folder` left by the configuration,
+        e.g. `CMakeCache.txt`
+    :rtype: str | None
+    :return: the reason, None if the previous configuration can be reused
+    """
+    error, stdout, _ = shell.execute(f"cat {_hash_file(folder)}")
+    if error != 0:
+        return "no configuration of a previous build"
+    if "".join(stdout).strip() != value:
+        return "configuration changed"
+    if required is not None:
+        error, _, _ = shell.execute(
+            f"test -e {shlex.quote(os.path.join(folder, required))}"
+        )
+        if error != 0:
+            return f"{required} is missing"
+    return None
+
+
+def save_config_hash(shell: Shell, folder: str, value: str) -> None:
+    """Save the hash of a configuration once the build has succeeded.
+
+    :param Shell shell: shell of the build machine
+    :param str folder: folder to save the hash to
+    :param str value: hash of the configuration, see `config_hash`
+    """
+    shell.execute(f"echo {value} > {_hash_file(folder)}")
+
+
+def forget_config_hash(shell: Shell, folder: str) -> None:
+    """Remove the saved hash before the configuration is changed.
+
+    :param Shell shell: shell of the build machine
+    :param str folder: folder the hash is saved to
+    """
+    shell.execute(f"rm -f {_hash_file(folder)}")
+
+
+def _hash_file(folder: str) -> str:
+    return shlex.quote(os.path.join(folder, CONFIG_HASH_FILE_NAME))
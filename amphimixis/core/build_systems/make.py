@@ -3,6 +3,12 @@
 import os
 
 from amphimixis.core import logger
+from amphimixis.core.build_systems import (
+    compiler_cache,
+    incremental,
+    peak_memory,
+    time_trace,
+)
 from amphimixis.core.general import (
     Build,
     BuildSystem,
@@ -10,14 +16,22 @@ from amphimixis.core.general import (
     IHighLevelBuildSystem,
     ILowLevelBuildSystem,
     Toolchain,
+    ToolchainAttrs,
 )
-from amphimixis.core.shell import Shell
+from amphimixis.core.general.tools import build_log_filename
+from amphimixis.core.shell import OutputSink, Shell
 
 _logger = logger.setup_logger("MAKE")
 
 
 class Make(BuildSystem, IHighLevelBuildSystem, ILowLevelBuildSystem):
-    """Implementation of working with Make build system."""
+    """Implementation of working with Make build system.
+
+    Builds compile in the sources and clean them after installing,
+    so `BuildScheduler` runs builds of one machine one at a time.
+    """
+
+    builds_in_sources = True
 
     _GNU_standard_compatibility_warn_msg = (
         "Amphimixis only uses GNU standard flags for Makefile, "
@@ -51,6 +65,30 @@ class Make(BuildSystem, IHighLevelBuildSystem, ILowLevelBuildSystem):
             ret_flags.append(f"{self._attrs_map(tool)}='{value}'")
         return " ".join(ret_flags)
 
+    def _generate_launcher_flags(self, build: Build) -> str:
+        toolchain = build.toolchain if build.toolchain is not None else Toolchain()
+        c_compiler = toolchain.get(ToolchainAttrs.C_COMPILER) or "cc"
+        cxx_compiler = toolchain.get(ToolchainAttrs.CXX_COMPILER) or "g++"
+        return (
+            f"CC='{build.compiler_cache} {c_compiler}' "
+            f"CXX='{build.compiler_cache} {cxx_compiler}'"
+        )
+
+    def _generate_configure_flags(self, build: Build) -> str:
+        command = ""
+        if build.config_flags is not None:
+            command += f"{build.config_flags} "
+        if build.compiler_flags is not None:
+            command += f"{self._generate_lang_flags(build.compiler_flags)} "
+        if build.toolchain is not None:
+            if build.toolchain.sysroot is not None:
+                command += f"SYSROOT='{build.toolchain.sysroot}' "
+            command += f"{self._generate_toolchain_flags(build.toolchain)} "
+        if build.compiler_cache is not None:
+            # the last assignment of a variable wins, so it wraps the toolchain compilers
+            command += f"{self._generate_launcher_flags(build)} "
+        return command
+
     def _get_makefile_name(self, config_flags: str) -> str:
         options = config_flags.split()
         path = "Makefile"
@@ -71,50 +109,72 @@ class Make(BuildSystem, IHighLevelBuildSystem, ILowLevelBuildSystem):
     ) -> tuple[int, str, str]:
         shell = Shell(self._project, build.build_machine, self._ui).connect()
         build_path = os.path.join(shell.get_project_workdir(), build.build_name)
-        command = "make "
+        command = f"{compiler_cache.environment(shell, build.compiler_cache)}make "
         cd_dir = build_path
         if configure:
-            if build.config_flags is not None:
-                command += f"{build.config_flags} "
-            if build.compiler_flags is not None:
-                command += f"{self._generate_lang_flags(build.compiler_flags)} "
-            if build.toolchain is not None:
-                if build.toolchain.sysroot is not None:
-                    command += f"SYSROOT='{build.toolchain.sysroot}' "
-                command += f"{self._generate_toolchain_flags(build.toolchain)} "
+            command += self._generate_configure_flags(build)
             cd_dir = os.path.join(
                 shell.get_source_dir(),
                 self.find_relative_path(
                     self._get_makefile_name(str(build.config_flags))
                 ),
             )
+        config = incremental.config_hash(command)
         if build.jobs:
             command += f"--jobs={build.jobs} "
 
-        err, stdout, stderr = shell.run(f"cd {cd_dir}")
-        if err != 0:
-            return (err, "".join(stdout[0]), "".join(stderr[0]))
-
-        _logger.info("Run building with '%s'", command)
-        err, stdout, stderr = shell.run(command)
-        if err != 0:
-            return (err, "".join(stdout[0]), "".join(stderr[0]))
-        if configure:
-            err_, stdout_, stderr_ = shell.run(
-                f"make install DESTDIR={build_path}", "make clean"
-            )
-            err = err_ if err == 0 else err
-            stdout[0].extend([line for cmd_stdout in stdout_ for line in cmd_stdout])
-            stderr[0].extend([line for cmd_stderr in stderr_ for line in cmd_stderr])
-
-        return (err, "".join(stdout[0]), "".join(stderr[0]))
+        keep_objects = configure and build.incremental
+        commands = [peak_memory.measure(shell, command, build_path)]
+        if keep_objects:
+            # object files in the sources may be left by a build of another recipe
+            build.rebuild_reason = incremental.rebuild_reason(shell, cd_dir, config)
+            if build.rebuild_reason is not None:
+                _logger.info(
+                    "Build %s from scratch: %s", build.build_name, build.rebuild_reason
+                )
+                incremental.forget_config_hash(shell, cd_dir)
+                commands.insert(0, "make clean || true")
+
+        _logger.info("Run building with '%s'", "' and '".join(commands))
+        with OutputSink(build_log_filename(build.build_name)) as sink:
+            with compiler_cache.collect_stats(shell, build):
+                err, _, _ = shell.run(
+                    f"cd {cd_dir}",
+                    *commands,
+                    sink=sink,
+                    total_timeout=build.build_timeout,
+                )
+            if err == 0 and configure and build.time_trace:
+                # traces left in the sources would be merged by builds of other recipes
+                time_trace.collect(shell, build, cd_dir, remove=not keep_objects)
+            if err == 0 and configure:
+                err, _, _ = shell.run(
+                    f"cd {cd_dir}",
+                    f"make install DESTDIR={build_path}",
+                    *([] if keep_objects else ["make clean"]),
+                    sink=sink,
+                    pipelined=True,
+                )
+
+        if err == 0 and keep_objects:
+            incremental.save_config_hash(shell, cd_dir, config)
+
+        return (err, sink.stdout_tail, sink.stderr_tail)
 
     def build(self, build: Build) -> tuple[int, str, str]:
         """Build via Make.
 
+        The full output is saved to the build log file, only its tail is returned.
+        With `Build.compiler_cache`, `CC` and `CXX` are launched through it.
+        With `Build.incremental`, object files are kept for the next build
+        of the same configuration, otherwise `make clean` is run first
+        and `Build.rebuild_reason` is set.
+        With `Build.time_trace`, the clang time traces are merged,
+        see `time_trace.collect`.
+
         :param Build build: Build to build
         :rtype: tuple[int, str, str]
-        :return: Tuple of error_code, stdout, stderr
+        :return: Tuple of error_code, stdout tail, stderr tail
         """
         self._ui.send_warning(
             build.build_name,
@@ -3,8 +3,10 @@
 import os
 
 from amphimixis.core import logger
+from amphimixis.core.build_systems import ninja_log
 from amphimixis.core.general.general import Build, BuildSystem, ILowLevelBuildSystem
-from amphimixis.core.shell import Shell
+from amphimixis.core.general.tools import build_log_filename
+from amphimixis.core.shell import OutputSink, Shell
 
 _logger = logger.setup_logger("NINJA")
 
@@ -15,19 +17,26 @@ class Ninja(BuildSystem, ILowLevelBuildSystem):
     def run_building(self, build: Build) -> tuple[int, str, str]:
         """Run ninja in the build directory.
 
+        The full output is saved to the build log file, only its tail is returned.
+        Times of targets are read from the Ninja log, see `ninja_log.collect`.
+
         :param Build build: Build configuration
         :rtype: tuple[int, str, str]
-        :return: Tuple of error_code, stdout, stderr
+        :return: Tuple of error_code, stdout tail, stderr tail
         """
         shell = Shell(self._project, build.build_machine, self._ui).connect()
         build_path = os.path.join(shell.get_project_workdir(), build.build_name)
         command = "ninja "
         if build.jobs:
             command += f"-j {build.jobs} "
-        err, stdout, stderr = shell.run(f"cd {build_path}")
-        if err != 0:
-            return (err, "".join(stdout[0]), "".join(stderr[0]))
         _logger.info("Run building with '%s'", command)
-        err, stdout, stderr = shell.run(command)
-
-        return (err, "".join(stdout[0]), "".join(stderr[0]))
+        with OutputSink(build_log_filename(build.build_name)) as sink:
+            err, _, _ = shell.run(
+                f"cd {build_path}",
+                command,
+                sink=sink,
+                total_timeout=build.build_timeout,
+            )
+
+        ninja_log.collect(shell, build, build_path)
+        return (err, sink.stdout_tail, sink.stderr_tail)
@@ -0,0 +1,196 @@
+"""Module reading building times of targets from the log written by Ninja."""
+
+import json
+import os
+import shlex
+from typing import Any
+
+from amphimixis.core import logger
+from amphimixis.core.general import Build, TargetTime
+from amphimixis.core.general.tools import build_times_filename, build_trace_filename
+from amphimixis.core.shell import Shell
+
+_logger = logger.setup_logger("NINJA_LOG")
+
+NINJA_LOG_NAME = ".ninja_log"
+SLOWEST_COUNT = 10
+_TRANSLATION_UNIT_SUFFIXES = (".o", ".obj")
+
+
+def parse(lines: list[str]) -> list[TargetTime]:
+    """Parse the Ninja log, only edges of the last building are kept.
+
+    Every line of the log is `start end mtime output command_hash` separated by tabs.
+    Outputs of one edge share the command hash. Ninja appends lines on every
+    building and its times start from zero. Lines are written as edges finish,
+    so the last building starts after the last line whose end is less than
+    the end of the previous line. Malformed lines are skipped.
+
+    :param list[str] lines: lines of the log
+    :rtype: list[TargetTime]
+    :return: edges in the order they have finished
+    """
+    edges: dict[str, TargetTime] = {}
+    outputs: dict[str, list[str]] = {}
+    last_end = 0
+    for number, line in enumerate(lines, 1):
+        if line.startswith("#") or not line.strip():
+            continue
+        fields = line.rstrip("\n").split("\t")
+        try:
+            if len(fields) != 5:
+                raise ValueError(f"{len(fields)} fields instead of 5")
+            start, end = int(fields[0]), int(fields[1])
+        except ValueError as error:
+            _logger.warning("Skipping line %d of the Ninja log: %s", number, error)
+            continue
+
+        output, command_hash = fields[3], fields[4]
+        if end < last_end:
+            edges, outputs = {}, {}
+        last_end = end
+
+        edge_outputs = outputs.setdefault(command_hash, [])
+        if output not in edge_outputs:
+            edge_outputs.append(output)
+        edges[command_hash] = TargetTime(" ".join(edge_outputs), start, end)
+
+    return list(edges.values())
+
+
+def critical_path(targets: list[TargetTime]) -> list[TargetTime]:
+    """Estimate the chain of edges that determined the time of building.
+
+    The log has no dependencies, so the edge ending last before the start
+    of an edge is taken for the one it has waited for.
+
+    :param list[TargetTime] targets: edges of one building
+    :rtype: list[TargetTime]
+    :return: edges of the chain in the order they have run
+    """
+    path: list[TargetTime] = []
+    current = max(targets, key=lambda target: target.end_ms, default=None)
+    while current is not None:
+        path.append(current)
+        start = current.start_ms
+        current = max(
+            (target for target in targets if target.end_ms <= start),
+            key=lambda target: (target.end_ms, target.duration_ms),
+            default=None,
+        )
+    return path[::-1]
+
+
+def slowest_translation_units(
+    targets: list[TargetTime], count: int = SLOWEST_COUNT
+) -> list[TargetTime]:
+    """Get the compilations of source files that took the longest.
+
+    :param list[TargetTime] targets: edges of one building
+    :param int count: maximum number of compilations
+    :rtype: list[TargetTime]
+    :return: edges producing object files, the slowest first
+    """
+    units = [
+        target
+        for target in targets
+        if target.target.endswith(_TRANSLATION_UNIT_SUFFIXES)
+    ]
+    return sorted(units, key=lambda target: target.duration_ms, reverse=True)[:count]
+
+
+def chrome_trace(targets: list[TargetTime]) -> dict[str, Any]:
+    """Convert the edges to the Chrome trace format, see `chrome://tracing` or Perfetto.
+
+    Edges running at the same time are put on different threads.
+
+    :param list[TargetTime] targets: edges of one building
+    :rtype: dict[str, Any]
+    :return: trace serializable to JSON
+    """
+    lanes: list[int] = []  # end of the last edge of every thread
+    events: list[dict[str, Any]] = []
+    for target in sorted(targets, key=lambda target: target.start_ms):
+        lane = next(
+            (lane for lane, end in enumerate(lanes) if end <= target.start_ms),
+            len(lanes),
+        )
+        if lane == len(lanes):
+            lanes.append(target.end_ms)
+        else:
+            lanes[lane] = target.end_ms
+
+        events.append(
+            {
+                "name": target.target,
+                "cat": "targets",
+                "ph": "X",
+                "ts": target.start_ms * 1000,
+                "dur": target.duration_ms * 1000,
+                "pid": 0,
+                "tid": lane,
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def report(targets: list[TargetTime], count: int = SLOWEST_COUNT) -> str:
+    """Describe the times of building.
+
+    :param list[TargetTime] targets: edges of one building
+    :param int count: maximum number of the slowest translation units
+    :rtype: str
+    :return: totals, the critical path and the slowest translation units
+    """
+    path = critical_path(targets)
+    lines = [
+        f"Edges: {len(targets)}",
+        f"Wall time: {max((t.end_ms for t in targets), default=0) / 1000:.3f} s",
+        f"CPU time of edges: {sum(t.duration_ms for t in targets) / 1000:.3f} s",
+        "",
+        f"Critical path: {sum(t.duration_ms for t in path) / 1000:.3f} s",
+    ]
+    lines.extend(_describe(target) for target in path)
+    lines.extend(["", "Slowest translation units:"])
+    lines.extend(
+        _describe(target) for target in slowest_translation_units(targets, count)
+    )
+    return "\n".join(lines) + "\n"
+
+
+def collect(shell: Shell, build: Build, build_path: str) -> None:
+    """Read the times of the last building and save the report and the trace.
+
+    Sets `Build.target_times`, the report is saved to `build_times_filename`
+    and the trace to `build_trace_filename` in the working directory.
+
+    :param Shell shell: shell of the build machine
+    :param Build build: the build
+    :param str build_path: folder with the Ninja log on the machine
+    """
+    error, stdout, stderr = shell.execute(
+        f"cat {shlex.quote(os.path.join(build_path, NINJA_LOG_NAME))}"
+    )
+    if error != 0:
+        _logger.warning(
+            "Can't read the Ninja log of %s: %s", build.build_name, "".join(stderr)
+        )
+        build.target_times = None
+        return
+
+    build.target_times = parse(stdout)
+    with open(build_times_filename(build.build_name), "w", encoding="utf-8") as file:
+        file.write(report(build.target_times))
+    with open(build_trace_filename(build.build_name), "w", encoding="utf-8") as file:
+        json.dump(chrome_trace(build.target_times), file)
+
+    _logger.info(
+        "Building times of %s are saved to %s, the trace to %s",
+        build.build_name,
+        build_times_filename(build.build_name),
+        build_trace_filename(build.build_name),
+    )
+
+
+def _describe(target: TargetTime) -> str:
+    return f"{target.duration_ms / 1000:10.3f} s  {target.target}"
@@ -0,0 +1,73 @@
+"""Module measuring the memory used by the processes of a building."""
+
+import os
+import re
+import shlex
+
+from amphimixis.core.shell import Shell
+
+PEAK_MEMORY_FILE_NAME = ".amphimixis_peak_memory_kb"
+
+# compilers and linkers report a process killed by the kernel out of memory so
+_KILLED = re.compile(r"\bKilled\b|signal 9\b")
+
+
+def measure(shell: Shell, command: str, build_path: str) -> str:
+    """Wrap the command to save the memory of its largest process to the build folder.
+
+    GNU time reports the maximum resident set size of the process and the children
+    it has waited for. Without GNU time on the machine, the command is not changed.
+
+    :param Shell shell: shell of the build machine
+    :param str command: building command, may start with variable assignments
+    :param str build_path: folder of the build on the machine
+    :rtype: str
+    :return: the wrapped command
+    """
+    if not shell.machine_profile().gnu_time:
+        return command
+
+    return f"/usr/bin/time -f %M -o {_peak_file(build_path)} env {command}"
+
+
+def read(shell: Shell, build_path: str) -> int | None:
+    """Read the memory saved by a command wrapped with `measure`.
+
+    :param Shell shell: shell of the build machine
+    :param str build_path: folder of the build on the machine
+    :rtype: int | None
+    :return: memory of the largest process in kilobytes, None if it is unknown
+    """
+    error, stdout, _ = shell.execute(f"cat {_peak_file(build_path)}")
+    lines = [line.strip() for line in stdout if line.strip()]
+    # GNU time writes the exit status of a failed command before the memory
+    if error != 0 or not lines or not lines[-1].isdigit():
+        return None
+    return int(lines[-1])
+
+
+def forget(shell: Shell, build_path: str) -> None:
+    """Remove the memory saved by the previous building.
+
+    :param Shell shell: shell of the build machine
+    :param str build_path: folder of the build on the machine
+    """
+    shell.execute(f"rm -f {_peak_file(build_path)}")
+
+
+def oom_killed(log_file: str) -> bool:
+    """Check whether the build log tells of a process killed for the lack of memory.
+
+    :param str log_file: local file with the output of building
+    :rtype: bool
+    :return: True if a compiler or a linker was killed
+    """
+    try:
+        with open(log_file, encoding="utf-8", errors="replace") as file:
+            return any(_KILLED.search(line) for line in file)
+    except FileNotFoundError:
+        return False
+
+
+def _peak_file(build_path: str) -> str:
+    return shlex.quote(os.path.join(build_path, PEAK_MEMORY_FILE_NAME))
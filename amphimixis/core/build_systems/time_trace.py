@@ -0,0 +1,189 @@
+"""Module merging the clang `-ftime-trace` files of translation units of a build."""
+
+import json
+import os
+import shlex
+from collections import Counter
+from typing import Any
+
+from amphimixis.core import logger
+from amphimixis.core.general import (
+    Build,
+    CompilerFlags,
+    CompilerFlagsAttrs,
+    TimeTraceSummary,
+    Toolchain,
+    ToolchainAttrs,
+)
+from amphimixis.core.general.tools import time_trace_filename
+from amphimixis.core.shell import Shell
+
+_logger = logger.setup_logger("TIME_TRACE")
+
+TIME_TRACE_FLAG = "-ftime-trace"
+HOT_SPOT_COUNT = 20
+
+# key written only to the traces of clang, it tells them from other JSON files
+_TRACE_MARKER = "beginningOfTime"
+_TEMPLATE_EVENTS = frozenset({"InstantiateClass", "InstantiateFunction"})
+
+
+def is_clang(toolchain: Toolchain | None) -> bool:
+    """Check whether the C or C++ compiler of the toolchain is clang.
+
+    :param Toolchain | None toolchain: the toolchain, None for the default compilers
+    :rtype: bool
+    :return: True if clang is set as the compiler
+    """
+    if toolchain is None:
+        return False
+
+    return any(
+        "clang" in os.path.basename(toolchain.get(attr) or "")
+        for attr in (ToolchainAttrs.C_COMPILER, ToolchainAttrs.CXX_COMPILER)
+    )
+
+
+def add_flags(flags: CompilerFlags | None) -> CompilerFlags:
+    """Add `-ftime-trace` to the flags of the C and C++ compilers.
+
+    :param CompilerFlags | None flags: flags of the recipe
+    :rtype: CompilerFlags
+    :return: `flags` or new flags if they are None
+    """
+    if flags is None:
+        flags = CompilerFlags()
+    for attr in (CompilerFlagsAttrs.C_FLAGS, CompilerFlagsAttrs.CXX_FLAGS):
+        value = flags.get(attr)
+        if value is None or TIME_TRACE_FLAG not in value.split():
+            flags.set(attr, f"{value} {TIME_TRACE_FLAG}" if value else TIME_TRACE_FLAG)
+    return flags
+
+
+def parse(lines: list[str]) -> list[dict[str, Any]]:
+    """Parse the traces, clang writes every trace to one line.
+
+    :param list[str] lines: traces, one per line
+    :rtype: list[dict[str, Any]]
+    :return: traces in the Chrome trace format
+    """
+    traces = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            trace = json.loads(line)
+        except json.JSONDecodeError as e:
+            _logger.warning("Can't parse a time trace: %s", e)
+            continue
+        if isinstance(trace, dict):
+            traces.append(trace)
+    return traces
+
+
+def summarize(
+    traces: list[dict[str, Any]], count: int = HOT_SPOT_COUNT
+) -> TimeTraceSummary:
+    """Merge the traces of translation units.
+
+    Times of headers include the headers they include, times of instantiations
+    include the instantiations they cause.
+
+    :param list[dict[str, Any]] traces: traces of translation units
+    :param int count: maximum number of headers and of templates
+    :rtype: TimeTraceSummary
+    :return: the merged times
+    """
+    summary = TimeTraceSummary(translation_units=len(traces))
+    headers: Counter[str] = Counter()
+    templates: Counter[str] = Counter()
+    for trace in traces:
+        for event in trace.get("traceEvents", []):
+            if event.get("ph") != "X":
+                continue
+
+            name = event.get("name")
+            duration = event.get("dur", 0) / 1000
+            detail = event.get("args", {}).get("detail")
+            if name == "Frontend":
+                summary.frontend_ms += duration
+            elif name == "Backend":
+                summary.backend_ms += duration
+            elif name == "Source" and detail:
+                headers[detail] += duration
+            elif name in _TEMPLATE_EVENTS and detail:
+                templates[detail] += duration
+
+    summary.headers = dict(headers.most_common(count))
+    summary.templates = dict(templates.most_common(count))
+    return summary
+
+
+def report(summary: TimeTraceSummary) -> str:
+    """Describe where the compile time goes.
+
+    :param TimeTraceSummary summary: the merged times
+    :rtype: str
+    :return: totals, the most expensive headers and template instantiations
+    """
+    lines = [
+        f"Translation units: {summary.translation_units}",
+        f"Frontend: {summary.frontend_ms / 1000:.3f} s",
+        f"Backend: {summary.backend_ms / 1000:.3f} s",
+        "",
+        "Most expensive headers:",
+    ]
+    lines.extend(_describe(name, time) for name, time in summary.headers.items())
+    lines.extend(["", "Heaviest template instantiations:"])
+    lines.extend(_describe(name, time) for name, time in summary.templates.items())
+    return "\n".join(lines) + "\n"
+
+
+def collect(shell: Shell, build: Build, folder: str, remove: bool = False) -> None:
+    """Merge the traces found in the folder and save the report.
+
+    Sets `Build.time_trace_summary`, the report is saved to `time_trace_filename`
+    in the working directory.
+
+    :param Shell shell: shell of the build machine
+    :param Build build: the build
+    :param str folder: folder with the object files on the machine
+    :param bool remove: remove the traces once they are read, so that builds
+        sharing the folder don't merge the traces of each other
+    """
+    build.time_trace_summary = None
+    files = (
+        f"find {shlex.quote(folder)} -name '*.json' -type f "
+        f"-exec grep -lZ {_TRACE_MARKER} {{}} +"
+    )
+    error, stdout, stderr = shell.execute(f"{files} | xargs -0 -r awk 1")
+    if error != 0:
+        _logger.warning(
+            "Can't read time traces of %s: %s", build.build_name, "".join(stderr)
+        )
+        return
+    if remove:
+        shell.execute(f"{files} | xargs -0 -r rm -f")
+
+    traces = parse(stdout)
+    if not traces:
+        _logger.warning(
+            "No time traces of %s are found, is it compiled by clang?",
+            build.build_name,
+        )
+        return
+
+    build.time_trace_summary = summarize(traces)
+    with open(time_trace_filename(build.build_name), "w", encoding="utf-8") as file:
+        file.write(report(build.time_trace_summary))
+
+    _logger.info(
+        "Compile times of %s merged from %d traces are saved to %s",
+        build.build_name,
+        len(traces),
+        time_trace_filename(build.build_name),
+    )
+
+
+def _describe(name: str, time_ms: float) -> str:
+    return f"{time_ms / 1000:10.3f} s  {name}"
@@ -1,11 +1,31 @@
 """Module that builds a build based on configuration."""
 
 import os
-import pickle
+import threading
+import time
 
 from amphimixis.core import logger
-from amphimixis.core.general import IUI, NULL_UI, Build, Project
-from amphimixis.core.shell import Shell
+from amphimixis.core.build_cache import BuildCache
+from amphimixis.core.build_registry import BuildRegistry
+from amphimixis.core.build_scheduler import BuildScheduler
+from amphimixis.core.build_systems import peak_memory
+from amphimixis.core.general import (
+    IUI,
+    NULL_UI,
+    Build,
+    BuildResources,
+    MachineInfo,
+    Project,
+)
+from amphimixis.core.general.tools import build_log_filename
+from amphimixis.core.jobs_tuner import JobsTuner
+from amphimixis.core.shell import (
+    TIMEOUT_EXIT_CODE,
+    SessionKey,
+    Shell,
+    session_key,
+    sync_directory,
+)
 
 _logger = logger.setup_logger("BUILDER")
 
@@ -13,42 +33,93 @@ _logger = logger.setup_logger("BUILDER")
 class Builder:
     """The class is representing a module which builds a build based on its configuration."""
 
-    BUILDS_LIST_FILE_NAME = ".builds"
+    _sync_locks: dict[SessionKey, threading.Lock] = {}
+    _sync_locks_lock = threading.Lock()
 
     @staticmethod
     def build(project: Project, ui: IUI = NULL_UI) -> None:
-        """Build all project builds."""
-        for build in project.builds:
-            _logger.info("Build the %s", build.build_name)
+        """Build all project builds, builds on different machines run at the same time.
 
-            if Builder.build_for_linux(project, build, ui):
+        Sources are synchronised once for every remote build machine before its builds.
+        Builds without `jobs` get them from `JobsTuner`.
+        """
+
+        def log_result(build: Build, success: bool) -> None:
+            if success:
                 _logger.info("Build passed %s", build.build_name)
             else:
                 _logger.info("Build failed %s", build.build_name)
 
+        BuildScheduler.run(
+            project,
+            lambda project, build: Builder.build_for_linux(
+                project, build, ui, sync_sources=False
+            ),
+            log_result,
+            lambda project, machine: Builder.sync_sources(project, machine, ui),
+            JobsTuner.choose_jobs,
+        )
+
+    @staticmethod
+    def sync_sources(project: Project, machine: MachineInfo, ui: IUI = NULL_UI) -> bool:
+        """Copy changed project sources to the build machine.
+
+        :param Project project: Project whose sources must be copied
+        :param MachineInfo machine: Build machine, nothing is copied to the local one
+        :rtype: bool
+        :return: True if the sources on the machine are up to date
+        """
+        if machine.address is None:
+            return True
+
+        ui.update_message(
+            machine.address, "Copying project sources to remote machine..."
+        )
+        shell = Shell(project, machine, ui=ui).connect()
+        # builds on the machine share the copy of the sources
+        with Builder._sync_lock(machine):
+            synced = sync_directory(
+                shell,
+                os.path.normpath(project.path),
+                os.path.dirname(shell.get_source_dir()),
+            )
+        if not synced:
+            _logger.error("Error in copying source files to %s", machine.address)
+            ui.mark_failed(
+                build_id=machine.address, error_message="Error in copying source files"
+            )
+        return synced
+
     @staticmethod
-    def build_for_linux(project: Project, build: Build, ui: IUI = NULL_UI) -> bool:
-        """Build the program on Linux."""
+    def build_for_linux(
+        project: Project, build: Build, ui: IUI = NULL_UI, sync_sources: bool = True
+    ) -> bool:
+        """Build the program on Linux.
+
+        The build is skipped if its output on the build machine is up to date,
+        see `BuildCache`.
+
+        :param bool sync_sources: copy the sources to a remote build machine first,
+            False if they have been copied by `sync_sources`
+        """
         ui.update_message(build.build_name, "Connecting...")
         shell = Shell(project, build.build_machine, ui=ui).connect()
 
         # path to build on the machine
         path: str = os.path.join(shell.get_project_workdir(), build.build_name)
 
-        if build.build_machine.address is not None:  # if building on the remote machine
-            ui.update_message(
-                build.build_name, "Copying project sources to remote machine..."
-            )
-            if not shell.copy_to_remote(
-                os.path.normpath(project.path), "~/amphimixis/"
-            ):
-                _logger.error("Error in copying source files")
-                ui.mark_failed(
-                    build_id=build.build_name,
-                    error_message="Error in copying source files",
-                )
-                build.successfully_built = False
-                return False
+        if sync_sources and not Builder.sync_sources(project, build.build_machine, ui):
+            build.successfully_built = False
+            return False
+
+        key = BuildCache.build_key(project, build)
+        if key is not None and BuildCache.is_up_to_date(shell, build, path, key):
+            _logger.info("%s is up to date, building is skipped", build.build_name)
+            ui.update_message(build.build_name, "Up to date")
+            build.successfully_built = True
+            build.resources = None
+            BuildRegistry.remember(build, path)
+            return True
 
         try:
             ui.update_message(build.build_name, "Building...")
@@ -60,15 +131,32 @@ class Builder:
                     "".join(stderr[0]),
                 )
 
-            err, sstdout, sstderr = project.build_system.build(build)
-            _logger.info("Building output:\n%s", sstdout)
-            _logger.info("Building stderr:\n%s", sstderr)
+            BuildCache.invalidate(shell, path)
+            err, sstdout, sstderr = Builder._measured_build(project, shell, build, path)
+            _logger.info(
+                "Full building output of %s is saved to %s",
+                build.build_name,
+                build_log_filename(build.build_name),
+            )
+            _logger.info("Building output tail:\n%s", sstdout)
+            _logger.info("Building stderr tail:\n%s", sstderr)
 
-            if err != 0:
-                build.successfully_built = False
-                return False
-            Builder.remember_build(build)
-            return True
+            if err == TIMEOUT_EXIT_CODE:
+                _logger.error(
+                    "Building of %s timed out after %s seconds",
+                    build.build_name,
+                    build.build_timeout,
+                )
+                ui.mark_failed(
+                    build_id=build.build_name, error_message="Build timed out"
+                )
+                build.timed_out = True
+
+            build.successfully_built = err == 0
+            if err == 0 and key is not None:
+                BuildCache.store(shell, path, key)
+            BuildRegistry.remember(build, path)
+            return err == 0
 
         except FileNotFoundError:
             ui.mark_failed(
@@ -77,39 +165,21 @@ class Builder:
             return False
 
     @staticmethod
-    def remember_build(build: Build) -> None:
-        """Remember build to Builder.BUILDS_LIST_FILE_NAME file in working directory.
-
-        :param Build build: Build to saving
-        """
-        builds: dict[str, Build] = {}
-        try:
-            with open(Builder.BUILDS_LIST_FILE_NAME, "rb") as file:
-                builds = pickle.load(file)
-        except FileNotFoundError:
-            pass
-
-        builds[build.build_name] = build
-        with open(Builder.BUILDS_LIST_FILE_NAME, "wb") as file:
-            pickle.dump(builds, file)
-
-    @staticmethod
-    def forget_build(build: Build) -> None:
-        """Forget build from Builder.BUILDS_LIST_FILE_NAME file in working directory.
-
-        :param Build build: Build to removing from builds list
-        """
-        builds: dict[str, Build] = {}
-        try:
-            with open(Builder.BUILDS_LIST_FILE_NAME, "rb") as file:
-                builds = pickle.load(file)
-        except FileNotFoundError:
-            pass
-
-        if build.build_name in builds:
-            builds.pop(build.build_name)
-        with open(Builder.BUILDS_LIST_FILE_NAME, "wb") as file:
-            pickle.dump(builds, file)
+    def _measured_build(
+        project: Project, shell: Shell, build: Build, path: str
+    ) -> tuple[int, str, str]:
+        """Build and save the resources used by building to `Build.resources`."""
+        peak_memory.forget(shell, path)
+        started = time.monotonic()
+        err, stdout, stderr = project.build_system.build(build)
+        build.resources = BuildResources(
+            jobs=build.jobs,
+            seconds=time.monotonic() - started,
+            peak_memory_kb=peak_memory.read(shell, path),
+            oom_killed=err not in (0, TIMEOUT_EXIT_CODE)
+            and peak_memory.oom_killed(build_log_filename(build.build_name)),
+        )
+        return (err, stdout, stderr)
 
     @staticmethod
     def clean(project: Project, build: Build, ui: IUI = NULL_UI) -> bool:
@@ -126,12 +196,18 @@ class Builder:
         if stdout[0]:
             _logger.error("Cleaning stdout: %s", "".join(stdout[0]))
         if err == 0:
-            Builder.forget_build(build)
+            BuildRegistry.forget(build.build_name)
             return True
         if stderr[0]:
             _logger.error("Cleaning stderr: %s", "".join(stderr[0]))
         return False
 
+    @staticmethod
+    def _sync_lock(machine: MachineInfo) -> threading.Lock:
+        key = session_key(machine)
+        with Builder._sync_locks_lock:
+            return Builder._sync_locks.setdefault(key, threading.Lock())
+
     @staticmethod
     def _normbase(path: str) -> str:
         return os.path.basename(os.path.normpath(path))
@@ -7,7 +7,7 @@ from typing import Any, SupportsInt
 
 import yaml
 
-from amphimixis.core.build_systems import build_systems_dict, runners_dict
+from amphimixis.core.build_systems import build_systems_dict, runners_dict, time_trace
 from amphimixis.core.general import (
     DUMMY_RUNNER,
     IUI,
@@ -79,6 +79,10 @@ def parse_config(
     else:  # if build system doesn't have runners (like Make)
         runner = DUMMY_RUNNER
     project.build_system = build_systems_dict[build_system][0](project, runner, ui)
+    max_parallel_builds = input_config.get("max_parallel_builds")
+    project.max_parallel_builds = (
+        int(max_parallel_builds) if max_parallel_builds else None
+    )
 
     for build in input_config["builds"]:
         if not _create_build(
@@ -165,7 +169,13 @@ def _create_build(  # pylint: disable=R0913,R0914,R0917
         compiler_flags,
         str(config_flags) if config_flags else None,
         int(jobs) if jobs else None,
+        _get_timeout(recipe_info, "build_timeout", build_name),
+        _get_timeout(recipe_info, "run_timeout", build_name),
+        compiler_cache=_get_compiler_cache(recipe_info, build_name),
+        incremental=bool(recipe_info.get("incremental", False)),
     )
+    if recipe_info.get("time_trace", False):
+        _enable_time_trace(build)
 
     project.builds.append(build)
 
@@ -177,6 +187,47 @@ def _generate_build_name(build_id: str, run_id: str, recipe_id: str) -> str:
     return f"{build_id}_{run_id}_{recipe_id}"
 
 
+def _get_timeout(
+    recipe_info: dict[str, str | int], key: str, build_name: str
+) -> int | None:
+    """Get a timeout in seconds from the recipe, None if it is not set."""
+    timeout = recipe_info.get(key)
+    if not isinstance(timeout, SupportsInt | None):
+        msg = f"Build '{build_name}': invalid {key}: '{timeout}'"
+        _logger.fatal(msg)
+        raise ValueError(msg)
+
+    return int(timeout) if timeout else None
+
+
+def _get_compiler_cache(
+    recipe_info: dict[str, str | int], build_name: str
+) -> general.CompilerCache | None:
+    """Get the compiler cache of the recipe, None if it is not set."""
+    cache = recipe_info.get("compiler_cache")
+    if cache is None:
+        return None
+    if str(cache).lower() not in general.CompilerCache:
+        msg = f"Build '{build_name}': unknown compiler_cache: '{cache}'"
+        _logger.fatal(msg)
+        raise ValueError(msg)
+
+    return general.CompilerCache(str(cache).lower())
+
+
+def _enable_time_trace(build: general.Build) -> None:
+    """Compile the build with `-ftime-trace` if its toolchain is clang."""
+    if not time_trace.is_clang(build.toolchain):
+        _logger.warning(
+            "Build '%s': time_trace needs a clang toolchain, it is ignored",
+            build.build_name,
+        )
+        return
+
+    build.compiler_flags = time_trace.add_flags(build.compiler_flags)
+    build.time_trace = True
+
+
 def _get_by_id(
     items: list[dict[str, str | int]], target_id: str
 ) -> dict[str, str | int]:
@@ -207,15 +258,15 @@ def _has_valid_arch(
     # remote case
     ui.update_message("Config", "Checking remote architecture for validity...")
     shell = Shell(project, machine, ui).connect()
-    error_code, stdout, _ = shell.run("uname -m")
-    if error_code != 0:
+    try:
+        remote_arch = shell.machine_profile().arch
+    except RuntimeError:
         _logger.error(
             "An error occured during reading remote machine arch, check remote machine"
         )
         ui.mark_failed("Config: failed to check remote architecture")
         return False
 
-    remote_arch = stdout[0][0]
     if machine.arch.lower() not in remote_arch.lower():
         _logger.error(
             "Invalid remote machine arch: %s, remote machine is %s",
@@ -285,7 +336,15 @@ def create_machine(machine_info: dict[str, int | str]) -> general.MachineInfo:
 
         auth = general.MachineAuthenticationInfo(username, password, port)
 
-    machine = general.MachineInfo(general.Arch(arch.lower()), address, auth)
+    machine = general.MachineInfo(
+        general.Arch(arch.lower()),
+        address,
+        auth,
+        int(machine_info.get("max_builds", 1)),
+        general.TransferMethod(
+            str(machine_info.get("transfer", general.TransferMethod.RSYNC)).lower()
+        ),
+    )
 
     return machine
 
@@ -7,7 +7,10 @@ from amphimixis.core.general.general import (
     NULL_UI,
     Arch,
     Build,
+    BuildResources,
     BuildSystem,
+    CompilerCache,
+    CompilerCacheStats,
     CompilerFlags,
     CompilerFlagsAttrs,
     IHighLevelBuildSystem,
@@ -17,13 +20,17 @@ from amphimixis.core.general.general import (
     ProfileStats,
     Project,
     ProjectStats,
+    TargetTime,
+    TimeTraceSummary,
     Toolchain,
     ToolchainAttrs,
+    TransferMethod,
 )
 
 __all__ = [
     "Project",
     "Build",
+    "BuildResources",
     "MachineInfo",
     "Arch",
     "BuildSystem",
@@ -40,7 +47,12 @@ __all__ = [
     "ToolchainAttrs",
     "CompilerFlagsAttrs",
     "CompilerFlags",
+    "CompilerCache",
+    "CompilerCacheStats",
     "ProfileStats",
     "ProjectStats",
+    "TargetTime",
+    "TimeTraceSummary",
+    "TransferMethod",
     "DUMMY_RUNNER",
 ]
@@ -10,3 +10,11 @@ PERF_RECORD_EXT = ".perfdata"
 PERF_SCRIPT_EXT = ".scriptout"
 PERF_ARCHIVE_EXT = ".tar.bz2"
 PERF_STATS_EXT = ".stats"
+BUILD_LOG_EXT = ".buildlog"
+BUILD_TIMES_EXT = ".buildtimes"
+BUILD_TRACE_EXT = ".buildtrace.json"
+TIME_TRACE_EXT = ".timetrace"
+SYNC_MANIFEST_EXT = ".syncmanifest"
+SHELL_METRICS_FILE_NAME = "amphimixis.metrics.json"
+SOURCE_STATES_FILE_NAME = "amphimixis.sources"
+BUILD_REGISTRY_FILE_NAME = "amphimixis.db"
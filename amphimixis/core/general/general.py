@@ -3,7 +3,7 @@
 import os
 import queue
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import StrEnum
 from os.path import isabs
 
@@ -31,6 +31,7 @@ class ProfileStats:
     :var str | None perf_record_name: Filename of the recorded `perf record` data.
     :var str | None perf_script_name: Filename of the processed `perf script` output.
     :var str | None perf_script_name: Filename of the archive gathered using `perf archive`.
+    :var bool | None timed_out: Whether a run of the executable was killed on `run_timeout`.
     """
 
     build_name: str | None = None
@@ -43,11 +44,40 @@ class ProfileStats:
     perf_record_name: str | None = None
     perf_script_name: str | None = None
     perf_archive_name: str | None = None
+    timed_out: bool | None = None
 
 
 ProjectStats = dict[str, dict[str, ProfileStats]]
 
 
+class CompilerCache(StrEnum):
+    """Supported compiler caches."""
+
+    CCACHE = "ccache"
+    SCCACHE = "sccache"
+
+
+class TransferMethod(StrEnum):
+    """Methods of copying files between the host and a remote machine."""
+
+    SFTP = "sftp"
+    RSYNC = "rsync"
+
+
+@dataclass
+class CompilerCacheStats:
+    """Work of a compiler cache during one building.
+
+    :var int hits: Number of compilations taken from the cache.
+    :var int misses: Number of compilations run and saved to the cache.
+    :var int | None size_kb: Size of the cache after the building in kilobytes.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    size_kb: int | None = None
+
+
 @dataclass
 class MachineAuthenticationInfo:
     """Information about authentication on a remote machine.
@@ -82,11 +112,15 @@ class MachineInfo:
     If address is None, the machine is considered to be local.
 
     :var MachineAuthenticationInfo auth: Authentication info for the machine.
+    :var int max_builds: Maximum number of builds running on the machine at once.
+    :var TransferMethod transfer: Method of copying files to and from the machine.
     """
 
     arch: Arch
     address: str | None
     auth: MachineAuthenticationInfo | None
+    max_builds: int = field(default=1, compare=False)
+    transfer: TransferMethod = field(default=TransferMethod.RSYNC, compare=False)
 
     @property
     def __dictstr__(self) -> dict:
@@ -328,8 +362,13 @@ class IHighLevelBuildSystem(ABC):
     """Interface for classes implementing interaction with a build system.
 
     Represents a high-level build system abstraction.
+
+    :var bool builds_in_sources: True if builds compile in the shared sources
+        on the build machine, so builds of one machine must not run at once
     """
 
+    builds_in_sources: bool = False
+
     @abstractmethod
     def __init__(
         self,
@@ -411,6 +450,63 @@ class BuildSystem:
         raise FileNotFoundError(f"Can't find {file_name}")
 
 
+@dataclass
+class TargetTime:
+    """Time of building one edge of the build graph, as written to the Ninja log.
+
+    :var str target: Outputs of the edge separated by spaces.
+    :var int start_ms: Milliseconds from the start of building to the start of the edge.
+    :var int end_ms: Milliseconds from the start of building to the end of the edge.
+    """
+
+    target: str
+    start_ms: int
+    end_ms: int
+
+    @property
+    def duration_ms(self) -> int:
+        """Milliseconds the edge took."""
+        return self.end_ms - self.start_ms
+
+
+@dataclass
+class TimeTraceSummary:
+    """Compile time of translation units merged from their clang `-ftime-trace` files.
+
+    :var int translation_units: Number of merged traces.
+    :var float frontend_ms: Milliseconds spent parsing and checking the sources.
+    :var float backend_ms: Milliseconds spent optimizing and generating the code.
+    :var dict[str, float] headers: Milliseconds spent in the most expensive headers
+        with the headers they include, the slowest first.
+    :var dict[str, float] templates: Milliseconds spent in the heaviest template
+        instantiations, the slowest first.
+    """
+
+    translation_units: int = 0
+    frontend_ms: float = 0
+    backend_ms: float = 0
+    headers: dict[str, float] = field(default_factory=dict)
+    templates: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class BuildResources:
+    """Resources used by one building.
+
+    :var int | None jobs: Number of building jobs, None if the build system chose it.
+    :var float | None seconds: Wall time of building, None if it doesn't tell
+        how fast `jobs` build from scratch.
+    :var int | None peak_memory_kb: Memory of the largest process run by building
+        in kilobytes, None if it is unknown.
+    :var bool oom_killed: Flag of a process of building killed for the lack of memory.
+    """
+
+    jobs: int | None
+    seconds: float | None
+    peak_memory_kb: int | None = None
+    oom_killed: bool = False
+
+
 @dataclass
 class Build:
     """Class with information about one build of project.
@@ -423,7 +519,25 @@ class Build:
     :var list[str] executables: List of relative to `build path` paths to executables
     :var str compiler_flags: Compiler flags for the build
     :var None | int jobs: Number of building jobs
+    :var None | int build_timeout: Seconds allowed for building, None for no limit
+    :var None | int run_timeout: Seconds allowed for each run of an executable, None for no limit
     :var bool successfully_built: Flag of completness of build
+    :var bool timed_out: Flag of building killed on `build_timeout`
+    :var CompilerCache | None compiler_cache: Cache to launch compilers through,
+    None to run them directly
+    :var CompilerCacheStats | None compiler_cache_stats: Work of `compiler_cache`
+    during the last building, None if it is unknown
+    :var bool incremental: Reuse the configuration and object files of the previous
+    building of the same configuration
+    :var str | None rebuild_reason: Why the last `incremental` building
+    was configured or built from scratch, None if it was not
+    :var list[TargetTime] | None target_times: Times of the edges run by the last
+    building with Ninja, None if they are unknown
+    :var bool time_trace: Compile with clang `-ftime-trace` and merge the traces
+    :var TimeTraceSummary | None time_trace_summary: Compile time of the last
+    building merged from the traces, None if it is unknown
+    :var BuildResources | None resources: Resources used by the last building,
+    None if the build was not built
     """
 
     build_machine: MachineInfo
@@ -435,7 +549,18 @@ class Build:
     compiler_flags: CompilerFlags | None
     config_flags: None | str
     jobs: None | int = None
+    build_timeout: None | int = None
+    run_timeout: None | int = None
     successfully_built: bool = True
+    timed_out: bool = False
+    compiler_cache: CompilerCache | None = None
+    compiler_cache_stats: CompilerCacheStats | None = None
+    incremental: bool = False
+    rebuild_reason: str | None = None
+    target_times: list[TargetTime] | None = None
+    time_trace: bool = False
+    time_trace_summary: TimeTraceSummary | None = None
+    resources: BuildResources | None = None
 
 
 @dataclass
@@ -445,6 +570,8 @@ class Project:
     :var str path: Path to project for research.
     :var list[Build] builds: List of project configurations to be build.
     :var IHighLevelBuildSystem build_system: High-level build system.
+    :var int | None max_parallel_builds: Maximum number of builds running at once
+        on all machines, None for no limit.
     """
 
     builds: list[Build]
@@ -454,6 +581,7 @@ class Project:
         path: str,
         builds: list[Build] | None = None,
         build_system: IHighLevelBuildSystem = DUMMY_BUILD_SYSTEM,
+        max_parallel_builds: int | None = None,
     ):
         self.path: str = path
         if builds is None:  # what's wrong with python?? (pylint W0102)
@@ -463,3 +591,4 @@ class Project:
         if not isinstance(self.builds, list):
             raise TypeError("class Project: 'builds' must have a list type")
         self.build_system = build_system
+        self.max_parallel_builds = max_parallel_builds
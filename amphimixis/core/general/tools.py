@@ -10,8 +10,15 @@ import os
 import pickle
 from pathlib import Path
 
-from amphimixis.core.general.constants import PERF_STATS_EXT
-from amphimixis.core.general.general import Project
+from amphimixis.core.general.constants import (
+    BUILD_LOG_EXT,
+    BUILD_TIMES_EXT,
+    BUILD_TRACE_EXT,
+    PERF_STATS_EXT,
+    SYNC_MANIFEST_EXT,
+    TIME_TRACE_EXT,
+)
+from amphimixis.core.general.general import MachineInfo, Project
 
 
 def build_filename(build_name: str, executable: str) -> str:
@@ -123,6 +130,61 @@ def project_name(project: Project):
     return os.path.basename(os.path.normpath(project.path))
 
 
+def build_log_filename(build_name: str) -> str:
+    """Return the name of the file the full build output is saved to.
+
+    :param str build_name: Name of the build configuration.
+    :return: Filename in ``<escaped-build>.buildlog`` form.
+    :rtype: str
+    """
+    return escape_filename_part(build_name) + BUILD_LOG_EXT
+
+
+def build_times_filename(build_name: str) -> str:
+    """Return the name of the file the report of building times is saved to.
+
+    :param str build_name: Name of the build configuration.
+    :return: Filename in ``<escaped-build>.buildtimes`` form.
+    :rtype: str
+    """
+    return escape_filename_part(build_name) + BUILD_TIMES_EXT
+
+
+def build_trace_filename(build_name: str) -> str:
+    """Return the name of the file the Chrome trace of building is saved to.
+
+    :param str build_name: Name of the build configuration.
+    :return: Filename in ``<escaped-build>.buildtrace.json`` form.
+    :rtype: str
+    """
+    return escape_filename_part(build_name) + BUILD_TRACE_EXT
+
+
+def time_trace_filename(build_name: str) -> str:
+    """Return the name of the file the report of merged clang time traces is saved to.
+
+    :param str build_name: Name of the build configuration.
+    :return: Filename in ``<escaped-build>.timetrace`` form.
+    :rtype: str
+    """
+    return escape_filename_part(build_name) + TIME_TRACE_EXT
+
+
+def sync_manifest_filename(machine: MachineInfo) -> str:
+    """Return the name of the file the manifest of files sent to the machine is saved to.
+
+    :param MachineInfo machine: Machine the files are sent to.
+    :return: Filename in ``<escaped-user@address:port>.syncmanifest`` form.
+    :rtype: str
+    """
+    user = f"{machine.auth.username}@" if machine.auth is not None else ""
+    port = f":{machine.auth.port}" if machine.auth is not None else ""
+    return (
+        escape_filename_part(f"{user}{machine.address or 'localhost'}{port}")
+        + SYNC_MANIFEST_EXT
+    )
+
+
 def get_cache_project() -> Project:
     """Load Project object saved to first .project file."""
     project_file = glob.glob("./*.project")[0]
@@ -0,0 +1,139 @@
+"""Module choosing the number of building jobs from the resources of the build machine."""
+
+import paramiko
+
+from amphimixis.core import logger
+from amphimixis.core.build_registry import BuildRegistry
+from amphimixis.core.general import Build, BuildResources, Project
+from amphimixis.core.shell import Shell
+
+_logger = logger.setup_logger("JOBS_TUNER")
+
+# a compilation of C++ commonly takes up to a gigabyte
+DEFAULT_MEMORY_PER_JOB_KB = 1024 * 1024
+MEMORY_MARGIN = 1.25
+HISTORY_LENGTH = 10
+
+
+class JobsTuner:
+    """Choose `Build.jobs` of builds whose recipe doesn't set it.
+
+    Jobs are limited by the processors and by the available memory of the machine
+    shared by the builds running on it at once. Resources used by the previous
+    buildings, saved by `BuildRegistry`, refine the memory needed by one job
+    and the number of jobs worth running.
+    """
+
+    @staticmethod
+    def choose_jobs(project: Project, build: Build, concurrent: int) -> int | None:
+        """Choose the jobs of the build for `BuildScheduler.run`.
+
+        :param Project project: project of the build
+        :param Build build: build without `Build.jobs`
+        :param int concurrent: number of builds running on the machine at once
+        :rtype: int | None
+        :return: number of jobs, None to let the build system choose it
+            if the machine can't be inspected
+        """
+        try:
+            shell = Shell(project, build.build_machine).connect()
+            profile = shell.machine_profile()
+            available_kb = JobsTuner.available_memory_kb(shell) or profile.mem_total_kb
+        except (OSError, RuntimeError, paramiko.SSHException) as e:
+            _logger.warning(
+                "Can't get resources of %s, jobs are not chosen: %s",
+                build.build_name,
+                e,
+            )
+            return None
+
+        jobs = JobsTuner.tune(
+            profile.nproc,
+            available_kb,
+            concurrent,
+            JobsTuner.history(build.build_name),
+        )
+        _logger.info(
+            "Build %s with %d jobs: %d processors, %d MiB of available memory, "
+            "%d builds at once",
+            build.build_name,
+            jobs,
+            profile.nproc,
+            available_kb // 1024,
+            concurrent,
+        )
+        return jobs
+
+    @staticmethod
+    def tune(
+        nproc: int, available_kb: int, concurrent: int, history: list[BuildResources]
+    ) -> int:
+        """Get the number of jobs of one of the builds running on a machine at once.
+
+        Every job is given the memory of the largest process of the previous
+        buildings with a margin, or `DEFAULT_MEMORY_PER_JOB_KB` if it is unknown.
+        After a building killed for the lack of memory, jobs are halved.
+        If a building with fewer jobs has been the fastest one, more jobs don't help
+        and the fewer jobs are used.
+
+        :param int nproc: number of processors of the machine
+        :param int available_kb: available memory of the machine in kilobytes,
+            0 if it is unknown
+        :param int concurrent: number of builds running on the machine at once
+        :param list[BuildResources] history: resources of the previous buildings
+        :rtype: int
+        :return: number of jobs, at least 1
+        """
+        concurrent = max(1, concurrent)
+        jobs = max(1, nproc // concurrent)
+
+        peaks = [record.peak_memory_kb for record in history if record.peak_memory_kb]
+        memory_per_job = (
+            int(max(peaks) * MEMORY_MARGIN) if peaks else DEFAULT_MEMORY_PER_JOB_KB
+        )
+        if available_kb > 0:
+            jobs = min(jobs, max(1, available_kb // concurrent // memory_per_job))
+
+        killed = [
+            record.jobs for record in history if record.oom_killed and record.jobs
+        ]
+        if killed:
+            jobs = min(jobs, max(1, min(killed) // 2))
+
+        timed = [
+            record
+            for record in history
+            if record.seconds is not None and record.jobs and not record.oom_killed
+        ]
+        if any(record.jobs and record.jobs >= jobs for record in timed):
+            fastest = min(timed, key=lambda record: record.seconds or 0)
+            jobs = min(jobs, fastest.jobs or jobs)
+
+        return jobs
+
+    @staticmethod
+    def available_memory_kb(shell: Shell) -> int:
+        """Get the memory available for new processes without swapping.
+
+        :param Shell shell: shell of the machine
+        :rtype: int
+        :return: `MemAvailable` in kilobytes, 0 if it can't be read
+        """
+        error, stdout, _ = shell.execute(
+            "awk '/^MemAvailable:/ {print $2}' /proc/meminfo"
+        )
+        value = "".join(stdout).strip()
+        if error != 0 or not value.isdigit():
+            return 0
+        return int(value)
+
+    @staticmethod
+    def history(build_name: str) -> list[BuildResources]:
+        """Get the resources used by the previous buildings of the build.
+
+        :param str build_name: name of the build
+        :rtype: list[BuildResources]
+        :return: at most `HISTORY_LENGTH` records, the oldest first,
+            see `BuildRegistry.resources`
+        """
+        return BuildRegistry.resources(build_name, HISTORY_LENGTH)
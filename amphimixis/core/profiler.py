@@ -64,6 +64,7 @@ class Profiler:
         self.ui = ui
         self.executables = build.executables.copy()
         self.shell = shell.Shell(self.project, self.machine, ui).connect()
+        self.shell.ensure_paranoid(-1)
         self.stats: dict[str, ProfileStats] = {}
         self.build_path = os.path.join(
             self.shell.get_project_workdir(), build.build_name
@@ -202,7 +203,7 @@ class Profiler:
             extra={"target": executable},
         )
 
-        error, stdout, stderr = self.shell.run(command)
+        error, stdout, stderr = self._run_executable(executable, command)
         if error != 0:
             stderr_message = "STDERR: " + "".join(stderr[0])
             stdout_message = "STDOUT: " + "".join(stdout[0])
@@ -259,8 +260,11 @@ class Profiler:
             )
             self.stats.update({executable: stats})
 
-        error, stdout, stderr = self.shell.run(
-            f"cd {working_directory}", f"{os.path.join(self.build_path, executable)}"
+        error, stdout, stderr = self._run_executable(
+            executable,
+            f"cd {working_directory}",
+            f"{os.path.join(self.build_path, executable)}",
+            pipelined=True,
         )
 
         if error != 0:
@@ -342,7 +346,7 @@ class Profiler:
             extra={"target": executable},
         )
 
-        error, _, stderr = self.shell.run(command)
+        error, _, stderr = self._run_executable(executable, command)
 
         if error != 0:
             self.logger.error(
@@ -425,7 +429,7 @@ class Profiler:
             extra={"target": executable},
         )
 
-        error, _, stderr = self.shell.run(command)
+        error, _, stderr = self._run_executable(executable, command)
         self.cleanup_files.append(
             os.path.join(working_directory, self.get_record_filename(executable))
         )
@@ -604,6 +608,34 @@ class Profiler:
             + constants.PERF_SCRIPT_EXT
         )
 
+    def _run_executable(
+        self, executable: str, *commands: str, pipelined: bool = False
+    ) -> tuple[int, list[list[str]], list[list[str]]]:
+        """Run commands running the executable within `run_timeout` of the build.
+
+        Sets `timed_out` of the executable stats if they are killed on timeout.
+        """
+        if executable not in self.stats:
+            stats = general.ProfileStats(
+                build_name=self.build.build_name, executable=executable
+            )
+            self.stats.update({executable: stats})
+
+        result = self.shell.run(
+            *commands, pipelined=pipelined, timeout=self.build.run_timeout
+        )
+        if result[0] == shell.TIMEOUT_EXIT_CODE:
+            self.logger.error(
+                "Executable timed out after %s seconds",
+                self.build.run_timeout,
+                extra={"target": executable},
+            )
+            self.stats[executable].timed_out = True
+        elif self.stats[executable].timed_out is None:
+            self.stats[executable].timed_out = False
+
+        return result
+
     def _get_stats_filename(self) -> str:
         return (
             tools.escape_filename_part(tools.project_name(self.project))
@@ -664,7 +696,9 @@ class Profiler:
 
     def _find_executables(self, max_number_of_executables=1) -> list[str]:
         error, stdout, stderr = self.shell.run(
-            f"cd {self.build_path}", 'find -type f -executable -name "*test*"'
+            f"cd {self.build_path}",
+            'find -type f -executable -name "*test*"',
+            pipelined=True,
         )
 
         if error != 0:
@@ -1,5 +1,24 @@
 """Shell module."""
 
-from amphimixis.core.shell.shell import Shell
+from amphimixis.core.general import TransferMethod
+from amphimixis.core.shell.async_shell import AsyncShell
+from amphimixis.core.shell.machine_profile import MachineProfile
+from amphimixis.core.shell.machine_transfer import copy_between_machines
+from amphimixis.core.shell.output_sink import OutputSink
+from amphimixis.core.shell.session_pool import SessionKey, SessionPool, session_key
+from amphimixis.core.shell.shell import TIMEOUT_EXIT_CODE, Shell
+from amphimixis.core.shell.source_sync import sync_directory
 
-__all__ = ["Shell"]
+__all__ = [
+    "Shell",
+    "AsyncShell",
+    "OutputSink",
+    "MachineProfile",
+    "SessionKey",
+    "SessionPool",
+    "TransferMethod",
+    "copy_between_machines",
+    "session_key",
+    "sync_directory",
+    "TIMEOUT_EXIT_CODE",
+]
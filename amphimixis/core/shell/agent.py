@@ -0,0 +1,341 @@
+"""Agent executing commands on a remote machine for `Shell`.
+
+The module is copied to the machine and started with `python3`, so it uses only
+the standard library and runs on Python 3.7 or newer. Requests are read from
+the stdin and replies are written to the stdout as frames: two big-endian
+32-bit lengths, a JSON header of the first length and raw data of the second one.
+
+Requests:
+
+- `{"op": "run", "id": int, "command": str, "cwd": str | None, "env": dict | None}`
+- `{"op": "kill", "id": int}`
+
+Replies:
+
+- `{"op": "ready", "version": int}` once the agent has started
+- `{"op": "out", "id": int, "stream": "stdout" | "stderr"}` with a chunk of output as data
+- `{"op": "exit", "id": int, "code": int, "utime": float, "stime": float,
+  "max_rss_kb": int, "cwd": str | None, "env": dict | None}` when a command exits
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import selectors
+import signal
+import struct
+import subprocess
+import sys
+import threading
+from collections.abc import Callable
+from typing import Any, BinaryIO
+
+PROTOCOL_VERSION = 1
+
+_LENGTHS = struct.Struct(">II")
+_READ_CHUNK_SIZE = 65536
+# ignored when the environment of a command is saved for the next one
+_VOLATILE_VARIABLES = frozenset({"_", "SHLVL", "OLDPWD"})
+# the command runs with the state descriptor closed, so background jobs
+# do not keep it open, then the working directory and the environment are saved to it
+_STATE_SCRIPT = """\
+{{
+{command}
+}} {state_fd}>&-
+_AMPHIMIXIS_RC=$?
+{{ pwd; env -0; }} >&{state_fd}
+exit $_AMPHIMIXIS_RC
+"""
+
+
+def encode_frame(header: dict[str, Any], data: bytes = b"") -> bytes:
+    """Encode one frame.
+
+    :param dict[str, Any] header: header of the frame, must be serializable to JSON
+    :param bytes data: raw data of the frame
+    :rtype: bytes
+    :return: the frame
+    """
+    payload = json.dumps(header, separators=(",", ":")).encode("UTF-8")
+    return _LENGTHS.pack(len(payload), len(data)) + payload + data
+
+
+def write_frame(stream: BinaryIO, header: dict[str, Any], data: bytes = b"") -> None:
+    """Write one frame and flush the stream.
+
+    :param BinaryIO stream: stream to write to
+    :param dict[str, Any] header: header of the frame, must be serializable to JSON
+    :param bytes data: raw data of the frame
+    """
+    stream.write(encode_frame(header, data))
+    stream.flush()
+
+
+def read_frame(read: Callable[[int], bytes]) -> tuple[dict[str, Any], bytes] | None:
+    """Read one frame.
+
+    :param Callable[[int], bytes] read: reads up to the given number of bytes,
+        empty bytes at the end of the stream
+    :rtype: tuple[dict[str, Any], bytes] | None
+    :return: header and data of the frame, None at the end of the stream
+    :raises EOFError: if the stream ends inside a frame
+    """
+    lengths = _read_exactly(read, _LENGTHS.size, allow_eof=True)
+    if lengths is None:
+        return None
+
+    header_size, data_size = _LENGTHS.unpack(lengths)
+    header = json.loads(_read_exactly(read, header_size) or b"{}")
+    data = _read_exactly(read, data_size) if data_size else b""
+    return (header, data or b"")
+
+
+def _read_exactly(
+    read: Callable[[int], bytes], size: int, allow_eof: bool = False
+) -> bytes | None:
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = read(size - len(chunks))
+        if not chunk:
+            if allow_eof and not chunks:
+                return None
+            raise EOFError("Stream ended inside a frame")
+        chunks.extend(chunk)
+    return bytes(chunks)
+
+
+def state_script(command: str, state_fd: int) -> str:
+    """Wrap the command to save the working directory and the environment it leaves.
+
+    :param str command: command to be executed by `bash`
+    :param int state_fd: descriptor to save the state to, see `parse_state`
+    :rtype: str
+    :return: script for `bash -c` exiting with the exit code of the command
+    """
+    return _STATE_SCRIPT.format(command=command, state_fd=state_fd)
+
+
+def parse_state(state: bytes) -> tuple[str, dict[str, str]] | None:
+    """Parse the state saved by the `state_script`.
+
+    :param bytes state: everything written to the state descriptor
+    :rtype: tuple[str, dict[str, str]] | None
+    :return: working directory and exported variables, None if the command
+        has called `exit` or has been killed
+    """
+    cwd, separator, env = state.partition(b"\n")
+    if not separator:
+        return None
+
+    variables: dict[str, str] = {}
+    for entry in env.split(b"\0"):
+        name, separator, value = entry.partition(b"=")
+        if separator and os.fsdecode(name) not in _VOLATILE_VARIABLES:
+            variables[os.fsdecode(name)] = os.fsdecode(value)
+    return (os.fsdecode(cwd), variables)
+
+
+def spawn(
+    command: str,
+    state_fd: int,
+    cwd: str | None = None,
+    env: dict[str, str] | None = None,
+) -> subprocess.Popen:
+    """Start the command wrapped by the `state_script` in a new session.
+
+    :param str command: command to be executed by `bash`
+    :param int state_fd: descriptor to save the state to, inherited by `bash`
+    :param str | None cwd: working directory, the current one if None
+    :param dict[str, str] | None env: whole environment, the current one if None
+    :rtype: subprocess.Popen
+    :return: process with piped stdout and stderr, it must be reaped by the caller
+    """
+    # reaped by the caller with `reap`
+    # pylint: disable-next=consider-using-with
+    return subprocess.Popen(
+        ["bash", "--noprofile", "--norc", "-c", state_script(command, state_fd)],
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        pass_fds=(state_fd,),
+        start_new_session=True,  # to kill the command with its children
+    )
+
+
+def read_output(
+    process: subprocess.Popen,
+    state_fd: int,
+    forward: Callable[[int, bytes], None],
+    stop: Callable[[], bool] = lambda: False,
+) -> bytes:
+    """Forward the output of a process started by `spawn` until `bash` exits.
+
+    Output of background jobs is not waited for after `bash` has exited,
+    the stdout and the stderr of the process are closed.
+
+    :param subprocess.Popen process: the process
+    :param int state_fd: read end of the state descriptor of the process
+    :param Callable[[int, bytes], None] forward: called with the descriptor
+        of the stdout or the stderr and a chunk read from it
+    :param Callable[[], bool] stop: checked every second, reading stops if it returns True
+    :rtype: bytes
+    :return: everything written to the state descriptor
+    """
+    streams = [process.stdout.fileno(), process.stderr.fileno()]  # type: ignore[union-attr]
+    state = bytearray()
+    with selectors.DefaultSelector() as selector:
+        for fd in [*streams, state_fd]:
+            os.set_blocking(fd, False)
+            selector.register(fd, selectors.EVENT_READ)
+
+        # the state descriptor is closed when `bash` exits
+        while state_fd in selector.get_map() and not stop():
+            for key, _ in selector.select(timeout=1):
+                data = _read_available(key.fd)
+                if data is None:
+                    continue
+                if not data:
+                    selector.unregister(key.fd)
+                elif key.fd == state_fd:
+                    state.extend(data)
+                else:
+                    forward(key.fd, data)
+
+    for fd in streams:
+        data = _read_available(fd)
+        while data:
+            forward(fd, data)
+            data = _read_available(fd)
+
+    process.stdout.close()  # type: ignore[union-attr]
+    process.stderr.close()  # type: ignore[union-attr]
+    return bytes(state)
+
+
+def reap(process: subprocess.Popen) -> tuple[int, float, float, int]:
+    """Wait for the process to exit and get its resource usage.
+
+    :param subprocess.Popen process: process started by `spawn`
+    :rtype: tuple[int, float, float, int]
+    :return: exit code, negative number of the signal if the process was killed,
+        user and system CPU time in seconds and peak resident set size in kilobytes
+    """
+    _, status, rusage = os.wait4(process.pid, 0)
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    return (process.returncode, rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss)
+
+
+class Agent:
+    """Serve requests of one `Shell` session, commands run at the same time.
+
+    :param BinaryIO requests: stream to read requests from
+    :param BinaryIO replies: stream to write replies to
+    """
+
+    def __init__(self, requests: BinaryIO, replies: BinaryIO) -> None:
+        self._requests = requests
+        self._replies = replies
+        self._write_lock = threading.Lock()
+        self._processes: dict[int, subprocess.Popen] = {}
+        self._lock = threading.Lock()
+
+    def serve(self) -> None:
+        """Execute requests until the end of the requests stream."""
+        self._send({"op": "ready", "version": PROTOCOL_VERSION})
+        while True:
+            frame = read_frame(self._requests.read)
+            if frame is None:
+                break
+
+            request = frame[0]
+            if request.get("op") == "run":
+                threading.Thread(target=self._run, args=(request,), daemon=True).start()
+            elif request.get("op") == "kill":
+                self._kill(request["id"])
+
+        with self._lock:
+            ids = list(self._processes)
+        for command_id in ids:
+            self._kill(command_id)
+
+    def _run(self, request: dict[str, Any]) -> None:
+        command_id = request["id"]
+        state_read, state_write = os.pipe()
+        try:
+            process = spawn(
+                request["command"], state_write, request.get("cwd"), request.get("env")
+            )
+        except OSError as e:
+            os.close(state_read)
+            self._send(
+                {"op": "out", "id": command_id, "stream": "stderr"}, f"{e}\n".encode()
+            )
+            self._send({"op": "exit", "id": command_id, "code": 127})
+            return
+        finally:
+            os.close(state_write)
+
+        with self._lock:
+            self._processes[command_id] = process
+
+        streams = {
+            process.stdout.fileno(): "stdout",  # type: ignore[union-attr]
+            process.stderr.fileno(): "stderr",  # type: ignore[union-attr]
+        }
+        try:
+            state = read_output(
+                process,
+                state_read,
+                lambda fd, data: self._send(
+                    {"op": "out", "id": command_id, "stream": streams[fd]}, data
+                ),
+            )
+        finally:
+            os.close(state_read)
+        code, user_time, system_time, max_rss_kb = reap(process)
+        with self._lock:
+            del self._processes[command_id]
+
+        parsed = parse_state(state)
+        self._send(
+            {
+                "op": "exit",
+                "id": command_id,
+                "code": code,
+                "utime": user_time,
+                "stime": system_time,
+                "max_rss_kb": max_rss_kb,
+                "cwd": parsed[0] if parsed is not None else None,
+                "env": parsed[1] if parsed is not None else None,
+            }
+        )
+
+    def _kill(self, command_id: int) -> None:
+        with self._lock:
+            process = self._processes.get(command_id)
+            if process is None:
+                return
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(process.pid, signal.SIGKILL)
+
+    def _send(self, header: dict[str, Any], data: bytes = b"") -> None:
+        with self._write_lock:
+            write_frame(self._replies, header, data)
+
+
+def _read_available(fd: int) -> bytes | None:
+    try:
+        return os.read(fd, _READ_CHUNK_SIZE)
+    except BlockingIOError:
+        return None
+
+
+if __name__ == "__main__":
+    Agent(sys.stdin.buffer, sys.stdout.buffer).serve()
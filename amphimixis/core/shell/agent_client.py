@@ -0,0 +1,331 @@
+"""Host side of the remote agent, see `amphimixis.core.shell.agent`."""
+
+import atexit
+import hashlib
+import itertools
+import queue
+import shlex
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from amphimixis.core import logger
+from amphimixis.core.general import MachineInfo
+from amphimixis.core.shell import agent
+from amphimixis.core.shell.direct_runner import split_lines
+from amphimixis.core.shell.session_pool import SessionKey, session_key
+from amphimixis.core.shell.shell_interface import (
+    CommandResult,
+    ICommandPipe,
+    ICommandRunner,
+    IShellHandler,
+)
+
+_logger = logger.setup_logger("AGENT")
+
+# folder on the machine relative to the home directory, the agent file is named by its hash
+AGENT_DIRECTORY = ".cache/amphimixis"
+_ABANDONED = "abandoned"
+
+
+@dataclass
+class AgentResult(CommandResult):
+    """Exit status of a command run by the agent.
+
+    :var str | None cwd: working directory left by the command, None if it is unknown
+    :var dict[str, str] | None env: exported variables left by the command, None if they are unknown
+    """
+
+    cwd: str | None = None
+    env: dict[str, str] | None = field(default=None, repr=False)
+
+
+class AgentClient:
+    """Connection to a running agent, commands can be run from several threads at once.
+
+    :param ICommandPipe pipe: pipe of the started agent, owned by the client
+    :raises ConnectionError: if the agent has not reported that it is ready
+    """
+
+    def __init__(self, pipe: ICommandPipe) -> None:
+        self._pipe = pipe
+        self._write_lock = threading.Lock()
+        self._replies: dict[int, queue.SimpleQueue] = {}
+        self._replies_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._alive = True
+
+        try:
+            frame = agent.read_frame(pipe.read)
+        except (OSError, EOFError, ValueError) as e:
+            pipe.close()
+            raise ConnectionError(f"Agent did not start: {e}") from e
+        if frame is None or frame[0].get("version") != agent.PROTOCOL_VERSION:
+            pipe.close()
+            raise ConnectionError(f"Agent did not start: {frame}")
+
+        self._reader = threading.Thread(target=self._read_replies, daemon=True)
+        self._reader.start()
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def run(
+        self,
+        command: str,
+        on_stdout: Callable[[bytes], None],
+        on_stderr: Callable[[bytes], None],
+        cwd: str | None = None,
+        env: dict[str, str] | None = None,
+        on_start: Callable[[int], None] | None = None,
+    ) -> AgentResult:
+        """Run the command and wait for it to exit.
+
+        :param str command: command to be executed by `bash`
+        :param Callable[[bytes], None] on_stdout: called for every chunk of the stdout
+        :param Callable[[bytes], None] on_stderr: called for every chunk of the stderr
+        :param str | None cwd: working directory, home directory if None
+        :param dict[str, str] | None env: whole environment, the one of the agent if None
+        :param Callable[[int], None] | None on_start: called with the ID of the command
+            once it is sent, the ID is needed to `kill` or `abandon` it
+        :rtype: AgentResult
+        :return: exit status of the command, -9 if it has been abandoned
+        :raises BrokenPipeError: if the connection to the agent is lost
+        """
+        command_id = next(self._ids)
+        replies: queue.SimpleQueue = queue.SimpleQueue()
+        with self._replies_lock:
+            if not self._alive:
+                raise BrokenPipeError("Agent has exited")
+            self._replies[command_id] = replies
+
+        try:
+            self._send(
+                {
+                    "op": "run",
+                    "id": command_id,
+                    "command": command,
+                    "cwd": cwd,
+                    "env": env,
+                }
+            )
+            if on_start is not None:
+                on_start(command_id)
+
+            while True:
+                reply = replies.get()
+                if reply is None:
+                    raise BrokenPipeError("Agent has exited")
+
+                header, data = reply
+                if header["op"] == "out":
+                    (on_stdout if header["stream"] == "stdout" else on_stderr)(data)
+                elif header["op"] == _ABANDONED:
+                    return AgentResult(-9)
+                elif header["op"] == "exit":
+                    return AgentResult(
+                        exit_code=header["code"],
+                        user_time=header.get("utime"),
+                        system_time=header.get("stime"),
+                        max_rss_kb=header.get("max_rss_kb"),
+                        cwd=header.get("cwd"),
+                        env=header.get("env"),
+                    )
+        finally:
+            with self._replies_lock:
+                self._replies.pop(command_id, None)
+
+    def kill(self, command_id: int) -> None:
+        """Kill the command with all processes it has started.
+
+        :param int command_id: ID of the command passed to `on_start`
+        """
+        try:
+            self._send({"op": "kill", "id": command_id})
+        except OSError as e:
+            _logger.error("Can't kill command %d: %s", command_id, e)
+
+    def abandon(self, command_id: int) -> None:
+        """Make `run` of the command return without waiting for it.
+
+        :param int command_id: ID of the command passed to `on_start`
+        """
+        self._dispatch(command_id, ({"op": _ABANDONED}, b""))
+
+    def is_alive(self) -> bool:
+        """Check whether the agent is still running.
+
+        :rtype: bool
+        :return: True if commands can be run
+        """
+        return self._alive
+
+    def close(self) -> None:
+        """Stop the agent, it kills the commands still running.
+
+        The connection may be already lost, e.g. when agents are stopped at exit.
+        """
+        try:
+            self._pipe.close()
+        except (OSError, EOFError) as e:
+            _logger.warning("Error while stopping the agent: %s", e)
+
+    def _send(self, header: dict[str, Any]) -> None:
+        with self._write_lock:
+            self._pipe.write(agent.encode_frame(header))
+
+    def _read_replies(self) -> None:
+        try:
+            while (frame := agent.read_frame(self._pipe.read)) is not None:
+                self._dispatch(frame[0].get("id"), frame)
+        except (OSError, EOFError, ValueError) as e:
+            _logger.error("Connection to the agent is lost: %s", e)
+
+        with self._replies_lock:
+            self._alive = False
+            for replies in self._replies.values():
+                replies.put(None)
+
+    def _dispatch(self, command_id: Any, reply: tuple[dict[str, Any], bytes]) -> None:
+        with self._replies_lock:
+            replies = self._replies.get(command_id)
+        if replies is not None:
+            replies.put(reply)
+
+
+def agent_path() -> str:
+    """Get the path to the agent on a machine relative to the home directory.
+
+    :rtype: str
+    :return: path that changes with the content of the agent
+    """
+    digest = hashlib.sha256(Path(agent.__file__).read_bytes()).hexdigest()[:16]
+    return f"{AGENT_DIRECTORY}/agent-{digest}.py"
+
+
+def start_agent(handler: IShellHandler) -> AgentClient:
+    """Upload the agent to the machine of the session if needed and start it.
+
+    :param IShellHandler handler: session of the machine
+    :rtype: AgentClient
+    :return: client of the started agent
+    :raises ConnectionError: if the agent can't be started, e.g. there is no `python3`
+    """
+    path = agent_path()
+    error, _, _ = handler.exec_command(f"test -f {shlex.quote(path)}")
+    if error != 0:
+        upload = (
+            f"mkdir -p {AGENT_DIRECTORY} && cat > {shlex.quote(path)}.tmp && "
+            f"mv {shlex.quote(path)}.tmp {shlex.quote(path)}"
+        )
+        with handler.open_pipe(upload) as pipe:
+            pipe.write(Path(agent.__file__).read_bytes())
+            pipe.close_stdin()
+            error, stderr = pipe.wait()
+        if error != 0:
+            raise ConnectionError(f"Can't upload the agent: {stderr.strip()}")
+
+    return AgentClient(handler.open_pipe(f"exec python3 -u {shlex.quote(path)}"))
+
+
+class AgentPool:
+    """Running agents, one per machine, shared like sessions of `SessionPool`."""
+
+    _lock = threading.Lock()
+    _agents: dict[SessionKey, AgentClient] = {}
+
+    @staticmethod
+    def acquire(machine: MachineInfo, handler: IShellHandler) -> AgentClient:
+        """Get the running agent of the machine, start it if there is no one.
+
+        :param MachineInfo machine: machine to get the agent of
+        :param IShellHandler handler: live session of the machine to start the agent with
+        :rtype: AgentClient
+        :return: client of the agent
+        :raises ConnectionError: if the agent can't be started
+        """
+        key = session_key(machine)
+        with AgentPool._lock:
+            client = AgentPool._agents.get(key)
+            if client is None or not client.is_alive():
+                client = start_agent(handler)
+                AgentPool._agents[key] = client
+            return client
+
+    @staticmethod
+    def close_all() -> None:
+        """Stop all agents."""
+        with AgentPool._lock:
+            for client in AgentPool._agents.values():
+                client.close()
+            AgentPool._agents.clear()
+
+
+# registered after `SessionPool.close_all`, so agents are stopped before their sessions
+atexit.register(AgentPool.close_all)
+
+
+class _AgentRunner(ICommandRunner):
+    """Run commands of one `Shell` through the agent of its machine.
+
+    Like `_DirectRunner`, the working directory and exported variables
+    left by a command are passed to the next one.
+    """
+
+    def __init__(self, client: AgentClient) -> None:
+        self.cwd: str | None = None
+        self.env: dict[str, str] | None = None
+        self._client = client
+        self._command_id: int | None = None
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        command: str,
+        on_stdout: Callable[[str], None],
+        on_stderr: Callable[[str], None],
+    ) -> CommandResult:
+        stdout, stderr = bytearray(), bytearray()
+        try:
+            result = self._client.run(
+                command,
+                lambda data: split_lines(stdout, on_stdout, data),
+                lambda data: split_lines(stderr, on_stderr, data),
+                self.cwd,
+                self.env,
+                on_start=self._started,
+            )
+        finally:
+            with self._lock:
+                self._command_id = None
+
+        for buffer, consume in ((stdout, on_stdout), (stderr, on_stderr)):
+            if buffer:
+                consume(buffer.decode("UTF-8", "replace"))
+
+        if result.cwd is not None:
+            self.cwd, self.env = result.cwd, result.env
+
+        return result
+
+    def is_alive(self) -> bool:
+        """Check whether the agent can still run commands.
+
+        :rtype: bool
+        :return: True if the agent is running
+        """
+        return self._client.is_alive()
+
+    def kill(self) -> None:
+        with self._lock:
+            if self._command_id is not None:
+                self._client.kill(self._command_id)
+
+    def abandon(self) -> None:
+        with self._lock:
+            if self._command_id is not None:
+                self._client.abandon(self._command_id)
+
+    def _started(self, command_id: int) -> None:
+        with self._lock:
+            self._command_id = command_id
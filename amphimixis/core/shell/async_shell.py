@@ -0,0 +1,261 @@
+"""Module for shell operations in asyncio event loop."""
+
+import asyncio
+import contextlib
+import os
+import time
+from typing import Self
+
+import paramiko
+
+from amphimixis.core import logger
+from amphimixis.core.general import IUI, NULL_UI, MachineInfo, Project, TransferMethod
+from amphimixis.core.shell.metrics import MetricKind, ShellMetric, ShellMetrics
+from amphimixis.core.shell.paramiko_shell_handler import (
+    _MAX_EXEC_CHANNELS,
+    _RECV_CHUNK_SIZE,
+    _ParamikoHandler,
+)
+from amphimixis.core.shell.shell import Shell
+
+# channel pipe is not signalled on exit status, so it is polled
+_EXIT_STATUS_POLL_INTERVAL = 0.1
+
+
+# AsyncShell shares the session and the copy helpers of the wrapped Shell
+# pylint: disable=protected-access
+class AsyncShell:
+    """Asyncio counterpart of the `Shell` class.
+
+    Every command is executed in its own process: an asyncio subprocess on the
+    local machine, a non-blocking channel of the pooled SSH session on the remote one.
+    Unlike `Shell.run`, the working directory is not kept between commands
+    and must be passed explicitly.
+
+    :param Project project: Project object.
+    :param MachineInfo machine: machine to run commands at.
+    :param int connect_timeout: connection timeout in seconds.
+    :param TransferMethod | None transfer: method of copying files to and from a remote
+        machine, `MachineInfo.transfer` if None.
+    """
+
+    def __init__(
+        self,
+        project: Project,
+        machine: MachineInfo,
+        ui: IUI = NULL_UI,
+        connect_timeout=10,
+        transfer: TransferMethod | None = None,
+    ):
+        self.project = project
+        self.machine = machine
+        self._logger = logger.setup_logger("ASYNC_SHELL")
+        self._ui = ui
+        self._shell = Shell(project, machine, ui, connect_timeout, transfer)
+        self._channels = asyncio.Semaphore(_MAX_EXEC_CHANNELS)
+
+    async def connect(self) -> Self:
+        """Connect to the machine, reuses the live session of the machine if there is one."""
+        await asyncio.to_thread(self._shell.connect)
+        return self
+
+    @property
+    def shell(self) -> Shell:
+        """Synchronous `Shell` sharing the session with this object."""
+        return self._shell
+
+    async def run(
+        self,
+        *commands: str,
+        cwd: str | None = None,
+        env: dict[str, str] | None = None,
+    ) -> tuple[int, list[list[str]], list[list[str]]]:
+        """Run the commands one by one until non-zero return code occurs.
+
+        :param str *commands: commands to be executed
+        :param str | None cwd: absolute path to the working directory of every command
+        :param dict[str, str] | None env: additional environment variables
+
+        :rtype: Tuple[int, List[List[str]], List[List[str]]]
+        :return: A tuple of three :
+
+            - :int: error code of the last executed command
+            - :List[List[str]]: List[str] is lines of the stdout of an executed command.
+            - :List[List[str]]: List[str] is lines of the stderr of an executed command.
+        """
+        # pylint: disable=duplicate-code
+        stdout: list[list[str]] = []
+        stderr: list[list[str]] = []
+        error_code = 0
+        for cmd in commands:
+            if error_code:
+                break
+
+            started = time.time()
+            start = time.monotonic()
+            if self.machine.address is None:
+                result = await self._run_local(cmd, cwd, env)
+            else:
+                result = await self._run_remote(cmd, cwd, env)
+            ShellMetrics.record(
+                ShellMetric(
+                    kind=MetricKind.EXECUTE,
+                    machine=self._shell._machine_name(),
+                    command=cmd,
+                    started=started,
+                    latency=time.monotonic() - start,
+                    exit_code=result[0],
+                    stdout_bytes=sum(len(line.encode()) for line in result[1]),
+                    stderr_bytes=sum(len(line.encode()) for line in result[2]),
+                    stdout_lines=len(result[1]),
+                    stderr_lines=len(result[2]),
+                )
+            )
+
+            self._ui.step()
+            error_code = result[0]
+            stdout.append(result[1])
+            stderr.append(result[2])
+
+        return (error_code, stdout, stderr)
+
+    async def copy_to_remote(self, source: str, destination: str) -> bool:
+        """Send a file or folder to the target machine.
+
+        Absolute paths are needed.
+
+        :param str source: absolute path to a file or folder on the host machine
+        :param str destination: absolute path to copy a file or folder to on the controlled machine
+
+        :return: True if successfully copied else False
+        """
+        if self._shell._uses_sftp():
+            return await asyncio.to_thread(
+                self._shell.copy_to_remote, source, destination
+            )
+
+        return await self._copy(
+            source, destination, self._shell._remote_path(destination), upload=True
+        )
+
+    async def copy_to_host(self, source: str, destination: str) -> bool:
+        """Get a file or folder from the target machine.
+
+        Absolute paths are needed.
+
+        :param str source: absolute path to a file or folder on the controlled machine
+        :param str destination: absolute path to copy a file or folder to on the host machine
+
+        :return: True if successfully copied else False
+        """
+        if self._shell._uses_sftp():
+            return await asyncio.to_thread(
+                self._shell.copy_to_host, source, destination
+            )
+
+        return await self._copy(
+            source, destination, self._shell._remote_path(source), upload=False
+        )
+
+    async def _copy(
+        self, source: str, destination: str, remote_path: str, upload: bool
+    ) -> bool:
+        copy_source, copy_destination = (
+            (source, remote_path) if upload else (remote_path, destination)
+        )
+        started = time.time()
+        start = time.monotonic()
+        self._logger.info("Copying %s -> %s", copy_source, copy_destination)
+        process = await asyncio.create_subprocess_exec(
+            *self._shell._copy_command(copy_source, copy_destination),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        output, _ = await process.communicate()
+
+        success = process.returncode == 0
+        moved = (
+            self._shell._copied_size(copy_source, output.decode(errors="replace"))
+            if success
+            else 0
+        )
+        self._shell._record_copy(source, destination, started, start, success, moved)
+        if not success:
+            self._logger.error("Error %s -> %s", copy_source, copy_destination)
+            return False
+
+        self._logger.info("Success %s -> %s", copy_source, copy_destination)
+        return True
+
+    async def _run_local(
+        self, command: str, cwd: str | None, env: dict[str, str] | None
+    ) -> tuple[int, list[str], list[str]]:
+        process = await asyncio.create_subprocess_exec(
+            "bash",
+            "--noprofile",
+            "--norc",
+            "-c",
+            command,
+            cwd=cwd,
+            env=os.environ | env if env is not None else None,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate()
+
+        return (
+            process.returncode if process.returncode is not None else -1,
+            stdout.decode("UTF-8", "replace").splitlines(keepends=True),
+            stderr.decode("UTF-8", "replace").splitlines(keepends=True),
+        )
+
+    async def _run_remote(
+        self, command: str, cwd: str | None, env: dict[str, str] | None
+    ) -> tuple[int, list[str], list[str]]:
+        if not self._shell._is_connected:
+            await self.connect()
+
+        handler = self._shell._shell
+        if not isinstance(handler, _ParamikoHandler):
+            raise TypeError(f"Remote machine {self.machine.address} has no SSH session")
+
+        async with self._channels:
+            chan = await asyncio.to_thread(handler.open_exec_channel, command, cwd, env)
+            with chan:
+                return await self._read_channel(chan)
+
+    @staticmethod
+    async def _read_channel(
+        chan: paramiko.Channel,
+    ) -> tuple[int, list[str], list[str]]:
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        stdout = bytearray()
+        stderr = bytearray()
+
+        chan.setblocking(False)
+        fd = chan.fileno()  # signalled when stdout or stderr data arrives
+        loop.add_reader(fd, readable.set)
+        try:
+            while True:
+                readable.clear()
+                while chan.recv_ready():
+                    stdout += chan.recv(_RECV_CHUNK_SIZE)
+                while chan.recv_stderr_ready():
+                    stderr += chan.recv_stderr(_RECV_CHUNK_SIZE)
+
+                if chan.exit_status_ready() and chan.eof_received:
+                    if not chan.recv_ready() and not chan.recv_stderr_ready():
+                        break
+
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(readable.wait(), _EXIT_STATUS_POLL_INTERVAL)
+        finally:
+            loop.remove_reader(fd)
+
+        return (
+            chan.recv_exit_status(),
+            stdout.decode("UTF-8", "replace").splitlines(keepends=True),
+            stderr.decode("UTF-8", "replace").splitlines(keepends=True),
+        )
@@ -0,0 +1,111 @@
+"""Running local commands in their own processes without a persistent shell."""
+
+import contextlib
+import os
+import signal
+import subprocess
+import threading
+from collections.abc import Callable
+
+from amphimixis.core.shell.agent import parse_state, read_output, reap, spawn
+from amphimixis.core.shell.shell_interface import CommandResult, ICommandRunner
+
+
+def split_lines(buffer: bytearray, consume: Callable[[str], None], data: bytes) -> None:
+    """Pass complete lines of the data to the callback, keep the rest in the buffer.
+
+    :param bytearray buffer: incomplete line left from the previous data
+    :param Callable[[str], None] consume: called for every complete line
+    :param bytes data: next chunk of the stream
+    """
+    buffer.extend(data)
+    start = 0
+    while (end := buffer.find(b"\n", start) + 1) != 0:
+        consume(buffer[start:end].decode("UTF-8", "replace"))
+        start = end
+    del buffer[:start]
+
+
+class _DirectRunner(ICommandRunner):
+    """Run every command in a new `bash` process on the local machine.
+
+    The working directory and exported variables left by a command
+    are passed to the next one, so `cd` and `export` keep working as in
+    a persistent shell. Other shell state, like unexported variables, is lost.
+    """
+
+    def __init__(self) -> None:
+        self.cwd = os.getcwd()
+        self.env = dict(os.environ)
+        self._process: subprocess.Popen | None = None
+        self._lock = threading.Lock()
+        self._abandoned = False
+
+    def run(
+        self,
+        command: str,
+        on_stdout: Callable[[str], None],
+        on_stderr: Callable[[str], None],
+    ) -> CommandResult:
+        state_read, state_write = os.pipe()
+        try:
+            with self._lock:
+                self._abandoned = False
+                self._process = spawn(command, state_write, self.cwd, self.env)
+                process = self._process
+        except OSError:
+            os.close(state_read)
+            raise
+        finally:
+            os.close(state_write)
+
+        try:
+            state = self._read(process, state_read, on_stdout, on_stderr)
+        finally:
+            os.close(state_read)
+            usage = reap(process)
+            with self._lock:
+                self._process = None
+
+        if (parsed := parse_state(state)) is not None:
+            self.cwd, self.env = parsed
+
+        return CommandResult(*usage)
+
+    def kill(self) -> None:
+        with self._lock:
+            if self._process is None:
+                return
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(self._process.pid, signal.SIGKILL)
+
+    def abandon(self) -> None:
+        with self._lock:
+            self._abandoned = True
+
+    def _read(
+        self,
+        process: subprocess.Popen,
+        state_fd: int,
+        on_stdout: Callable[[str], None],
+        on_stderr: Callable[[str], None],
+    ) -> bytes:
+        if process.stdout is None or process.stderr is None:
+            raise BrokenPipeError("Can't read output of the command")
+
+        outputs = {
+            process.stdout.fileno(): (bytearray(), on_stdout),
+            process.stderr.fileno(): (bytearray(), on_stderr),
+        }
+        state = read_output(
+            process,
+            state_fd,
+            lambda fd, data: split_lines(*outputs[fd], data),
+            lambda: self._abandoned,
+        )
+
+        for buffer, consume in outputs.values():
+            if buffer:
+                consume(buffer.decode("UTF-8", "replace"))
+
+        return state
@@ -1,8 +1,67 @@
 """Local shell handler implementation."""
 
+import os
+import selectors
 import subprocess
+import threading
+from collections.abc import Callable
 
-from amphimixis.core.shell.shell_interface import IShellHandler
+from amphimixis.core.shell.shell_interface import ICommandPipe, IShellHandler
+
+_READ_CHUNK_SIZE = 65536
+_STDOUT = 0
+_STDERR = 1
+
+
+class _LocalCommandPipe(ICommandPipe):
+    def __init__(self, command: str, cwd: str | None = None) -> None:
+        # closed in close()
+        # pylint: disable=consider-using-with
+        self.process = subprocess.Popen(
+            ["bash", "--noprofile", "--norc", "-c", command],
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self._stderr = b""
+        # stderr is drained concurrently, so the process never blocks on it
+        self._stderr_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stderr_reader.start()
+
+    def read(self, size: int) -> bytes:
+        if self.process.stdout is None:
+            raise BrokenPipeError("Can't read from process' stdout")
+        return os.read(self.process.stdout.fileno(), size)
+
+    def write(self, data: bytes) -> None:
+        if self.process.stdin is None:
+            raise BrokenPipeError("Can't write to process' stdin")
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def close_stdin(self) -> None:
+        if self.process.stdin is not None and not self.process.stdin.closed:
+            self.process.stdin.close()
+
+    def wait(self) -> tuple[int, str]:
+        returncode = self.process.wait()
+        self._stderr_reader.join()
+        return (returncode, self._stderr.decode("UTF-8", "replace"))
+
+    def close(self) -> None:
+        if self.process.poll() is None:
+            self.process.kill()
+        self.close_stdin()
+        self.process.wait()
+        self._stderr_reader.join()
+        if self.process.stdout is not None:
+            self.process.stdout.close()
+
+    def _read_stderr(self) -> None:
+        if self.process.stderr is not None:
+            self._stderr = self.process.stderr.read()
+            self.process.stderr.close()
 
 
 class _LocalShellHandler(IShellHandler):
@@ -22,7 +81,62 @@ class _LocalShellHandler(IShellHandler):
         ):
             raise BrokenPipeError()
 
+        # both pipes are drained by `read_streams` in one thread
+        self._fds = (self.shell.stdout.fileno(), self.shell.stderr.fileno())
+        for fd in self._fds:
+            os.set_blocking(fd, False)
+        self._buffers = (bytearray(), bytearray())
+        self._eof = [False, False]
+
     def __del__(self) -> None:
+        self.close()
+
+    def read_streams(
+        self,
+        on_stdout: Callable[[str], bool],
+        on_stderr: Callable[[str], bool],
+    ) -> None:
+        consumers = (on_stdout, on_stderr)
+        with selectors.DefaultSelector() as selector:
+            for stream in (_STDOUT, _STDERR):
+                if not self._consume_buffered(stream, consumers[stream]):
+                    selector.register(self._fds[stream], selectors.EVENT_READ, stream)
+
+            while selector.get_map():
+                for key, _ in selector.select():
+                    stream = key.data
+                    self._fill(stream)
+                    if self._consume_buffered(stream, consumers[stream]):
+                        selector.unregister(key.fd)
+
+    def exec_command(
+        self,
+        command: str,
+        cwd: str | None = None,
+        env: dict[str, str] | None = None,
+    ) -> tuple[int, list[str], list[str]]:
+        process = subprocess.run(
+            ["bash", "--noprofile", "--norc", "-c", command],
+            cwd=cwd,
+            env=os.environ | env if env is not None else None,
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            check=False,
+        )
+
+        return (
+            process.returncode,
+            process.stdout.decode("UTF-8", "replace").splitlines(keepends=True),
+            process.stderr.decode("UTF-8", "replace").splitlines(keepends=True),
+        )
+
+    def open_pipe(self, command: str, cwd: str | None = None) -> ICommandPipe:
+        return _LocalCommandPipe(command, cwd)
+
+    def is_alive(self) -> bool:
+        return self.shell.poll() is None
+
+    def close(self) -> None:
         self.shell.kill()
         self.shell.wait()
 
@@ -41,11 +155,47 @@ class _LocalShellHandler(IShellHandler):
         self.shell.stdin.flush()
 
     def stdout_readline(self) -> str:
-        if self.shell.stdout is None:
-            raise BrokenPipeError("Can't read from process' stdout")
-        return self.shell.stdout.readline().decode()
+        return self._readline(_STDOUT)
 
     def stderr_readline(self) -> str:
-        if self.shell.stderr is None:
-            raise BrokenPipeError("Can't read from process' stderr")
-        return self.shell.stderr.readline().decode()
+        return self._readline(_STDERR)
+
+    def _readline(self, stream: int) -> str:
+        while (line := self._next_line(stream)) is None:
+            with selectors.DefaultSelector() as selector:
+                selector.register(self._fds[stream], selectors.EVENT_READ)
+                selector.select()
+            self._fill(stream)
+
+        return line
+
+    def _fill(self, stream: int) -> None:
+        try:
+            data = os.read(self._fds[stream], _READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+
+        if data:
+            self._buffers[stream].extend(data)
+        else:
+            self._eof[stream] = True
+
+    def _next_line(self, stream: int) -> str | None:
+        """Pop a complete line from the buffer, "" at the end of the stream."""
+        buffer = self._buffers[stream]
+        end = buffer.find(b"\n") + 1
+        if end == 0:
+            if not self._eof[stream]:
+                return None
+            end = len(buffer)
+
+        line = buffer[:end].decode("UTF-8", "replace")
+        del buffer[:end]
+        return line
+
+    def _consume_buffered(self, stream: int, consume: Callable[[str], bool]) -> bool:
+        while (line := self._next_line(stream)) is not None:
+            if line == "" or consume(line):
+                return True
+
+        return False
@@ -0,0 +1,156 @@
+"""Facts about a machine collected in one round trip and cached on disk."""
+
+import pickle
+import shlex
+import threading
+from dataclasses import dataclass, field
+
+from amphimixis.core.general import MachineInfo
+from amphimixis.core.shell.session_pool import SessionKey, session_key
+
+MACHINE_PROFILES_FILE_NAME = ".machine_profiles"
+
+_BOOT_ID_KEY = "boot_id"
+_PROBE_SCRIPT = """\
+boot_id=$(cat /proc/sys/kernel/random/boot_id)
+echo "boot_id=$boot_id"
+[ "$boot_id" = {known_boot_id} ] && exit 0
+printf 'home=%s\\n' ~
+echo "arch=$(uname -m)"
+echo "nproc=$(nproc)"
+echo "mem_total_kb=$(awk '/^MemTotal:/ {{print $2}}' /proc/meminfo)"
+echo "cpu_model=$(grep -m1 -E '^(model name|Model|uarch|cpu model)' /proc/cpuinfo \
+| cut -d: -f2-)"
+echo "perf_event_paranoid=$(cat /proc/sys/kernel/perf_event_paranoid)"
+/usr/bin/time -f %M -o /dev/null true >/dev/null 2>&1 && echo "gnu_time=1"
+command -v perf >/dev/null 2>&1 || exit 0
+echo "perf_version=$(perf version 2>/dev/null)"
+[ -x "$(perf --exec-path 2>/dev/null)/perf-archive" ] && echo "perf_archive=1"
+echo "perf_events=$(perf list --raw-dump hw sw cache 2>/dev/null)"
+exit 0
+"""
+
+
+# pylint: disable=too-many-instance-attributes
+@dataclass
+class MachineProfile:
+    """Facts about a machine that do not change until it reboots.
+
+    :var str boot_id: identifier of the current boot of the machine
+    :var str home: home directory of the user
+    :var str arch: output of `uname -m`
+    :var int nproc: number of available processors
+    :var int mem_total_kb: total memory in kilobytes
+    :var str cpu_model: model of the CPU
+    :var int | None perf_event_paranoid: value of `kernel.perf_event_paranoid`
+    :var str | None perf_version: output of `perf version`, None if there is no perf
+    :var bool perf_archive: True if `perf archive` is available
+    :var list[str] perf_events: available hardware, software and cache perf events
+    :var bool gnu_time: True if GNU time is installed as `/usr/bin/time`
+    """
+
+    boot_id: str
+    home: str
+    arch: str
+    nproc: int = 1
+    mem_total_kb: int = 0
+    cpu_model: str = ""
+    perf_event_paranoid: int | None = None
+    perf_version: str | None = None
+    perf_archive: bool = False
+    perf_events: list[str] = field(default_factory=list)
+    gnu_time: bool = False
+
+
+def probe_command(known_boot_id: str = "") -> str:
+    """Get the command collecting the profile of a machine.
+
+    :param str known_boot_id: boot ID of the cached profile,
+        only the boot ID is printed if it is still the same
+    :rtype: str
+    :return: command for `bash`
+    """
+    return _PROBE_SCRIPT.format(known_boot_id=shlex.quote(known_boot_id))
+
+
+def parse_probe_output(
+    lines: list[str], cached: MachineProfile | None = None
+) -> MachineProfile:
+    """Parse the output of `probe_command`.
+
+    :param list[str] lines: stdout of the probe
+    :param MachineProfile | None cached: cached profile of the machine
+    :rtype: MachineProfile
+    :return: `cached` if the machine has not rebooted since it was collected, new profile otherwise
+    :raises ValueError: if the output is incomplete
+    """
+    values: dict[str, str] = {}
+    for line in lines:
+        key, separator, value = line.rstrip("\n").partition("=")
+        if separator:
+            values[key] = value.strip()
+
+    boot_id = values.get(_BOOT_ID_KEY, "")
+    if cached is not None and boot_id != "" and cached.boot_id == boot_id:
+        return cached
+
+    if not boot_id or not values.get("home") or not values.get("arch"):
+        raise ValueError(f"Incomplete machine probe output: {values}")
+
+    def as_int(key: str, default: int | None) -> int | None:
+        try:
+            return int(values[key])
+        except (KeyError, ValueError):
+            return default
+
+    return MachineProfile(
+        boot_id=boot_id,
+        home=values["home"],
+        arch=values["arch"],
+        nproc=as_int("nproc", 1) or 1,
+        mem_total_kb=as_int("mem_total_kb", 0) or 0,
+        cpu_model=values.get("cpu_model", ""),
+        perf_event_paranoid=as_int("perf_event_paranoid", None),
+        perf_version=values.get("perf_version") or None,
+        perf_archive=values.get("perf_archive") == "1",
+        perf_events=values.get("perf_events", "").split(),
+        gnu_time=values.get("gnu_time") == "1",
+    )
+
+
+class MachineProfileCache:
+    """Profiles of machines saved to `MACHINE_PROFILES_FILE_NAME` in the working directory."""
+
+    _lock = threading.Lock()
+
+    @staticmethod
+    def load(machine: MachineInfo) -> MachineProfile | None:
+        """Get the cached profile of the machine.
+
+        :param MachineInfo machine: machine to get the profile of
+        :rtype: MachineProfile | None
+        :return: cached profile, None if there is no one
+        """
+        with MachineProfileCache._lock:
+            return MachineProfileCache._load_all().get(session_key(machine))
+
+    @staticmethod
+    def store(machine: MachineInfo, profile: MachineProfile) -> None:
+        """Save the profile of the machine.
+
+        :param MachineInfo machine: machine the profile belongs to
+        :param MachineProfile profile: profile to save
+        """
+        with MachineProfileCache._lock:
+            profiles = MachineProfileCache._load_all()
+            profiles[session_key(machine)] = profile
+            with open(MACHINE_PROFILES_FILE_NAME, "wb") as file:
+                pickle.dump(profiles, file)
+
+    @staticmethod
+    def _load_all() -> dict[SessionKey, MachineProfile]:
+        try:
+            with open(MACHINE_PROFILES_FILE_NAME, "rb") as file:
+                return pickle.load(file)
+        except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+            return {}
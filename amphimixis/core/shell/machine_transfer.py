@@ -0,0 +1,136 @@
+"""Copying folders between two machines without storing them on the host."""
+
+import shlex
+
+from amphimixis.core import logger
+from amphimixis.core.shell.shell import Shell
+
+_logger = logger.setup_logger("MACHINE_TRANSFER")
+
+_RELAY_CHUNK_SIZE = 1 << 20
+# ssh exits with 255 on connection and authentication errors
+_SSH_CONNECTION_ERROR = 255
+
+
+def copy_between_machines(
+    source: Shell,
+    source_dir: str,
+    names: list[str],
+    destination: Shell,
+    destination_dir: str,
+) -> bool:
+    """Copy folders from one machine to another as a single `tar` stream.
+
+    If both machines are remote, the source machine first tries to send
+    the stream directly to the destination one over `ssh`, which needs
+    key-based access between them. Otherwise, or if it fails to connect,
+    the stream is relayed through the memory of the host.
+    Symbolic links are followed like `rsync --copy-links` does.
+
+    :param Shell source: shell of the machine to copy from
+    :param str source_dir: absolute path to the folder containing `names` on the source machine
+    :param list[str] names: names of the files and folders in `source_dir` to copy
+    :param Shell destination: shell of the machine to copy to
+    :param str destination_dir: absolute path to the folder to copy `names` into
+    :rtype: bool
+    :return: True if successfully copied else False
+    """
+    if not names:
+        return True
+
+    pack = f"tar -chf - {shlex.join(names)}"
+    unpack = (
+        f"mkdir -p {shlex.quote(destination_dir)} && "
+        f"tar -xf - -C {shlex.quote(destination_dir)}"
+    )
+
+    if source.machine.auth is not None and destination.machine.auth is not None:
+        result = _copy_directly(source, source_dir, pack, destination, unpack)
+        if result is not None:
+            return result
+
+    return _relay(source, source_dir, pack, destination, unpack)
+
+
+def _copy_directly(
+    source: Shell, source_dir: str, pack: str, destination: Shell, unpack: str
+) -> bool | None:
+    auth = destination.machine.auth
+    if auth is None:
+        return None
+
+    ssh = shlex.join(
+        [
+            "ssh",
+            "-o",
+            "BatchMode=yes",
+            "-o",
+            "StrictHostKeyChecking=no",
+            "-o",
+            "UserKnownHostsFile=/dev/null",
+            "-p",
+            str(auth.port),
+            f"{auth.username}@{destination.machine.address}",
+            unpack,
+        ]
+    )
+    _logger.info(
+        "Copying %s:%s -> %s directly",
+        source.machine.address,
+        source_dir,
+        destination.machine.address,
+    )
+    error_code, _, stderr = source.execute(
+        f"set -o pipefail; {pack} | {ssh}", cwd=source_dir
+    )
+    if error_code == 0:
+        _logger.info(
+            "Success %s -> %s", source.machine.address, destination.machine.address
+        )
+        return True
+
+    if error_code == _SSH_CONNECTION_ERROR:
+        _logger.info(
+            "%s can't connect to %s, relaying through the host: %s",
+            source.machine.address,
+            destination.machine.address,
+            "".join(stderr).strip(),
+        )
+        return None
+
+    _logger.error("Error %s -> %s: %s", source_dir, unpack, "".join(stderr).strip())
+    return False
+
+
+def _relay(
+    source: Shell, source_dir: str, pack: str, destination: Shell, unpack: str
+) -> bool:
+    _logger.info(
+        "Relaying %s:%s -> %s",
+        source.machine.address or "localhost",
+        source_dir,
+        destination.machine.address or "localhost",
+    )
+    try:
+        with (
+            source.open_pipe(pack, cwd=source_dir) as reader,
+            destination.open_pipe(unpack) as writer,
+        ):
+            while chunk := reader.read(_RELAY_CHUNK_SIZE):
+                writer.write(chunk)
+            writer.close_stdin()
+
+            pack_code, pack_error = reader.wait()
+            unpack_code, unpack_error = writer.wait()
+    except OSError as e:
+        _logger.error("Error relaying %s: %s", source_dir, e)
+        return False
+
+    if pack_code != 0 or unpack_code != 0:
+        _logger.error(
+            "Error relaying %s: %s", source_dir, (pack_error + unpack_error).strip()
+        )
+        return False
+
+    _logger.info("Success relaying %s", source_dir)
+    return True
@@ -0,0 +1,169 @@
+"""Counters of the work done by shells of the current process."""
+
+import csv
+import dataclasses
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from enum import StrEnum
+
+
+class MetricKind(StrEnum):
+    """Kinds of operations measured by `ShellMetrics`."""
+
+    RUN = "run"
+    EXECUTE = "execute"
+    COPY = "copy"
+
+
+# pylint: disable=too-many-instance-attributes
+@dataclass
+class ShellMetric:
+    """Measurements of one operation of a shell.
+
+    :var MetricKind kind: kind of the operation
+    :var str machine: address of the machine, `localhost` for the local one
+    :var str command: command line, or `source -> destination` for copies
+    :var float started: time the operation started at, seconds since the epoch
+    :var float latency: wall time of the operation in seconds
+    :var int exit_code: exit code of the last command, 0 or 1 for copies
+    :var int round_trips: number of times the shell waited for the machine to reply
+    :var int stdout_bytes: bytes read from the stdout including barriers
+    :var int stderr_bytes: bytes read from the stderr including barriers
+    :var int stdout_lines: lines read from the stdout including barriers
+    :var int stderr_lines: lines read from the stderr including barriers
+    :var int bytes_moved: bytes of files copied, only the changed ones for rsync,
+        0 for commands
+    :var float | None user_time: CPU time of commands in user mode in seconds,
+        known for commands run in their own processes
+    :var float | None system_time: CPU time of commands in kernel mode in seconds
+    :var int | None max_rss_kb: peak resident set size of the largest command in kilobytes
+    """
+
+    kind: MetricKind
+    machine: str
+    command: str
+    started: float
+    latency: float
+    exit_code: int = 0
+    round_trips: int = 1
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    stdout_lines: int = 0
+    stderr_lines: int = 0
+    bytes_moved: int = 0
+    user_time: float | None = None
+    system_time: float | None = None
+    max_rss_kb: int | None = None
+
+
+class ShellMetrics:
+    """Metrics of all shells, kept in memory until they are exported."""
+
+    _lock = threading.Lock()
+    _metrics: list[ShellMetric] = []
+
+    @staticmethod
+    def record(metric: ShellMetric) -> None:
+        """Add the metric.
+
+        :param ShellMetric metric: measurements of a finished operation
+        """
+        with ShellMetrics._lock:
+            ShellMetrics._metrics.append(metric)
+
+    @staticmethod
+    def metrics() -> list[ShellMetric]:
+        """Get the recorded metrics.
+
+        :rtype: list[ShellMetric]
+        :return: metrics in the order the operations finished
+        """
+        with ShellMetrics._lock:
+            return ShellMetrics._metrics.copy()
+
+    @staticmethod
+    def clear() -> None:
+        """Forget all recorded metrics."""
+        with ShellMetrics._lock:
+            ShellMetrics._metrics.clear()
+
+    @staticmethod
+    def export(path: str) -> bool:
+        """Save the recorded metrics and forget them.
+
+        The format is CSV if `path` ends with `.csv`, JSON otherwise.
+        Nothing is saved if there are no metrics.
+
+        :param str path: path to the file to save the metrics to
+        :rtype: bool
+        :return: True if the file has been written
+        """
+        with ShellMetrics._lock:
+            metrics, ShellMetrics._metrics = ShellMetrics._metrics, []
+
+        if not metrics:
+            return False
+
+        rows = [dataclasses.asdict(metric) for metric in metrics]
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            if os.path.splitext(path)[1].lower() == ".csv":
+                writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                json.dump(rows, file, indent=2)
+
+        return True
+
+
+class StreamCounter:
+    """Count bytes and lines passing through an output consumer."""
+
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.lines = 0
+
+    def count(self, line: str) -> None:
+        """Count one line read from the stream.
+
+        :param str line: line including the newline
+        """
+        self.bytes += len(line.encode("utf-8", errors="surrogateescape"))
+        self.lines += 1
+
+
+def host_size(path: str) -> int:
+    """Get the size of files of a file or folder on the host, following links.
+
+    :param str path: path to a file or folder
+    :rtype: int
+    :return: total size in bytes, 0 if the path does not exist
+    """
+    if not os.path.isdir(path):
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    size = 0
+    for root, _, filenames in os.walk(path, followlinks=True):
+        for name in filenames:
+            full_path = os.path.join(root, name)
+            if os.path.exists(full_path):
+                size += os.path.getsize(full_path)
+    return size
+
+
+def rsync_transferred_size(output: str) -> int:
+    """Get the size of files transferred by rsync from its `--stats` output.
+
+    :param str output: stdout of rsync
+    :rtype: int
+    :return: size in bytes, 0 if the statistics are missing
+    """
+    match = re.search(r"^Total transferred file size: ([\d,.]+)", output, re.MULTILINE)
+    if match is None:
+        return 0
+
+    # digits are grouped with the separator of the locale
+    return int(re.sub(r"\D", "", match.group(1)))
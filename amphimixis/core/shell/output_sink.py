@@ -0,0 +1,77 @@
+"""Sink for streamed command output."""
+
+import threading
+from collections import deque
+from typing import Self, TextIO
+
+DEFAULT_TAIL_LINES = 200
+
+
+class OutputSink:
+    """Write command output to a log file keeping only its tail in memory.
+
+    Can be passed to `Shell.run` to stream output instead of accumulating it.
+
+    :param str | None log_path: path to the log file, output is not saved if None
+    :param int tail_lines: number of the last lines of each stream kept in memory
+    """
+
+    def __init__(
+        self, log_path: str | None = None, tail_lines: int = DEFAULT_TAIL_LINES
+    ):
+        self.log_path = log_path
+        self._stdout_tail: deque[str] = deque(maxlen=tail_lines)
+        self._stderr_tail: deque[str] = deque(maxlen=tail_lines)
+        self._lock = threading.Lock()
+        self._file: TextIO | None = None
+        if log_path is not None:
+            # closed in close()
+            # pylint: disable-next=consider-using-with
+            self._file = open(log_path, "w", encoding="UTF-8")  # noqa: SIM115
+
+    def __enter__(self) -> Self:
+        """Return the sink itself."""
+        return self
+
+    def __exit__(self, *_) -> None:
+        """Close the log file."""
+        self.close()
+
+    def write_stdout(self, line: str) -> None:
+        """Receive a line of the stdout.
+
+        :param str line: line of the stdout
+        """
+        self._write(line, self._stdout_tail)
+
+    def write_stderr(self, line: str) -> None:
+        """Receive a line of the stderr.
+
+        :param str line: line of the stderr
+        """
+        self._write(line, self._stderr_tail)
+
+    @property
+    def stdout_tail(self) -> str:
+        """Last lines of the stdout."""
+        with self._lock:
+            return "".join(self._stdout_tail)
+
+    @property
+    def stderr_tail(self) -> str:
+        """Last lines of the stderr."""
+        with self._lock:
+            return "".join(self._stderr_tail)
+
+    def close(self) -> None:
+        """Close the log file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, line: str, tail: deque[str]) -> None:
+        with self._lock:
+            tail.append(line)
+            if self._file is not None:
+                self._file.write(line)
@@ -1,13 +1,121 @@
 """SSH shell handler implementation."""
 
+import shlex
+import socket
+import threading
+from collections.abc import Callable
 from ctypes import ArgumentError
 
 import paramiko
 
 from amphimixis.core.general import MachineInfo
-from amphimixis.core.shell.shell_interface import IShellHandler
+from amphimixis.core.shell.shell_interface import ICommandPipe, IShellHandler
 
 _CLEAR_OUTPUT_FLAG = "CLEAR_OUTPUT_FLAG"
+_RECV_CHUNK_SIZE = 32768
+# OpenSSH allows 10 sessions per connection by default, one is the interactive shell
+_MAX_EXEC_CHANNELS = 8
+
+
+def _wrap_command(
+    command: str,
+    cwd: str | None = None,
+    env: dict[str, str] | None = None,
+    keep_stdin: bool = False,
+) -> str:
+    """Build a self-contained `bash` command line for an exec channel.
+
+    :param str command: command to be executed
+    :param str | None cwd: absolute path to the working directory
+    :param dict[str, str] | None env: additional environment variables
+    :param bool keep_stdin: connect stdin of the command to the channel
+    :rtype: str
+    :return: command line for `exec_command`
+    """
+    script = ""
+    if cwd is not None:
+        script += f"cd {shlex.quote(cwd)} && "
+    for name, value in (env or {}).items():
+        script += f"export {name}={shlex.quote(value)} && "
+    script += command
+
+    command_line = f"bash --noprofile --norc -c {shlex.quote(script)}"
+    if keep_stdin:
+        return command_line
+
+    return command_line + " 0<&-"
+
+
+class _ChannelLineReader:
+    """Buffered line reader over one stream of a paramiko channel.
+
+    Data is received in chunks of `_RECV_CHUNK_SIZE` bytes,
+    a partial line is kept in the buffer until the next call.
+
+    :param Callable[[int], bytes] recv: `chan.recv` or `chan.recv_stderr`
+    """
+
+    def __init__(self, recv: Callable[[int], bytes]) -> None:
+        self._recv = recv
+        self._buffer = bytearray()
+        self._scanned = 0  # bytes of the buffer known to contain no newline
+
+    def readline(self) -> str:
+        """Read the next line including the trailing newline.
+
+        :rtype: str
+        :return: the next line or the rest of the data if the stream is closed,
+                 empty string if there is no data left
+        """
+        while (newline := self._buffer.find(b"\n", self._scanned)) == -1:
+            self._scanned = len(self._buffer)
+            chunk = self._recv(_RECV_CHUNK_SIZE)
+            if not chunk:
+                line = bytes(self._buffer)
+                self._buffer.clear()
+                self._scanned = 0
+                return line.decode("UTF-8", "replace")
+            self._buffer += chunk
+
+        line = bytes(self._buffer[: newline + 1])
+        del self._buffer[: newline + 1]
+        self._scanned = 0
+        return line.decode("UTF-8", "replace")
+
+
+class _ChannelCommandPipe(ICommandPipe):
+    def __init__(self, chan: paramiko.Channel, release: Callable[[], None]) -> None:
+        self.chan = chan
+        # gives back the exec channel slot taken for the pipe
+        self._release: Callable[[], None] | None = release
+
+    def read(self, size: int) -> bytes:
+        return self.chan.recv(size)
+
+    def write(self, data: bytes) -> None:
+        self.chan.sendall(data)
+
+    def close_stdin(self) -> None:
+        self.chan.shutdown_write()
+
+    def wait(self) -> tuple[int, str]:
+        stderr = bytearray()
+        while chunk := self.chan.recv_stderr(_RECV_CHUNK_SIZE):
+            stderr += chunk
+        return (self.chan.recv_exit_status(), stderr.decode("UTF-8", "replace"))
+
+    def close(self) -> None:
+        try:
+            self.chan.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+def _read_all_lines(reader: _ChannelLineReader, output: list[str]) -> None:
+    while line := reader.readline():
+        output.append(line)
 
 
 class _ParamikoHandler(IShellHandler):
@@ -34,10 +142,19 @@ class _ParamikoHandler(IShellHandler):
 
         if (transport := self.client.get_transport()) is not None:
             transport.set_keepalive(60)
+            # commands and barriers are small writes waiting for a reply,
+            # Nagle's algorithm holds each one back until the previous is acknowledged
+            if isinstance(transport.sock, socket.socket):
+                transport.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.chan = transport.open_session()
         else:
             raise ConnectionError("Can't get transport")
 
+        self._transport = transport
+        self._exec_channels = threading.BoundedSemaphore(_MAX_EXEC_CHANNELS)
+        self._stdout_reader = _ChannelLineReader(self.chan.recv)
+        self._stderr_reader = _ChannelLineReader(self.chan.recv_stderr)
+
         self.chan.invoke_shell()
         self.chan.send(b"exec bash --norc --noprofile\n")
 
@@ -45,6 +162,89 @@ class _ParamikoHandler(IShellHandler):
         self._read_until_marker()
 
     def __del__(self) -> None:
+        self.close()
+
+    def exec_command(
+        self,
+        command: str,
+        cwd: str | None = None,
+        env: dict[str, str] | None = None,
+    ) -> tuple[int, list[str], list[str]]:
+        with self._exec_channels, self.open_exec_channel(command, cwd, env) as chan:
+            stdout: list[str] = []
+            stderr: list[str] = []
+            stderr_reader = threading.Thread(
+                target=_read_all_lines,
+                args=(_ChannelLineReader(chan.recv_stderr), stderr),
+            )
+            stderr_reader.start()
+            _read_all_lines(_ChannelLineReader(chan.recv), stdout)
+            stderr_reader.join()
+
+            return (chan.recv_exit_status(), stdout, stderr)
+
+    def open_pipe(self, command: str, cwd: str | None = None) -> ICommandPipe:
+        # the pipe holds its channel slot until it is closed
+        # pylint: disable-next=consider-using-with
+        self._exec_channels.acquire()
+        try:
+            chan = self.open_exec_channel(command, cwd, keep_stdin=True)
+        except OSError:
+            self._exec_channels.release()
+            raise
+
+        return _ChannelCommandPipe(chan, self._exec_channels.release)
+
+    def open_exec_channel(
+        self,
+        command: str,
+        cwd: str | None = None,
+        env: dict[str, str] | None = None,
+        keep_stdin: bool = False,
+    ) -> paramiko.Channel:
+        """Start the command in a new exec channel of the SSH connection.
+
+        :param str command: command to be executed
+        :param str | None cwd: absolute path to the working directory
+        :param dict[str, str] | None env: additional environment variables
+        :param bool keep_stdin: connect stdin of the command to the channel
+        :rtype: paramiko.Channel
+        :return: channel of the started command, the caller must close it
+        """
+        try:
+            chan = self._transport.open_session()
+        except (OSError, paramiko.SSHException) as e:
+            raise OSError(f"Can't execute command: {e}") from e
+
+        try:
+            chan.exec_command(_wrap_command(command, cwd, env, keep_stdin))
+        except (OSError, paramiko.SSHException) as e:
+            chan.close()
+            raise OSError(f"Can't execute command: {e}") from e
+
+        return chan
+
+    def open_sftp(self) -> paramiko.SFTPClient:
+        """Open a new SFTP client on the SSH connection.
+
+        :rtype: paramiko.SFTPClient
+        :return: SFTP client, the caller must close it
+        """
+        try:
+            sftp = paramiko.SFTPClient.from_transport(self._transport)
+        except (OSError, paramiko.SSHException) as e:
+            raise OSError(f"Can't open SFTP session: {e}") from e
+
+        if sftp is None:
+            raise OSError("Can't open SFTP session")
+
+        return sftp
+
+    def is_alive(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active() and not self.chan.closed
+
+    def close(self) -> None:
         self.client.close()
 
     def run(self, command: str) -> None:
@@ -54,22 +254,10 @@ class _ParamikoHandler(IShellHandler):
             raise OSError(f"Can't send command: {e}") from e
 
     def stdout_readline(self) -> str:
-        line = ""
-        while char := self.chan.recv(1).decode("UTF-8", "replace"):
-            line += char
-            if char == "\n":
-                break
-
-        return line
+        return self._stdout_reader.readline()
 
     def stderr_readline(self) -> str:
-        line = ""
-        while char := self.chan.recv_stderr(1).decode("UTF-8", "replace"):
-            line += char
-            if char == "\n":
-                break
-
-        return line
+        return self._stderr_reader.readline()
 
     def _send_marker(self):
         self.chan.send((f"echo {_CLEAR_OUTPUT_FLAG}\n").encode())
@@ -0,0 +1,110 @@
+"""Process-wide pool of shell sessions shared by all `Shell` instances."""
+
+import atexit
+import threading
+from collections.abc import Callable
+
+from amphimixis.core import logger
+from amphimixis.core.general import MachineInfo
+from amphimixis.core.shell.shell_interface import IShellHandler
+
+_logger = logger.setup_logger("SESSION_POOL")
+
+SessionKey = tuple[str | None, str | None, int | None]
+
+
+def session_key(machine: MachineInfo) -> SessionKey:
+    """Get the pool key of the machine.
+
+    :param MachineInfo machine: machine to get key for
+    :rtype: SessionKey
+    :return: tuple of address, username and port, `(None, None, None)` for local machine
+    """
+    if machine.auth is None:
+        return (machine.address, None, None)
+
+    return (machine.address, machine.auth.username, machine.auth.port)
+
+
+class SessionPool:
+    """Registry of live shell sessions keyed by machine.
+
+    A session is created once per machine and handed out to every `Shell`
+    connecting to the same machine. Dead sessions are replaced on the next
+    acquire, all sessions are closed at interpreter exit.
+    """
+
+    _sessions: dict[SessionKey, IShellHandler] = {}
+    _run_locks: dict[SessionKey, threading.Lock] = {}
+    _connect_locks: dict[SessionKey, threading.Lock] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def acquire(
+        machine: MachineInfo, factory: Callable[[], IShellHandler]
+    ) -> tuple[IShellHandler, threading.Lock, bool]:
+        """Get a live session for the machine, create it if needed.
+
+        :param MachineInfo machine: machine to get the session for
+        :param Callable[[], IShellHandler] factory: creates a new session,
+            called only if there is no live session for the machine
+        :rtype: tuple[IShellHandler, threading.Lock, bool]
+        :return: A tuple of three elements:
+
+            - IShellHandler: the session.
+            - threading.Lock: lock to be held while running commands in the session.
+            - bool: True if the session has just been created, False otherwise.
+        """
+        key = session_key(machine)
+        with SessionPool._lock:
+            connect_lock = SessionPool._connect_locks.setdefault(key, threading.Lock())
+
+        # connecting to different machines must not wait for each other
+        with connect_lock:
+            with SessionPool._lock:
+                handler = SessionPool._sessions.get(key)
+                if handler is not None and handler.is_alive():
+                    return (handler, SessionPool._run_locks[key], False)
+
+            if handler is not None:
+                _logger.warning("Session to %s is dead, reconnecting", machine.address)
+                SessionPool._close_handler(handler)
+
+            handler = factory()
+            with SessionPool._lock:
+                SessionPool._sessions[key] = handler
+                run_lock = SessionPool._run_locks.setdefault(key, threading.Lock())
+
+        return (handler, run_lock, True)
+
+    @staticmethod
+    def release(machine: MachineInfo) -> None:
+        """Close the session of the machine and remove it from the pool.
+
+        :param MachineInfo machine: machine whose session is closed
+        """
+        with SessionPool._lock:
+            handler = SessionPool._sessions.pop(session_key(machine), None)
+
+        if handler is not None:
+            SessionPool._close_handler(handler)
+
+    @staticmethod
+    def close_all() -> None:
+        """Close all sessions in the pool."""
+        with SessionPool._lock:
+            handlers = list(SessionPool._sessions.values())
+            SessionPool._sessions.clear()
+
+        for handler in handlers:
+            SessionPool._close_handler(handler)
+
+    @staticmethod
+    def _close_handler(handler: IShellHandler) -> None:
+        try:
+            handler.close()
+        except OSError as e:
+            _logger.warning("Error while closing session: %s", e)
+
+
+atexit.register(SessionPool.close_all)
@@ -0,0 +1,254 @@
+"""File transfer over SFTP channels of an already established SSH connection."""
+
+import os
+import posixpath
+import stat
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+from amphimixis.core import logger
+
+_logger = logger.setup_logger("SFTP")
+
+# every worker opens its own SFTP channel, keep below OpenSSH MaxSessions
+_SFTP_WORKERS = 4
+
+
+def sftp_path(path: str) -> str:
+    """Convert a remote path to the form understood by SFTP.
+
+    SFTP does not expand `~`, but resolves relative paths from the home directory.
+
+    :param str path: remote path, may start with `~`
+    :rtype: str
+    :return: path without `~` prefix
+    """
+    if path == "~":
+        return "."
+    if path.startswith("~/"):
+        return path[2:] or "."
+    return path
+
+
+class SftpTransfer:
+    """Copy files and folders over SFTP, several files at the same time.
+
+    The semantics of paths follows `rsync --mkpath`: a folder without trailing
+    slash is copied into the destination, a folder with trailing slash
+    copies its content. Files with the same size and modification time
+    on both sides are skipped.
+
+    :param Callable[[], paramiko.SFTPClient] open_sftp: opens a new SFTP client
+        on the existing connection
+    :param int workers: number of files transferred at the same time
+
+    :var int bytes_transferred: size of files copied so far, skipped files are not counted
+    """
+
+    def __init__(
+        self,
+        open_sftp: Callable[[], paramiko.SFTPClient],
+        workers: int = _SFTP_WORKERS,
+    ):
+        self._open_sftp = open_sftp
+        self._workers = workers
+        self._local = threading.local()
+        self._clients: list[paramiko.SFTPClient] = []
+        self._clients_lock = threading.Lock()
+        self.bytes_transferred = 0
+
+    def upload(self, source: str, destination: str) -> bool:
+        """Send a file or folder from the host to the remote machine.
+
+        :param str source: path on the host machine
+        :param str destination: path on the remote machine
+        :rtype: bool
+        :return: True if successfully copied else False
+        """
+        try:
+            sftp = self._sftp()
+            destination = sftp_path(destination)
+            target = self._target_path(source, destination, self._remote_isdir(sftp))
+            if not os.path.isdir(source):
+                self._remote_makedirs(sftp, posixpath.dirname(target))
+                return self._run([(source, target)], self._put)
+
+            files = []
+            for root, _, filenames in os.walk(source, followlinks=True):
+                remote_root = posixpath.normpath(
+                    posixpath.join(
+                        target, os.path.relpath(root, source).replace(os.sep, "/")
+                    )
+                )
+                self._remote_makedirs(sftp, remote_root)
+                files += [
+                    (os.path.join(root, name), posixpath.join(remote_root, name))
+                    for name in filenames
+                ]
+
+            return self._run(files, self._put)
+        except (OSError, paramiko.SSHException) as e:
+            _logger.error("Can't upload %s -> %s: %s", source, destination, e)
+            return False
+        finally:
+            self._close()
+
+    def download(self, source: str, destination: str) -> bool:
+        """Get a file or folder from the remote machine to the host.
+
+        :param str source: path on the remote machine
+        :param str destination: path on the host machine
+        :rtype: bool
+        :return: True if successfully copied else False
+        """
+        try:
+            sftp = self._sftp()
+            source = sftp_path(source)
+            target = self._target_path(source, destination, os.path.isdir)
+            if not stat.S_ISDIR(sftp.stat(source).st_mode or 0):
+                os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+                return self._run([(source, target)], self._get)
+
+            files: list[tuple[str, str]] = []
+            self._collect_remote_files(sftp, source, target, files)
+            return self._run(files, self._get)
+        except (OSError, paramiko.SSHException) as e:
+            _logger.error("Can't download %s -> %s: %s", source, destination, e)
+            return False
+        finally:
+            self._close()
+
+    def _run(
+        self,
+        files: list[tuple[str, str]],
+        copy_file: Callable[[str, str], None],
+    ) -> bool:
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            futures = [executor.submit(copy_file, src, dst) for src, dst in files]
+
+        success = True
+        for (src, dst), future in zip(files, futures, strict=True):
+            if (error := future.exception()) is not None:
+                _logger.error("Can't copy %s -> %s: %s", src, dst, error)
+                success = False
+
+        return success
+
+    def _put(self, local: str, remote: str) -> None:
+        sftp = self._sftp()
+        local_stat = os.stat(local)
+        try:
+            if self._is_same(sftp.stat(remote), local_stat):
+                return
+        except FileNotFoundError:
+            pass
+
+        sftp.put(local, remote)  # writes are pipelined by paramiko
+        self._count(local_stat.st_size)
+        sftp.chmod(remote, stat.S_IMODE(local_stat.st_mode))
+        sftp.utime(remote, (local_stat.st_atime, local_stat.st_mtime))
+
+    def _get(self, remote: str, local: str) -> None:
+        sftp = self._sftp()
+        remote_stat = sftp.stat(remote)
+        try:
+            if self._is_same(remote_stat, os.stat(local)):
+                return
+        except FileNotFoundError:
+            pass
+
+        sftp.get(remote, local, prefetch=True)  # reads are pipelined by paramiko
+        self._count(remote_stat.st_size or 0)
+        os.chmod(local, stat.S_IMODE(remote_stat.st_mode or 0o644))
+        if remote_stat.st_atime is not None and remote_stat.st_mtime is not None:
+            os.utime(local, (remote_stat.st_atime, remote_stat.st_mtime))
+
+    def _count(self, size: int) -> None:
+        with self._clients_lock:
+            self.bytes_transferred += size
+
+    @staticmethod
+    def _is_same(
+        remote_stat: paramiko.SFTPAttributes, local_stat: os.stat_result
+    ) -> bool:
+        # SFTP keeps modification time in whole seconds
+        return (
+            remote_stat.st_size == local_stat.st_size
+            and remote_stat.st_mtime is not None
+            and int(remote_stat.st_mtime) == int(local_stat.st_mtime)
+        )
+
+    def _collect_remote_files(
+        self,
+        sftp: paramiko.SFTPClient,
+        remote_dir: str,
+        local_dir: str,
+        files: list[tuple[str, str]],
+    ) -> None:
+        os.makedirs(local_dir, exist_ok=True)
+        for attr in sftp.listdir_attr(remote_dir):
+            remote = posixpath.join(remote_dir, attr.filename)
+            local = os.path.join(local_dir, attr.filename)
+            mode = attr.st_mode or 0
+            if stat.S_ISLNK(mode):  # links are followed like `rsync --copy-links`
+                mode = sftp.stat(remote).st_mode or 0
+            if stat.S_ISDIR(mode):
+                self._collect_remote_files(sftp, remote, local, files)
+            else:
+                files.append((remote, local))
+
+    def _remote_isdir(self, sftp: paramiko.SFTPClient) -> Callable[[str], bool]:
+        def isdir(path: str) -> bool:
+            try:
+                return stat.S_ISDIR(sftp.stat(path).st_mode or 0)
+            except FileNotFoundError:
+                return False
+
+        return isdir
+
+    @staticmethod
+    def _target_path(
+        source: str, destination: str, isdir: Callable[[str], bool]
+    ) -> str:
+        if source.endswith("/"):  # copy the content of the folder
+            return destination
+        if destination.endswith("/") or isdir(destination):
+            return posixpath.join(destination, os.path.basename(source))
+        return destination
+
+    @staticmethod
+    def _remote_makedirs(sftp: paramiko.SFTPClient, path: str) -> None:
+        if path in ("", ".", "/"):
+            return
+        try:
+            if stat.S_ISDIR(sftp.stat(path).st_mode or 0):
+                return
+        except FileNotFoundError:
+            pass
+
+        SftpTransfer._remote_makedirs(sftp, posixpath.dirname(path))
+        try:
+            sftp.mkdir(path)
+        except OSError:
+            # created by another worker in the meantime
+            if not stat.S_ISDIR(sftp.stat(path).st_mode or 0):
+                raise
+
+    def _sftp(self) -> paramiko.SFTPClient:
+        sftp = getattr(self._local, "sftp", None)
+        if sftp is None:
+            sftp = self._open_sftp()
+            self._local.sftp = sftp
+            with self._clients_lock:
+                self._clients.append(sftp)
+        return sftp
+
+    def _close(self) -> None:
+        with self._clients_lock:
+            for sftp in self._clients:
+                sftp.close()
+            self._clients.clear()
+        self._local = threading.local()
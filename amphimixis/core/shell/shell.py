@@ -1,19 +1,67 @@
 """Module for shell operations."""
 
+# pylint: disable=too-many-lines
+
 import os
+import secrets
 import socket
 import subprocess
 import threading
+import time
+from collections.abc import Callable
+from contextlib import nullcontext
 from ctypes import ArgumentError
 from typing import Self
 
 from amphimixis.core import logger
-from amphimixis.core.general import IUI, NULL_UI, MachineInfo, Project, constants
+from amphimixis.core.general import (
+    IUI,
+    NULL_UI,
+    MachineInfo,
+    Project,
+    TransferMethod,
+    constants,
+)
+from amphimixis.core.shell.agent_client import AgentPool, _AgentRunner
+from amphimixis.core.shell.direct_runner import _DirectRunner
 from amphimixis.core.shell.local_shell_handler import _LocalShellHandler
+from amphimixis.core.shell.machine_profile import (
+    MachineProfile,
+    MachineProfileCache,
+    parse_probe_output,
+    probe_command,
+)
+from amphimixis.core.shell.metrics import (
+    MetricKind,
+    ShellMetric,
+    ShellMetrics,
+    StreamCounter,
+    host_size,
+    rsync_transferred_size,
+)
+from amphimixis.core.shell.output_sink import OutputSink
 from amphimixis.core.shell.paramiko_shell_handler import _ParamikoHandler
-from amphimixis.core.shell.shell_interface import IShellHandler
+from amphimixis.core.shell.session_pool import SessionPool
+from amphimixis.core.shell.sftp_transfer import SftpTransfer
+from amphimixis.core.shell.shell_interface import (
+    CommandResult,
+    ICommandPipe,
+    ICommandRunner,
+    IShellHandler,
+)
+from amphimixis.core.shell.watchdog import Watchdog
+
+# returned by `Shell.run` for a command killed on timeout, the same as `timeout` does
+TIMEOUT_EXIT_CODE = 124
 
 _READING_BARRIER_FLAG = "READING_BARRIER_FLAG"
+_BATCH_RC_VARIABLE = "_AMPHIMIXIS_BATCH_RC"
+_BATCH_END = "end"
+# with job control every command of the session runs in its own process group
+_KILL_SESSION_JOBS = (
+    "for pid in $(pgrep -P {pid}); do "
+    "kill -KILL -- -$pid 2>/dev/null || kill -KILL $pid; done"
+)
 
 
 # pylint: disable=too-many-instance-attributes
@@ -21,46 +69,100 @@ class Shell:
     """Shell class to manage shell operations.
 
     `bash` is used as shell.
+    Sessions are taken from `SessionPool`, so all `Shell` instances
+    connected to the same machine share one session.
 
     :param Project project: Project object.
     :param MachineInfo machine: machine to run profiling at.
     :param int connect_timeout: connection timeout in seconds.
+    :param TransferMethod | None transfer: method of copying files to and from a remote
+        machine, SFTP reuses the SSH session, rsync spawns `ssh` for every copy.
+        If None, `MachineInfo.transfer` is used.
+    :param bool direct_local: on the local machine, run every command of `run`
+        in its own process instead of the shared session. Only the working directory
+        and exported variables are kept between commands, and `Shell` instances
+        can run commands at the same time.
+    :param bool | None agent: on a remote machine, run every command of `run` in its own
+        process started by an agent uploaded to the machine, like `direct_local` does.
+        The agent needs `python3` on the machine, the shared session is used without it.
+        If None, the agent is used on machines running several builds at once,
+        see `MachineInfo.max_builds`.
     """
 
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
     def __init__(
         self,
         project: Project,
         machine: MachineInfo,
         ui: IUI = NULL_UI,
         connect_timeout=10,
+        transfer: TransferMethod | None = None,
+        direct_local: bool = True,
+        agent: bool | None = None,
     ):
         self.project = project
         self.connect_timeout = connect_timeout
+        self.transfer = transfer if transfer is not None else machine.transfer
+        self.direct_local = direct_local
+        self.agent = agent if agent is not None else machine.max_builds > 1
         self.machine = machine
         self._logger = logger.setup_logger("SHELL")
         self._shell: IShellHandler
         self._ui = ui
         self._project_workdir: str = ""
         self._homedir: str = ""
+        self._profile: MachineProfile | None = None
+        self._session_pid: int | None = None
+        self._runner: ICommandRunner | None = None
+        self._results: list[CommandResult] = []
+        self._runner_lock = threading.Lock()
+        self._stdout_counter = StreamCounter()
+        self._stderr_counter = StreamCounter()
+        self._round_trips = 0
         self._is_connected: bool = False
         self._is_local: bool = False
         self._ui_lock = threading.Lock()
+        self._run_lock = threading.Lock()
 
     def connect(self) -> Self:
-        """Connect to the shell of the machine."""
+        """Connect to the shell of the machine.
+
+        Reuses the live session of the machine if there is one.
+        """
+        self._shell, self._run_lock, _ = SessionPool.acquire(
+            self.machine, self._create_shell
+        )
+        self._session_pid = None
+        self._is_local = self.machine.address is None
+        if self._is_local and self.direct_local and self._runner is None:
+            self._runner = _DirectRunner()
+        elif not self._is_local and self.agent:
+            self._connect_agent()
+        self._is_connected = True
+
+        return self
+
+    def _connect_agent(self) -> None:
+        if isinstance(self._runner, _AgentRunner) and self._runner.is_alive():
+            return
+
+        try:
+            self._runner = _AgentRunner(AgentPool.acquire(self.machine, self._shell))
+        except (ConnectionError, OSError) as e:
+            self._logger.warning(
+                "Can't start agent on [%s], using the shared session: %s",
+                self.machine.address,
+                e,
+            )
+            self._runner = None
+
+    def _create_shell(self) -> IShellHandler:
         if self.machine.address is None:
             self._create_local_shell()
         else:
             self._create_remote_shell()
 
-        self._is_connected = True
-        level, _ = self.set_paranoid(-1)
-        if level != -1:
-            self._logger.error(
-                "Can't set /proc/sys/kernel/perf_event_paranoid to -1. Set it manually"
-            )
-
-        return self
+        return self._shell
 
     def _create_local_shell(self) -> None:
         self._shell = _LocalShellHandler()
@@ -87,7 +189,14 @@ class Shell:
         self._shell = _ParamikoHandler(self.machine, self.connect_timeout)
         self._is_local = False
 
-    def run(self, *commands: str) -> tuple[int, list[list[str]], list[list[str]]]:
+    def run(
+        self,
+        *commands: str,
+        sink: OutputSink | None = None,
+        pipelined: bool = False,
+        timeout: float | None = None,
+        total_timeout: float | None = None,
+    ) -> tuple[int, list[list[str]], list[list[str]]]:
         """Run the commands through the shell.
 
         - Execute commands one by one until:
@@ -96,6 +205,24 @@ class Shell:
             all commands have been executed.
 
         :param str *commands: commands to be executed
+        :param OutputSink | None sink: if set, output lines are streamed to the sink
+            as they arrive and the returned lists of lines are empty
+        :param bool pipelined: send all commands at once instead of waiting
+            for each command to finish before sending the next one.
+            Saves a round trip per command on remote machines,
+            commands after the failed one are still skipped.
+        :param float | None timeout: seconds allowed for each command
+        :param float | None total_timeout: seconds allowed for all commands.
+            On timeout, process groups of the running command are killed,
+            the rest of commands is skipped and `TIMEOUT_EXIT_CODE` is returned.
+
+        With `direct_local` on the local machine or `agent` on a remote one,
+        commands are executed one by one in their own processes,
+        `pipelined` is not needed.
+
+        Shells of one machine share a session, which is held for the whole call.
+        The working directory set by `cd` may be changed by another shell
+        between calls, so `cd` is sent in the same call as the commands it is for.
 
         :rtype: Tuple[int, List[List[str]], List[List[str]]]
         :return: A tuple of three :
@@ -104,11 +231,192 @@ class Shell:
             - :List[List[str]]: List[str] is lines of the stdout of an executed command.
             - :List[List[str]]: List[str] is lines of the stderr of an executed command.
         """
+        with self._runner_lock if self._runner is not None else self._run_lock:
+            self._stdout_counter = StreamCounter()
+            self._stderr_counter = StreamCounter()
+            self._round_trips = 0
+            self._results = []
+            started = time.time()
+            start = time.monotonic()
+            error_code = -1
+            try:
+                if self._runner is not None:
+                    result = self._run_direct(
+                        self._runner, commands, sink, timeout, total_timeout
+                    )
+                elif timeout is not None or total_timeout is not None:
+                    result = self._run_with_timeout(
+                        commands, sink, pipelined, timeout, total_timeout
+                    )
+                elif pipelined and len(commands) > 1:
+                    result = self._run_pipelined(commands, sink)
+                else:
+                    result = self._run_commands(commands, sink)
+                error_code = result[0]
+                return result
+            finally:
+                metric = ShellMetric(
+                    kind=MetricKind.RUN,
+                    machine=self._machine_name(),
+                    command="\n".join(commands),
+                    started=started,
+                    latency=time.monotonic() - start,
+                    exit_code=error_code,
+                    round_trips=self._round_trips,
+                    stdout_bytes=self._stdout_counter.bytes,
+                    stderr_bytes=self._stderr_counter.bytes,
+                    stdout_lines=self._stdout_counter.lines,
+                    stderr_lines=self._stderr_counter.lines,
+                )
+                self._add_resource_usage(metric)
+                ShellMetrics.record(metric)
+
+    def _add_resource_usage(self, metric: ShellMetric) -> None:
+        """Sum resource usage of commands of the last `run`, if it is known."""
+        user = [r.user_time for r in self._results if r.user_time is not None]
+        system = [r.system_time for r in self._results if r.system_time is not None]
+        rss = [r.max_rss_kb for r in self._results if r.max_rss_kb is not None]
+        metric.user_time = sum(user) if user else None
+        metric.system_time = sum(system) if system else None
+        metric.max_rss_kb = max(rss) if rss else None
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def _run_direct(
+        self,
+        runner: ICommandRunner,
+        commands: tuple[str, ...],
+        sink: OutputSink | None,
+        timeout: float | None,
+        total_timeout: float | None,
+    ) -> tuple[int, list[list[str]], list[list[str]]]:
+        watchdog = None
+        if timeout is not None or total_timeout is not None:
+            watchdog = Watchdog(
+                timeout, total_timeout, on_timeout=runner.kill, on_stuck=runner.abandon
+            )
+
+        stdout: list[list[str]] = []
+        stderr: list[list[str]] = []
+        error_code = 0
+        with watchdog if watchdog is not None else nullcontext():
+            for cmd in commands:
+                if error_code or (watchdog is not None and not watchdog.restart()):
+                    break
+
+                cmd_stdout: list[str] = []
+                cmd_stderr: list[str] = []
+                self._round_trips += 1
+                result = runner.run(
+                    cmd,
+                    self._direct_reader(
+                        cmd_stdout,
+                        self._stdout_counter,
+                        sink.write_stdout if sink is not None else None,
+                    ),
+                    self._direct_reader(
+                        cmd_stderr,
+                        self._stderr_counter,
+                        sink.write_stderr if sink is not None else None,
+                    ),
+                )
+                self._results.append(result)
+                error_code = result.exit_code
+                stdout.append(cmd_stdout)
+                stderr.append(cmd_stderr)
+
+        if watchdog is not None and watchdog.expired:
+            self._logger.error(
+                "Command timed out on [%s], killed it", self._machine_name()
+            )
+            error_code = TIMEOUT_EXIT_CODE
+
+        return (error_code, stdout, stderr)
+
+    def _direct_reader(
+        self,
+        output: list[str],
+        counter: StreamCounter,
+        forward: Callable[[str], None] | None,
+    ) -> Callable[[str], None]:
+        def read(line: str) -> None:
+            self._ui.step()
+            counter.count(line)
+            if forward is not None:
+                forward(line)
+            else:
+                output.append(line)
+
+        return read
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def _run_with_timeout(
+        self,
+        commands: tuple[str, ...],
+        sink: OutputSink | None,
+        pipelined: bool,
+        timeout: float | None,
+        total_timeout: float | None,
+    ) -> tuple[int, list[list[str]], list[list[str]]]:
+        if self._session_pid is None:
+            _, pid_stdout, _ = self._run_commands(("echo $$",), None)
+            self._session_pid = int(pid_stdout[0][0])
+
+        handler = self._shell
+        kill = _KILL_SESSION_JOBS.format(pid=self._session_pid)
+        watchdog = Watchdog(
+            timeout,
+            total_timeout,
+            on_timeout=lambda: self._kill_timed_out(handler, kill),
+            on_stuck=handler.close,
+        )
+
+        handler.run("set -m")
+        result: tuple[int, list[list[str]], list[list[str]]] = (0, [], [])
+        try:
+            with watchdog:
+                if pipelined and len(commands) > 1:
+                    result = self._run_pipelined(commands, sink, watchdog.restart)
+                else:
+                    result = self._run_commands(commands, sink, watchdog.restart)
+        except BrokenPipeError:
+            if not watchdog.expired:
+                raise
+
+        if not watchdog.expired:
+            handler.run("set +m")
+            return result
+
+        if handler.is_alive():
+            handler.run("set +m")
+        else:
+            self._logger.warning(
+                "Session of [%s] is stuck after timeout, reconnecting",
+                self.machine.address or "local",
+            )
+            self.connect()
+
+        return (TIMEOUT_EXIT_CODE, result[1], result[2])
+
+    def _kill_timed_out(self, handler: IShellHandler, kill: str) -> None:
+        self._logger.error(
+            "Command timed out on [%s], killing it", self.machine.address or "local"
+        )
+        try:
+            handler.exec_command(kill)
+        except OSError as e:
+            self._logger.error("Can't kill timed out command: %s", e)
+
+    def _run_commands(
+        self,
+        commands: tuple[str, ...],
+        sink: OutputSink | None,
+        on_command: Callable[[], bool] | None = None,
+    ) -> tuple[int, list[list[str]], list[list[str]]]:
         stdout: list[list[str]] = []
         stderr: list[list[str]] = []
         error_code = 0
         for cmd in commands:
-            if error_code:
+            if error_code or (on_command is not None and not on_command()):
                 break
 
             # Close stdin since reading from stdin
@@ -123,48 +431,233 @@ class Shell:
             cmd_stderr: list[str] = []
             command_error_code: list[int] = []
 
-            stdout_reader = threading.Thread(
-                target=self._read_stdout_until_barrier,
-                args=(cmd_stdout, command_error_code),
-            )
-            stderr_reader = threading.Thread(
-                target=self._read_stderr_until_barrier, args=(cmd_stderr,)
+            self._read_streams(
+                self._stdout_barrier_reader(
+                    cmd_stdout,
+                    command_error_code,
+                    sink.write_stdout if sink is not None else None,
+                ),
+                self._stderr_barrier_reader(
+                    cmd_stderr, sink.write_stderr if sink is not None else None
+                ),
             )
 
-            stdout_reader.start()
-            stderr_reader.start()
-            stdout_reader.join()
-            stderr_reader.join()
-
-            error_code = command_error_code[0]
             stdout.append(cmd_stdout)
             stderr.append(cmd_stderr)
+            if not command_error_code:
+                raise BrokenPipeError("Shell output ended before the barrier")
+
+            error_code = command_error_code[0]
 
         return (error_code, stdout, stderr)
 
-    def _read_stdout_until_barrier(
-        self, output: list[str], error_code: list[int]
+    def _run_pipelined(
+        self,
+        commands: tuple[str, ...],
+        sink: OutputSink | None,
+        on_command: Callable[[], bool] | None = None,
+    ) -> tuple[int, list[list[str]], list[list[str]]]:
+        nonce = secrets.token_hex(8)
+        self._shell.run(f"{_BATCH_RC_VARIABLE}=0")
+        for i, cmd in enumerate(commands):
+            # each command runs only if all previous ones succeeded
+            self._shell.run(f'if [ "${_BATCH_RC_VARIABLE}" -eq 0 ]; then')
+            self._shell.run(cmd + " 0<&-")
+            self._shell.run(f"{_BATCH_RC_VARIABLE}=$?")
+            self._send_batch_barriers(nonce, str(i))
+            self._shell.run("fi")
+        self._send_batch_barriers(nonce, _BATCH_END)
+
+        stdout: list[list[str]] = []
+        stderr: list[list[str]] = []
+        error_code: list[int] = []
+        self._read_streams(
+            self._batch_reader(
+                nonce,
+                stdout,
+                error_code,
+                sink.write_stdout if sink is not None else None,
+                on_command,
+            ),
+            self._batch_reader(
+                nonce, stderr, None, sink.write_stderr if sink is not None else None
+            ),
+        )
+
+        if not error_code:
+            raise BrokenPipeError("Shell output ended before the batch barrier")
+
+        return (error_code[0], stdout, stderr)
+
+    def _read_streams(
+        self, on_stdout: Callable[[str], bool], on_stderr: Callable[[str], bool]
     ) -> None:
-        while line := self._shell.stdout_readline():
+        """Read the output of the session counting it for `ShellMetrics`."""
+        self._round_trips += 1
+
+        def counted(
+            consume: Callable[[str], bool], counter: StreamCounter
+        ) -> Callable[[str], bool]:
+            def read(line: str) -> bool:
+                counter.count(line)
+                return consume(line)
+
+            return read
+
+        self._shell.read_streams(
+            counted(on_stdout, self._stdout_counter),
+            counted(on_stderr, self._stderr_counter),
+        )
+
+    def _send_batch_barriers(self, nonce: str, tag: str) -> None:
+        # newline added in case of it is missing in the previous output line
+        self._shell.run(
+            f'echo "\n{_READING_BARRIER_FLAG}:{nonce}:{tag}:${_BATCH_RC_VARIABLE}"'
+        )
+        self._shell.run(f'echo "\n{_READING_BARRIER_FLAG}:{nonce}:{tag}">&2')
+
+    def _batch_reader(
+        self,
+        nonce: str,
+        outputs: list[list[str]],
+        error_code: list[int] | None,
+        forward: Callable[[str], None] | None,
+        on_barrier: Callable[[], bool] | None = None,
+    ) -> Callable[[str], bool]:
+        prefix = f"{_READING_BARRIER_FLAG}:{nonce}:"
+        output: list[str] = []
+
+        def read(line: str) -> bool:
+            nonlocal output
+            self._ui.step()
+
+            stripped = line.strip()
+            if not stripped.startswith(prefix):
+                output.append(line)
+                self._forward_lines(output, forward, keep_last=True)
+                return False
+
+            self._strip_barrier_separator(output)
+            self._forward_lines(output, forward)
+            tag = stripped[len(prefix) :].split(":")
+            if tag[0] == _BATCH_END:
+                if error_code is not None:
+                    error_code.append(int(tag[1]))
+                return True
+
+            outputs.append(output)
+            output = []
+            if on_barrier is not None:
+                on_barrier()
+            return False
+
+        return read
+
+    def execute(
+        self,
+        command: str,
+        cwd: str | None = None,
+        env: dict[str, str] | None = None,
+    ) -> tuple[int, list[str], list[str]]:
+        """Run the command in its own process, independently of `run`.
+
+        Remote commands are executed in a separate SSH channel of the session,
+        so unlike `run` several commands can be executed at the same time
+        from different threads. The working directory set by `cd` in `run`
+        is not used.
+
+        :param str command: command to be executed
+        :param str | None cwd: absolute path to the working directory of the command.
+            Home directory (remote) or current working directory (local) if None.
+        :param dict[str, str] | None env: additional environment variables
+
+        :rtype: tuple[int, list[str], list[str]]
+        :return: A tuple of three:
+
+            - :int: exit code of the command
+            - :list[str]: lines of the stdout of the command
+            - :list[str]: lines of the stderr of the command
+        """
+        if not self._is_connected:
+            self.connect()
+
+        started = time.time()
+        start = time.monotonic()
+        error_code, stdout, stderr = self._shell.exec_command(command, cwd, env)
+        ShellMetrics.record(
+            ShellMetric(
+                kind=MetricKind.EXECUTE,
+                machine=self._machine_name(),
+                command=command,
+                started=started,
+                latency=time.monotonic() - start,
+                exit_code=error_code,
+                stdout_bytes=sum(len(line.encode()) for line in stdout),
+                stderr_bytes=sum(len(line.encode()) for line in stderr),
+                stdout_lines=len(stdout),
+                stderr_lines=len(stderr),
+            )
+        )
+        with self._ui_lock:
+            self._ui.step()
+
+        return (error_code, stdout, stderr)
+
+    def open_pipe(self, command: str, cwd: str | None = None) -> ICommandPipe:
+        """Start the command in its own process with piped stdin and stdout.
+
+        Like `execute`, does not depend on the state of `run`,
+        but the data is streamed instead of being collected.
+
+        :param str command: command to be executed
+        :param str | None cwd: absolute path to the working directory of the command
+
+        :rtype: ICommandPipe
+        :return: pipe of the started process, the caller must close it
+        """
+        if not self._is_connected:
+            self.connect()
+
+        return self._shell.open_pipe(command, cwd)
+
+    def _stdout_barrier_reader(
+        self,
+        output: list[str],
+        error_code: list[int],
+        forward: Callable[[str], None] | None = None,
+    ) -> Callable[[str], bool]:
+        def read(line: str) -> bool:
             self._ui.step()
 
             barrier_error = self._parse_stdout_barrier(line)
             if barrier_error is not None:
                 error_code.append(barrier_error)
                 self._strip_barrier_separator(output)
-                return
+                self._forward_lines(output, forward)
+                return True
 
             output.append(line)
+            self._forward_lines(output, forward, keep_last=True)
+            return False
+
+        return read
 
-    def _read_stderr_until_barrier(self, output: list[str]) -> None:
-        while line := self._shell.stderr_readline():
+    def _stderr_barrier_reader(
+        self, output: list[str], forward: Callable[[str], None] | None = None
+    ) -> Callable[[str], bool]:
+        def read(line: str) -> bool:
             self._ui.step()
 
             if self._is_stderr_barrier(line):
                 self._strip_barrier_separator(output)
-                return
+                self._forward_lines(output, forward)
+                return True
 
             output.append(line)
+            self._forward_lines(output, forward, keep_last=True)
+            return False
+
+        return read
 
     def copy_to_remote(self, source: str, destination: str) -> bool:
         """Send a file or folder to the target machine.
@@ -176,14 +669,15 @@ class Shell:
 
         :return: True if successfully copied else False
         """
-        if self.machine.auth is None:
-            _destination = destination
+        started = time.time()
+        start = time.monotonic()
+        if self._uses_sftp():
+            success, moved = self._copy_sftp(source, destination, upload=True)
         else:
-            _destination = (
-                f"{self.machine.auth.username}@{self.machine.address}:{destination}"
-            )
+            success, moved = self._copy(source, self._remote_path(destination))
 
-        return self._copy(source, _destination)
+        self._record_copy(source, destination, started, start, success, moved)
+        return success
 
     def copy_to_host(self, source: str, destination: str) -> bool:
         """Get a file or folder from the target machine.
@@ -195,12 +689,52 @@ class Shell:
 
         :return: True if successfully copied else False
         """
-        if self.machine.auth is None:
-            _source = source
+        started = time.time()
+        start = time.monotonic()
+        if self._uses_sftp():
+            success, moved = self._copy_sftp(source, destination, upload=False)
         else:
-            _source = f"{self.machine.auth.username}@{self.machine.address}:{source}"
+            success, moved = self._copy(self._remote_path(source), destination)
 
-        return self._copy(_source, destination)
+        self._record_copy(source, destination, started, start, success, moved)
+        return success
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def _record_copy(
+        self,
+        source: str,
+        destination: str,
+        started: float,
+        start: float,
+        success: bool,
+        moved: int,
+    ) -> None:
+        ShellMetrics.record(
+            ShellMetric(
+                kind=MetricKind.COPY,
+                machine=self._machine_name(),
+                command=f"{source} -> {destination}",
+                started=started,
+                latency=time.monotonic() - start,
+                exit_code=0 if success else 1,
+                round_trips=0,
+                bytes_moved=moved,
+            )
+        )
+
+    def _copied_size(self, source: str, rsync_output: str) -> int:
+        """Get the size of the copied files.
+
+        rsync reports the size of files it has transferred in its statistics,
+        cp copies the whole `source` on the host.
+        """
+        if self.machine.auth is None:
+            return host_size(source)
+
+        return rsync_transferred_size(rsync_output)
+
+    def _machine_name(self) -> str:
+        return self.machine.address or "localhost"
 
     def get_project_workdir(self) -> str:
         """Get a working directory for amphimixis.
@@ -248,8 +782,6 @@ class Shell:
                 raise RuntimeError("Can't get homedir for [local] machine")
             return self._homedir
 
-        error, stdout, _ = self.run("echo ~")
-
         if self.machine.auth is None:
             self._logger.error(
                 "Remote machine [%s] has no authentication info", self.machine.address
@@ -259,19 +791,71 @@ class Shell:
                 f"Remote machine [{self.machine.address}] has no authentication info"
             )
 
-        if error != 0:
+        self._homedir = self.machine_profile().home
+        return self._homedir
+
+    def machine_profile(self, refresh: bool = False) -> MachineProfile:
+        """Get the profile of the machine.
+
+        The profile is collected in one command and cached on disk until
+        the machine reboots, so it is re-collected only if the boot ID has changed.
+
+        :param bool refresh: collect the profile even if the machine has not rebooted
+        :rtype: MachineProfile
+        :return: profile of the machine
+        """
+        if self._profile is not None and not refresh:
+            return self._profile
+
+        cached = None if refresh else MachineProfileCache.load(self.machine)
+        error, stdout, stderr = self.execute(
+            probe_command(cached.boot_id if cached is not None else "")
+        )
+
+        try:
+            if error != 0:
+                raise ValueError("".join(stderr))
+            self._profile = parse_probe_output(stdout, cached)
+        except ValueError as e:
             self._logger.error(
-                "Can't get homedir for [%s@%s] ",
-                self.machine.auth.username,
-                self.machine.address,
+                "Can't get profile of [%s] machine: %s",
+                self.machine.address or "local",
+                e,
             )
-
             raise RuntimeError(
-                f"Can't get homedir for [{self.machine.auth.username}@{self.machine.address}]"
+                f"Can't get profile of [{self.machine.address or 'local'}] machine"
+            ) from e
+
+        if self._profile is not cached:
+            MachineProfileCache.store(self.machine, self._profile)
+
+        return self._profile
+
+    def ensure_paranoid(self, level: int = -1) -> bool:
+        """Set perf_event_paranoid to the given level unless it is already set.
+
+        The current level is taken from the machine profile, so no commands are
+        executed if the level was set since the last reboot of the machine.
+
+        :param int level: The level perf_event_paranoid must be set to.
+        :rtype: bool
+        :return: True if perf_event_paranoid is set to the level, False otherwise.
+        """
+        profile = self.machine_profile()
+        if profile.perf_event_paranoid == level:
+            return True
+
+        current, success = self.set_paranoid(level)
+        if not success:
+            self._logger.error(
+                "Can't set /proc/sys/kernel/perf_event_paranoid to %d. Set it manually",
+                level,
             )
+            return False
 
-        self._homedir = stdout[0][0].strip()
-        return self._homedir
+        profile.perf_event_paranoid = current
+        MachineProfileCache.store(self.machine, profile)
+        return True
 
     def get_source_dir(self) -> str:
         """Get a directory for the project source code on the target machine.
@@ -324,9 +908,10 @@ class Shell:
 
         return (set_code, set_code == level)
 
-    def _copy(self, source: str, destination: str) -> bool:
+    def _copy(self, source: str, destination: str) -> tuple[bool, int]:
         if self.machine.auth is None:
-            return self._copy_local(source, destination)
+            success = self._copy_local(source, destination)
+            return (success, self._copied_size(source, "") if success else 0)
 
         port = self.machine.auth.port
         # if None or empty string, ssh-agent is supposed
@@ -336,8 +921,69 @@ class Shell:
 
     def _copy_remote(
         self, source: str, destination: str, password: str | None, port: int
-    ) -> bool:
+    ) -> tuple[bool, int]:
         self._logger.info("Copying %s -> %s", source, destination)
+        result = subprocess.run(
+            self._rsync_command(source, destination, password, port),
+            stdout=subprocess.PIPE,
+            text=True,
+            errors="replace",
+            check=False,
+        )
+
+        if result.returncode != 0:
+            self._logger.error("Error %s -> %s", source, destination)
+            return (False, 0)
+
+        self._logger.info("Success %s -> %s", source, destination)
+        return (True, self._copied_size(source, result.stdout))
+
+    def _uses_sftp(self) -> bool:
+        return self.machine.auth is not None and self.transfer == TransferMethod.SFTP
+
+    def _copy_sftp(
+        self, source: str, destination: str, upload: bool
+    ) -> tuple[bool, int]:
+        if not self._is_connected:
+            self.connect()
+
+        if not isinstance(self._shell, _ParamikoHandler):
+            raise TypeError(f"Remote machine {self.machine.address} has no SSH session")
+
+        self._logger.info("Copying %s -> %s over SFTP", source, destination)
+        transfer = SftpTransfer(self._shell.open_sftp)
+        if upload:
+            success = transfer.upload(source, destination)
+        else:
+            success = transfer.download(source, destination)
+
+        if not success:
+            self._logger.error("Error %s -> %s", source, destination)
+            return (False, transfer.bytes_transferred)
+
+        self._logger.info("Success %s -> %s", source, destination)
+        return (True, transfer.bytes_transferred)
+
+    def _copy_command(self, source: str, destination: str) -> list[str]:
+        """Get the command line `_copy` runs to copy `source` to `destination`."""
+        if self.machine.auth is None:
+            return self._cp_command(source, destination)
+
+        return self._rsync_command(
+            source, destination, self.machine.auth.password, self.machine.auth.port
+        )
+
+    def _remote_path(self, path: str) -> str:
+        """Get `path` on the machine in the form understood by `_copy`."""
+        if self.machine.auth is None:
+            return path
+
+        return f"{self.machine.auth.username}@{self.machine.address}:{path}"
+
+    @staticmethod
+    def _rsync_command(
+        source: str, destination: str, password: str | None, port: int
+    ) -> list[str]:
         sshcmd = [
             "ssh",
             "-o",
@@ -353,7 +999,7 @@ class Shell:
                 "PasswordAuthentication=yes",
             ]
         sshcmd += ["-p", str(port)]
-        error_code = subprocess.call(
+        return (
             ["sshpass"]
             + (["-p", password] if password else [])
             + [
@@ -365,6 +1011,7 @@ class Shell:
                 "--copy-links",
                 "--hard-links",
                 "--compress",
+                "--stats",
                 "--log-file=./amphimixis.log",
                 "-e",
                 " ".join(sshcmd),
@@ -373,16 +1020,13 @@ class Shell:
             ]
         )
 
-        if error_code != 0:
-            self._logger.error("Error %s -> %s", source, destination)
-            return False
-
-        self._logger.info("Success %s -> %s", source, destination)
-        return True
+    @staticmethod
+    def _cp_command(source: str, destination: str) -> list[str]:
+        return ["cp", "-aL", source, destination]
 
     def _copy_local(self, source: str, destination: str) -> bool:
         self._logger.info("Copying %s -> %s", source, destination)
-        error_code = subprocess.call(["cp", "-aL", source, destination])
+        error_code = subprocess.call(self._cp_command(source, destination))
         if error_code != 0:
             self._logger.error("Error %s -> %s", source, destination)
             return False
@@ -402,6 +1046,19 @@ class Shell:
     def _is_stderr_barrier(line: str) -> bool:
         return line.strip() == _READING_BARRIER_FLAG
 
+    @staticmethod
+    def _forward_lines(
+        lines: list[str],
+        forward: Callable[[str], None] | None,
+        keep_last: bool = False,
+    ) -> None:
+        # the last line is kept until the barrier since its newline may be a separator
+        if forward is None:
+            return
+
+        while len(lines) > (1 if keep_last else 0):
+            forward(lines.pop(0))
+
     @staticmethod
     def _strip_barrier_separator(lines: list[str]) -> None:
         if not lines:
@@ -1,6 +1,119 @@
 """Shell handler interface."""
 
+import threading
 from abc import ABC, abstractmethod
+from collections.abc import Callable
+from dataclasses import dataclass
+
+
+def _read_until(readline: Callable[[], str], consume: Callable[[str], bool]) -> None:
+    while line := readline():
+        if consume(line):
+            return
+
+
+class ICommandPipe(ABC):
+    """Process started with its stdin and stdout connected to the caller.
+
+    Is used as a context manager, the process is killed on exit if still running.
+    """
+
+    def __enter__(self):
+        """Return the pipe itself."""
+        return self
+
+    def __exit__(self, *_) -> None:
+        """Close the pipe."""
+        self.close()
+
+    @abstractmethod
+    def read(self, size: int) -> bytes:
+        """Read available bytes of the stdout, waits for at least one byte.
+
+        :var int size: Maximum number of bytes to read.
+
+        :rtype: bytes
+        :return: read bytes, empty on the end of the stdout
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(self, data: bytes) -> None:
+        """Write all bytes to the stdin.
+
+        :var bytes data: Bytes to write.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def close_stdin(self) -> None:
+        """Send the end of file to the stdin."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def wait(self) -> tuple[int, str]:
+        """Wait for the process to exit.
+
+        :rtype: tuple[int, str]
+        :return: exit code and stderr of the process
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self) -> None:
+        """Kill the process if it is still running and release its resources."""
+        raise NotImplementedError
+
+
+@dataclass
+class CommandResult:
+    """Exit status and resource usage of a command run in its own process.
+
+    :var int exit_code: exit code, negative number of the signal if the command was killed
+    :var float | None user_time: CPU time in user mode in seconds, None if unknown
+    :var float | None system_time: CPU time in kernel mode in seconds, None if unknown
+    :var int | None max_rss_kb: peak resident set size in kilobytes, None if unknown
+    """
+
+    exit_code: int
+    user_time: float | None = None
+    system_time: float | None = None
+    max_rss_kb: int | None = None
+
+
+class ICommandRunner(ABC):
+    """Runs commands of `Shell.run` one by one, each in its own process.
+
+    The working directory and exported variables are kept between commands.
+    """
+
+    @abstractmethod
+    def run(
+        self,
+        command: str,
+        on_stdout: Callable[[str], None],
+        on_stderr: Callable[[str], None],
+    ) -> CommandResult:
+        """Run the command passing its output lines to the callbacks.
+
+        :var str command: Command to be executed by `bash`.
+        :var Callable[[str], None] on_stdout: Called for every line of the stdout.
+        :var Callable[[str], None] on_stderr: Called for every line of the stderr.
+
+        :rtype: CommandResult
+        :return: exit status of the command
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def kill(self) -> None:
+        """Kill the running command and all processes it has started."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def abandon(self) -> None:
+        """Stop waiting for the running command, `run` returns as soon as possible."""
+        raise NotImplementedError
 
 
 class IShellHandler(ABC):
@@ -31,3 +144,77 @@ class IShellHandler(ABC):
         :return: the next line from stderr
         """
         raise NotImplementedError
+
+    def read_streams(
+        self,
+        on_stdout: Callable[[str], bool],
+        on_stderr: Callable[[str], bool],
+    ) -> None:
+        """Pass lines of the shell stdout and stderr to the callbacks.
+
+        A stream is read until its callback returns True or the stream ends.
+        Returns when both streams are finished.
+        By default, every stream is read by its own thread.
+
+        :var Callable[[str], bool] on_stdout: Receives lines of stdout.
+        :var Callable[[str], bool] on_stderr: Receives lines of stderr.
+        """
+        readers = [
+            threading.Thread(
+                target=_read_until, args=(self.stdout_readline, on_stdout)
+            ),
+            threading.Thread(
+                target=_read_until, args=(self.stderr_readline, on_stderr)
+            ),
+        ]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+
+    @abstractmethod
+    def exec_command(
+        self,
+        command: str,
+        cwd: str | None = None,
+        env: dict[str, str] | None = None,
+    ) -> tuple[int, list[str], list[str]]:
+        """Run a command in a new independent process of the machine.
+
+        Does not depend on the state of the interactive shell
+        and can be called from several threads at the same time.
+
+        :var str command: Command to be executed by `bash`.
+        :var str | None cwd: Absolute path to the working directory of the command.
+        :var dict[str, str] | None env: Additional environment variables.
+
+        :rtype: tuple[int, list[str], list[str]]
+        :return: exit code, stdout lines and stderr lines of the command
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def open_pipe(self, command: str, cwd: str | None = None) -> ICommandPipe:
+        """Start a command in a new process with piped stdin and stdout.
+
+        :var str command: Command to be executed by `bash`.
+        :var str | None cwd: Absolute path to the working directory of the command.
+
+        :rtype: ICommandPipe
+        :return: pipe of the started process, the caller must close it
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def is_alive(self) -> bool:
+        """Check whether the shell session can still run commands.
+
+        :rtype: bool
+        :return: True if the session is alive, False otherwise
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self) -> None:
+        """Terminate the shell session."""
+        raise NotImplementedError
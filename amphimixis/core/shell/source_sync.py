@@ -0,0 +1,222 @@
+"""Incremental synchronisation of a folder to a remote machine."""
+
+import hashlib
+import io
+import os
+import pickle
+import secrets
+import shlex
+import tarfile
+from collections.abc import Collection
+from dataclasses import dataclass, field
+
+from amphimixis.core import logger
+from amphimixis.core.general.tools import sync_manifest_filename
+from amphimixis.core.shell.shell import Shell
+from amphimixis.core.shell.shell_interface import ICommandPipe
+
+_logger = logger.setup_logger("SOURCE_SYNC")
+
+# file on the remote machine identifying the last synchronisation of the folder
+SYNC_MARKER_NAME = ".amphimixis_sync"
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class FileState:
+    """State of a file when it was sent to the machine.
+
+    :var int size: size in bytes
+    :var int mtime_ns: modification time in nanoseconds
+    :var str digest: SHA-256 of the content
+    """
+
+    size: int
+    mtime_ns: int
+    digest: str
+
+
+@dataclass
+class SyncManifest:
+    """Content of a folder known to be on the machine.
+
+    :var str sync_id: identifier stored in `SYNC_MARKER_NAME` on the machine
+    :var dict[str, FileState] files: relative path -> state of the file
+    :var set[str] dirs: relative paths of folders
+    """
+
+    sync_id: str = ""
+    files: dict[str, FileState] = field(default_factory=dict)
+    dirs: set[str] = field(default_factory=set)
+
+
+class _PipeWriter(io.RawIOBase):
+    """File-like adapter to stream a tar archive into a command pipe."""
+
+    def __init__(self, pipe: ICommandPipe) -> None:
+        super().__init__()
+        self._pipe = pipe
+
+    def writable(self) -> bool:
+        """Return True, the pipe is writable."""
+        return True
+
+    def write(self, data) -> int:
+        """Write all bytes to the stdin of the pipe."""
+        self._pipe.write(bytes(data))
+        return len(data)
+
+
+def sync_directory(shell: Shell, source: str, destination: str) -> bool:
+    """Copy the folder into `destination` on the machine, sending only changed files.
+
+    The state of the files sent to every machine is stored in a manifest on the host,
+    so unchanged files are detected by their size and modification time without
+    reading them, and touched but not modified files by their hash.
+    The manifest is discarded if the folder on the machine has been replaced.
+    Removed files are not deleted from the machine, as with `rsync`.
+
+    :param Shell shell: shell of the machine to copy to
+    :param str source: path to the folder on the host machine
+    :param str destination: absolute path to the folder on the machine to copy `source` into
+    :rtype: bool
+    :return: True if successfully synchronised else False
+    """
+    if shell.machine.auth is None:
+        return shell.copy_to_remote(source, destination)
+
+    source = os.path.normpath(source)
+    target = os.path.join(destination, os.path.basename(source))
+    manifests = _load_manifests(shell)
+    manifest = manifests.get(target, SyncManifest())
+
+    error, stdout, _ = shell.execute(
+        f"cat {shlex.quote(os.path.join(target, SYNC_MARKER_NAME))}"
+    )
+    if error != 0 or "".join(stdout).strip() != manifest.sync_id:
+        _logger.info("No valid manifest of %s on %s", target, shell.machine.address)
+        manifest = SyncManifest(sync_id=secrets.token_hex(8))
+
+    try:
+        new_manifest, changed = scan_directory(source, manifest)
+    except OSError as e:
+        _logger.error("Can't read %s: %s", source, e)
+        return False
+
+    _logger.info(
+        "Sending %d of %d files of %s to %s",
+        sum(1 for path in changed if path in new_manifest.files),
+        len(new_manifest.files),
+        source,
+        shell.machine.address,
+    )
+    if not _send(shell, source, target, changed, new_manifest.sync_id):
+        return False
+
+    manifests[target] = new_manifest
+    _save_manifests(shell, manifests)
+    return True
+
+
+def scan_directory(
+    source: str, manifest: SyncManifest, ignored: Collection[str] = ()
+) -> tuple[SyncManifest, list[str]]:
+    """Get the state of the folder, hashing only files changed since the manifest.
+
+    :param str source: path to the folder on the host machine
+    :param SyncManifest manifest: known state of the folder, may be empty
+    :param Collection[str] ignored: relative paths of files and folders to skip
+    :rtype: tuple[SyncManifest, list[str]]
+    :return: state of the folder with the `sync_id` of `manifest`
+        and relative paths of new folders and changed files in the order of walking
+    :raises OSError: if the folder can't be read
+    """
+    new_manifest = SyncManifest(sync_id=manifest.sync_id)
+    changed: list[str] = []
+    # links are followed like `rsync --copy-links`
+    for root, dirnames, filenames in os.walk(source, followlinks=True):
+        dirnames[:] = sorted(
+            name
+            for name in dirnames
+            if os.path.relpath(os.path.join(root, name), source) not in ignored
+        )
+        for name in dirnames:
+            path = os.path.relpath(os.path.join(root, name), source)
+            new_manifest.dirs.add(path)
+            if path not in manifest.dirs:
+                changed.append(path)
+
+        for name in sorted(filenames):
+            full_path = os.path.join(root, name)
+            path = os.path.relpath(full_path, source)
+            if path in ignored:
+                continue
+            stat = os.stat(full_path)
+            known = manifest.files.get(path)
+            if (
+                known is not None
+                and known.size == stat.st_size
+                and known.mtime_ns == stat.st_mtime_ns
+            ):
+                new_manifest.files[path] = known
+                continue
+
+            state = FileState(stat.st_size, stat.st_mtime_ns, _hash_file(full_path))
+            new_manifest.files[path] = state
+            if known is None or known.digest != state.digest:
+                changed.append(path)
+
+    return (new_manifest, changed)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _send(
+    shell: Shell, source: str, target: str, changed: list[str], sync_id: str
+) -> bool:
+    marker = os.path.join(target, SYNC_MARKER_NAME)
+    unpack = (
+        f"mkdir -p {shlex.quote(target)} && tar -xf - -C {shlex.quote(target)} && "
+        f"echo {sync_id} > {shlex.quote(marker)}"
+    )
+    try:
+        with shell.open_pipe(unpack) as pipe:
+            with tarfile.open(
+                fileobj=_PipeWriter(pipe),
+                mode="w|",
+                dereference=True,
+            ) as archive:
+                for path in changed:
+                    archive.add(
+                        os.path.join(source, path), arcname=path, recursive=False
+                    )
+            pipe.close_stdin()
+            error, stderr = pipe.wait()
+    except (OSError, tarfile.TarError) as e:
+        _logger.error("Error sending %s -> %s: %s", source, target, e)
+        return False
+
+    if error != 0:
+        _logger.error("Error sending %s -> %s: %s", source, target, stderr.strip())
+        return False
+
+    return True
+
+
+def _load_manifests(shell: Shell) -> dict[str, SyncManifest]:
+    try:
+        with open(sync_manifest_filename(shell.machine), "rb") as file:
+            return pickle.load(file)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return {}
+
+
+def _save_manifests(shell: Shell, manifests: dict[str, SyncManifest]) -> None:
+    with open(sync_manifest_filename(shell.machine), "wb") as file:
+        pickle.dump(manifests, file)
@@ -0,0 +1,111 @@
+"""Timer for deadlines of shell commands."""
+
+import threading
+import time
+from collections.abc import Callable
+from typing import Self
+
+# time given to a killed command to reach its barrier before the session is dropped
+DEFAULT_GRACE_PERIOD = 10.0
+
+
+class Watchdog:
+    """Call `on_timeout` if a deadline passes before the watchdog is cancelled.
+
+    Two deadlines are supported: the per-command one starts again on every `restart`,
+    the total one is counted from the creation of the watchdog.
+    If the watchdog is still not cancelled `grace_period` seconds after the timeout,
+    `on_stuck` is called.
+
+    :param float | None timeout: seconds allowed for each command
+    :param float | None total_timeout: seconds allowed for all commands
+    :param Callable[[], None] on_timeout: called once when a deadline passes
+    :param Callable[[], None] on_stuck: called if the watchdog is not cancelled
+        within the grace period after the timeout
+    :param float grace_period: seconds between `on_timeout` and `on_stuck`
+    """
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        timeout: float | None,
+        total_timeout: float | None,
+        on_timeout: Callable[[], None],
+        on_stuck: Callable[[], None],
+        grace_period: float = DEFAULT_GRACE_PERIOD,
+    ):
+        self._timeout = timeout
+        self._deadline = (
+            time.monotonic() + total_timeout if total_timeout is not None else None
+        )
+        self._on_timeout = on_timeout
+        self._on_stuck = on_stuck
+        self._grace_period = grace_period
+        self._timer: threading.Timer | None = None
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self.expired = False
+
+    def __enter__(self) -> Self:
+        """Start the watchdog."""
+        self.restart()
+        return self
+
+    def __exit__(self, *_) -> None:
+        """Cancel the watchdog."""
+        self.cancel()
+
+    def restart(self) -> bool:
+        """Start counting the per-command deadline again.
+
+        :rtype: bool
+        :return: False if the watchdog has already expired or been cancelled
+        """
+        with self._lock:
+            if self.expired or self._cancelled:
+                return False
+
+            delays = []
+            if self._timeout is not None:
+                delays.append(self._timeout)
+            if self._deadline is not None:
+                delays.append(self._deadline - time.monotonic())
+
+            self._start_timer(max(min(delays), 0) if delays else None, self._expire)
+            return True
+
+    def cancel(self) -> None:
+        """Stop the watchdog, callbacks are not called after it."""
+        with self._lock:
+            self._cancelled = True
+            self._start_timer(None, None)
+
+    def _expire(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+            self.expired = True
+            self._start_timer(self._grace_period, self._stuck)
+
+        self._on_timeout()
+
+    def _stuck(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+
+        self._on_stuck()
+
+    def _start_timer(
+        self, delay: float | None, callback: Callable[[], None] | None
+    ) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if delay is None or callback is None:
+            return
+
+        self._timer = threading.Timer(delay, callback)
+        self._timer.daemon = True
+        self._timer.start()
@@ -14,8 +14,10 @@ from amphimixis.core.general import (
     IUI,
     NULL_UI,
     Arch,
+    CompilerCache,
     CompilerFlagsAttrs,
     ToolchainAttrs,
+    TransferMethod,
 )
 from amphimixis.core.laboratory_assistant import LaboratoryAssistant
 from amphimixis.core.logger import setup_logger
@@ -59,6 +61,12 @@ def validate(config_file_path: str, ui: IUI = NULL_UI) -> bool:
     if isinstance(runner, str) and runner.lower() not in runners_dict:
         _notify_about_error(f"Invalid runner: {runner}")
 
+    max_parallel_builds = input_config.get("max_parallel_builds")
+    if max_parallel_builds is not None and not _is_positive_int(max_parallel_builds):
+        _notify_about_error(
+            f"Invalid max_parallel_builds: '{max_parallel_builds}' is not positive number"
+        )
+
     # validate platforms
     platforms = input_config.get("platforms", {})
     if platforms == {}:
@@ -115,6 +123,21 @@ def _is_valid_platform(platform: dict[str, int | str]):
     if not isinstance(port, int) or not 1 <= port <= 65535:
         _notify_about_error(f"Invalid port in platform {pl_id}: {port}")
 
+    max_builds = platform.get("max_builds")
+    if max_builds is not None and not _is_positive_int(max_builds):
+        _notify_about_error(
+            f"Invalid max_builds in platform {pl_id}: '{max_builds}' is not positive number"
+        )
+
+    transfer = platform.get("transfer")
+    if transfer is not None and (
+        not isinstance(transfer, str) or transfer.lower() not in TransferMethod
+    ):
+        _notify_about_error(
+            f"Invalid transfer in platform {pl_id}: '{transfer}', "
+            f"expected one of: {', '.join(TransferMethod)}"
+        )
+
 
 def _is_valid_recipe(recipe: dict[str, int | str]):
     """Check whether recipe is valid."""
@@ -158,6 +181,35 @@ def _is_valid_recipe(recipe: dict[str, int | str]):
                 f"Invalid jobs number in recipe: '{jobs}' is not positive number"
             )
 
+    for key in ("build_timeout", "run_timeout"):
+        timeout = recipe.get(key)
+        if timeout is not None and (not isinstance(timeout, int) or timeout <= 0):
+            _notify_about_error(
+                f"Invalid {key} in recipe: '{timeout}' is not positive number"
+            )
+
+    _is_valid_building_options(recipe)
+
+
+def _is_valid_building_options(recipe: dict[str, int | str]):
+    """Check whether options of building of the recipe are valid."""
+    re_id = recipe.get("id")
+    for key in ("incremental", "time_trace"):
+        value = recipe.get(key)
+        if not isinstance(value, bool | None):
+            _notify_about_error(
+                f"Invalid {key} in recipe {re_id}: '{value}' is not boolean"
+            )
+
+    cache = recipe.get("compiler_cache")
+    if cache is not None and (
+        not isinstance(cache, str) or cache.lower() not in CompilerCache
+    ):
+        _notify_about_error(
+            f"Invalid compiler_cache in recipe {re_id}: '{cache}', "
+            f"expected one of: {', '.join(CompilerCache)}"
+        )
+
 
 def _is_valid_build(input_config: dict[str, Any], build: dict[str, int | str]):
     """Check whether build is valid."""
@@ -213,6 +265,10 @@ def _is_valid_toolchain(toolchain: Any) -> None:
                 _notify_about_error(f"Invalid toolchain: unknown attribute '{attr}'")
 
 
+def _is_positive_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
 def _is_valid_address(address: str) -> bool:
     """Check whether address is valid.
 
@@ -0,0 +1,196 @@
+"""Tests for skipping builds whose output is up to date"""
+
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from amphimixis.core.build_cache import BuildCache
+from amphimixis.core.builder import Builder
+from amphimixis.core.jobs_tuner import JobsTuner
+from amphimixis.core.general import (
+    Arch,
+    Build,
+    CompilerCache,
+    CompilerFlags,
+    CompilerFlagsAttrs,
+    MachineInfo,
+    Project,
+    Toolchain,
+)
+from amphimixis.core.shell import Shell
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    path = tmp_path / "work"
+    path.mkdir()
+    monkeypatch.chdir(path)
+    return path
+
+
+@pytest.fixture
+def sources(tmp_path):
+    path = tmp_path / "project"
+    path.mkdir()
+    (path / "main.c").write_text("int main() { return 0; }\n")
+    return path
+
+
+@pytest.fixture
+def project(sources, workdir):
+    build_system = MagicMock()
+    build_system.build.return_value = (0, "", "")
+    project = Project(str(sources), build_system=build_system)
+    project.builds.append(
+        Build(
+            build_machine=MachineInfo(Arch.X86, None, None),
+            run_machine=MachineInfo(Arch.X86, None, None),
+            build_name="release",
+            executables=["main"],
+            toolchain=Toolchain(),
+            sysroot=None,
+            compiler_flags=None,
+            config_flags="-DCMAKE_BUILD_TYPE=Release",
+        )
+    )
+    return project
+
+
+def build_executables(project: Project, build: Build) -> tuple[int, str, str]:
+    for executable in build.executables:
+        with open(
+            os.path.join(os.getcwd(), build.build_name, executable),
+            "w",
+            encoding="utf-8",
+        ):
+            pass
+    return (0, "", "")
+
+
+@pytest.mark.unit
+class TestBuildKey:
+    """Tests for BuildCache.build_key"""
+
+    def test_key_is_stable(self, project):
+        build = project.builds[0]
+        assert BuildCache.build_key(project, build) == BuildCache.build_key(
+            project, build
+        )
+
+    def test_key_changes_with_sources(self, project, sources):
+        build = project.builds[0]
+        key = BuildCache.build_key(project, build)
+
+        (sources / "main.c").write_text("int main() { return 1; }\n")
+
+        assert BuildCache.build_key(project, build) != key
+
+    def test_key_changes_with_recipe(self, project):
+        build = project.builds[0]
+        keys = {BuildCache.build_key(project, build)}
+
+        build.config_flags = "-DCMAKE_BUILD_TYPE=Debug"
+        keys.add(BuildCache.build_key(project, build))
+        build.compiler_flags = CompilerFlags()
+        build.compiler_flags.set(CompilerFlagsAttrs.C_FLAGS, "-O3")
+        keys.add(BuildCache.build_key(project, build))
+        build.toolchain = Toolchain("gcc-14")
+        keys.add(BuildCache.build_key(project, build))
+        build.sysroot = "/opt/sysroot"
+        keys.add(BuildCache.build_key(project, build))
+        build.build_machine = MachineInfo(Arch.RISCV, None, None)
+        keys.add(BuildCache.build_key(project, build))
+        build.compiler_cache = CompilerCache.CCACHE
+        keys.add(BuildCache.build_key(project, build))
+        build.incremental = True
+        keys.add(BuildCache.build_key(project, build))
+
+        assert len(keys) == 8
+
+    def test_key_ignores_jobs(self, project):
+        build = project.builds[0]
+        key = BuildCache.build_key(project, build)
+        recipe_hash = BuildCache.recipe_hash(build)
+
+        build.jobs = 16
+
+        assert BuildCache.build_key(project, build) == key
+        assert BuildCache.recipe_hash(build) == recipe_hash
+
+    def test_outputs_in_project_are_ignored(self, project, sources, monkeypatch):
+        monkeypatch.chdir(sources)
+        build = project.builds[0]
+        key = BuildCache.build_key(project, build)
+
+        (sources / "release").mkdir()
+        (sources / "release" / "main").write_text("binary")
+        (sources / "release.buildlog").write_text("log")
+
+        assert BuildCache.build_key(project, build) == key
+
+
+@pytest.mark.unit
+class TestBuildCache:
+    """Tests for skipping up to date builds"""
+
+    def test_store_and_invalidate(self, project, workdir):
+        build = project.builds[0]
+        shell = Shell(project, build.build_machine).connect()
+        path = str(workdir / build.build_name)
+        os.mkdir(path)
+        (workdir / build.build_name / "main").write_text("binary")
+
+        assert not BuildCache.is_up_to_date(shell, build, path, "key")
+        assert BuildCache.store(shell, path, "key")
+        assert BuildCache.is_up_to_date(shell, build, path, "key")
+        assert not BuildCache.is_up_to_date(shell, build, path, "other")
+
+        BuildCache.invalidate(shell, path)
+
+        assert not BuildCache.is_up_to_date(shell, build, path, "key")
+
+    def test_missing_executable_is_not_up_to_date(self, project, workdir):
+        build = project.builds[0]
+        shell = Shell(project, build.build_machine).connect()
+        path = str(workdir / build.build_name)
+        os.mkdir(path)
+
+        assert BuildCache.store(shell, path, "key")
+        assert not BuildCache.is_up_to_date(shell, build, path, "key")
+
+    def test_unchanged_build_is_skipped(self, project, sources):
+        build = project.builds[0]
+        project.build_system.build.side_effect = lambda build: build_executables(
+            project, build
+        )
+
+        assert Builder.build_for_linux(project, build)
+        assert Builder.build_for_linux(project, build)
+        assert project.build_system.build.call_count == 1
+
+        (sources / "main.c").write_text("int main() { return 1; }\n")
+
+        assert Builder.build_for_linux(project, build)
+        assert project.build_system.build.call_count == 2
+
+    def test_failed_build_is_not_cached(self, project):
+        build = project.builds[0]
+        project.build_system.build.return_value = (1, "", "error")
+
+        assert not Builder.build_for_linux(project, build)
+        assert not Builder.build_for_linux(project, build)
+        assert project.build_system.build.call_count == 2
+
+    def test_resources_are_remembered_for_built_builds(self, project):
+        build = project.builds[0]
+        project.build_system.build.side_effect = lambda build: build_executables(
+            project, build
+        )
+
+        assert Builder.build_for_linux(project, build)
+        assert build.resources is not None
+        assert not build.resources.oom_killed
+        assert Builder.build_for_linux(project, build)
+        assert build.resources is None
+        assert len(JobsTuner.history(build.build_name)) == 1
@@ -0,0 +1,162 @@
+"""Tests for the registry of builds and profiling runs"""
+
+import pickle
+import threading
+
+import pytest
+
+from amphimixis.core.build_cache import BuildCache
+from amphimixis.core.build_registry import (
+    LEGACY_BUILDS_FILE_NAME,
+    BuildRegistry,
+    machine_id,
+)
+from amphimixis.core.general import (
+    Arch,
+    Build,
+    BuildResources,
+    MachineAuthenticationInfo,
+    MachineInfo,
+)
+from amphimixis.core.general.tools import build_log_filename
+
+REMOTE = MachineInfo(
+    Arch.ARM, "10.0.0.2", MachineAuthenticationInfo("user", None, 2222)
+)
+
+
+@pytest.fixture(autouse=True)
+def registry_in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def make_build(name: str = "release", machine: MachineInfo | None = None) -> Build:
+    machine = machine or MachineInfo(Arch.X86, None, None)
+    return Build(
+        build_machine=machine,
+        run_machine=machine,
+        build_name=name,
+        executables=["bin/app"],
+        toolchain=None,
+        sysroot=None,
+        compiler_flags=None,
+        config_flags=None,
+    )
+
+
+@pytest.mark.unit
+class TestBuilds:
+    """Tests for remembering builds"""
+
+    def test_remember_and_get(self, tmp_path):
+        build = make_build()
+        build.resources = BuildResources(4, 12.5)
+        (tmp_path / build_log_filename("release")).write_text("log")
+
+        BuildRegistry.remember(build, "/work/release")
+
+        record = BuildRegistry.get("release")
+        assert record is not None
+        assert record.build.build_name == "release"
+        assert record.build_machine == "localhost"
+        assert record.recipe_hash == BuildCache.recipe_hash(build)
+        assert record.duration_s == 12.5
+        assert record.build_path == "/work/release"
+        assert record.artifacts == [str(tmp_path / build_log_filename("release"))]
+        assert BuildRegistry.get("debug") is None
+
+    def test_find(self):
+        local = make_build("local")
+        remote = make_build("remote", REMOTE)
+        failed = make_build("failed", REMOTE)
+        failed.successfully_built = False
+        for build in (remote, local, failed):
+            BuildRegistry.remember(build)
+
+        assert [record.build.build_name for record in BuildRegistry.find()] == [
+            "failed",
+            "local",
+            "remote",
+        ]
+        assert [record.build.build_name for record in BuildRegistry.find(REMOTE)] == [
+            "failed",
+            "remote",
+        ]
+        assert [
+            record.build.build_name
+            for record in BuildRegistry.find(successfully_built=True)
+        ] == ["local", "remote"]
+        assert [
+            record.build.build_name
+            for record in BuildRegistry.find(recipe_hash=BuildCache.recipe_hash(remote))
+        ] == ["failed", "remote"]
+
+    def test_duration_of_skipped_building_is_kept(self):
+        build = make_build()
+        build.resources = BuildResources(4, 30.0)
+        BuildRegistry.remember(build, "/work/release")
+        build.resources = None
+
+        BuildRegistry.remember(build)
+
+        record = BuildRegistry.get("release")
+        assert record is not None
+        assert record.duration_s == 30.0
+        assert record.build_path == "/work/release"
+
+    def test_forget(self):
+        BuildRegistry.remember(make_build())
+
+        BuildRegistry.forget("release")
+
+        assert BuildRegistry.get("release") is None
+
+    def test_concurrent_builders(self):
+        threads = [
+            threading.Thread(target=BuildRegistry.remember, args=(make_build(f"b{i}"),))
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(BuildRegistry.find()) == 8
+
+    def test_legacy_builds_are_imported(self, tmp_path):
+        with open(LEGACY_BUILDS_FILE_NAME, "wb") as file:
+            pickle.dump({"old": make_build("old")}, file)
+
+        record = BuildRegistry.get("old")
+
+        assert record is not None
+        assert record.build.build_name == "old"
+        assert not (tmp_path / LEGACY_BUILDS_FILE_NAME).exists()
+
+
+@pytest.mark.unit
+class TestRuns:
+    """Tests for remembering profiling runs"""
+
+    def test_record_run(self, tmp_path):
+        build = make_build()
+        (tmp_path / "release_app.perfdata").write_text("data")
+
+        BuildRegistry.record_run(
+            build, ["bin/app"], ["release_app.perfdata", "missing.tar.bz2"]
+        )
+        BuildRegistry.record_run(build, [], [])
+
+        runs = BuildRegistry.runs("release")
+        assert len(runs) == 2
+        assert runs[0].executables == ["bin/app"]
+        assert runs[0].profiled == ["bin/app"]
+        assert runs[0].artifacts == [str(tmp_path / "release_app.perfdata")]
+        assert runs[1].profiled == []
+        assert BuildRegistry.runs("debug") == []
+
+
+@pytest.mark.unit
+def test_machine_id():
+    assert machine_id(MachineInfo(Arch.X86, None, None)) == "localhost"
+    assert machine_id(REMOTE) == "user@10.0.0.2:2222"
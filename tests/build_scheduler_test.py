@@ -0,0 +1,273 @@
+"""Tests for the concurrent building of builds"""
+
+import threading
+import time
+
+import pytest
+
+from amphimixis.core.build_scheduler import BuildScheduler
+from amphimixis.core.build_systems.make import Make
+from amphimixis.core.general import (
+    Arch,
+    Build,
+    MachineAuthenticationInfo,
+    MachineInfo,
+    Project,
+    Toolchain,
+)
+from amphimixis.core.shell import session_key
+
+
+def machine(address: str | None, max_builds: int = 1) -> MachineInfo:
+    auth = MachineAuthenticationInfo("user", "password", 22) if address else None
+    return MachineInfo(Arch.X86, address, auth, max_builds=max_builds)
+
+
+def project_with(
+    machines: list[MachineInfo], max_parallel_builds: int | None = None
+) -> Project:
+    project = Project(path="/mock", max_parallel_builds=max_parallel_builds)
+    for number, build_machine in enumerate(machines):
+        project.builds.append(
+            Build(
+                build_machine=build_machine,
+                run_machine=build_machine,
+                build_name=f"build_{number}",
+                executables=[],
+                toolchain=Toolchain(),
+                sysroot=None,
+                compiler_flags=None,
+                config_flags=None,
+            )
+        )
+    return project
+
+
+class Recorder:
+    """Fake build function recording how many builds run at once."""
+
+    def __init__(self, duration: float = 0.05) -> None:
+        self.duration = duration
+        self.running = 0
+        self.peak = 0
+        self.peak_by_machine: dict[str, int] = {}
+        self._by_machine: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, project: Project, build: Build) -> bool:
+        address = str(build.build_machine.address)
+        with self._lock:
+            self.running += 1
+            self._by_machine[address] = self._by_machine.get(address, 0) + 1
+            self.peak = max(self.peak, self.running)
+            self.peak_by_machine[address] = max(
+                self.peak_by_machine.get(address, 0), self._by_machine[address]
+            )
+
+        time.sleep(self.duration)
+
+        with self._lock:
+            self.running -= 1
+            self._by_machine[address] -= 1
+        build.successfully_built = build.build_name != "build_1"
+        return build.successfully_built
+
+
+@pytest.mark.unit
+class TestBuildScheduler:
+    """Tests for BuildScheduler"""
+
+    def test_builds_on_different_machines_overlap(self):
+        recorder = Recorder()
+        project = project_with(
+            [machine(None), machine("10.0.0.1"), machine("10.0.0.2")]
+        )
+
+        BuildScheduler.run(project, recorder)
+
+        assert recorder.peak == 3
+
+    def test_builds_on_one_machine_are_serialized(self):
+        recorder = Recorder()
+        project = project_with([machine("10.0.0.1")] * 3 + [machine("10.0.0.2")])
+
+        BuildScheduler.run(project, recorder)
+
+        assert recorder.peak_by_machine == {"10.0.0.1": 1, "10.0.0.2": 1}
+        assert recorder.peak == 2
+
+    def test_machine_limit(self, mocker):
+        shell = mocker.patch("amphimixis.core.build_scheduler.Shell")
+        shell.return_value.connect.return_value.machine_profile.return_value.nproc = 8
+        recorder = Recorder()
+        project = project_with([machine("10.0.0.1", max_builds=2)] * 4)
+
+        BuildScheduler.run(project, recorder)
+
+        assert recorder.peak_by_machine == {"10.0.0.1": 2}
+
+    def test_builds_in_sources_are_serialized(self):
+        recorder = Recorder()
+        project = project_with([machine("10.0.0.1", max_builds=2)] * 3)
+        project.build_system = Make(project)
+
+        BuildScheduler.run(project, recorder)
+
+        assert recorder.peak_by_machine == {"10.0.0.1": 1}
+        assert BuildScheduler.concurrency(project) == {
+            session_key(machine("10.0.0.1")): 1
+        }
+
+    def test_global_limit(self):
+        recorder = Recorder()
+        project = project_with(
+            [machine(f"10.0.0.{number}") for number in range(4)], max_parallel_builds=2
+        )
+
+        BuildScheduler.run(project, recorder)
+
+        assert recorder.peak == 2
+
+    def test_results_are_in_order_of_builds(self):
+        finished: list[tuple[str, bool]] = []
+        project = project_with([machine("10.0.0.1"), machine("10.0.0.2")])
+
+        results = BuildScheduler.run(
+            project,
+            Recorder(),
+            lambda build, ok: finished.append((build.build_name, ok)),
+        )
+
+        assert results == [True, False]
+        assert sorted(finished) == [("build_0", True), ("build_1", False)]
+        assert project.builds[0].successfully_built
+        assert not project.builds[1].successfully_built
+
+    def test_exception_is_raised_after_other_builds(self):
+        finished = threading.Event()
+
+        def build_function(project: Project, build: Build) -> bool:
+            if build.build_name == "build_0":
+                raise RuntimeError("broken")
+            time.sleep(0.05)
+            finished.set()
+            return True
+
+        project = project_with([machine("10.0.0.1"), machine("10.0.0.2")])
+
+        with pytest.raises(RuntimeError, match="broken"):
+            BuildScheduler.run(project, build_function)
+
+        assert finished.is_set()
+
+    def test_jobs_are_split_between_builds_of_a_machine(self, mocker):
+        shell = mocker.patch("amphimixis.core.build_scheduler.Shell")
+        shell.return_value.connect.return_value.machine_profile.return_value.nproc = 8
+        jobs: list[int | None] = []
+        project = project_with([machine("10.0.0.1", max_builds=2)] * 2)
+        project.builds[1].jobs = 6
+
+        def build_function(project: Project, build: Build) -> bool:
+            jobs.append(build.jobs)
+            return True
+
+        BuildScheduler.run(project, build_function)
+
+        assert sorted(jobs, key=str) == [3, 4]
+        assert project.builds[0].jobs is None
+        assert project.builds[1].jobs == 6
+
+    def test_jobs_are_chosen_for_builds_without_them(self, mocker):
+        shell = mocker.patch("amphimixis.core.build_scheduler.Shell")
+        shell.return_value.connect.return_value.machine_profile.return_value.nproc = 8
+        chosen: list[tuple[str, int]] = []
+        jobs: dict[str, int | None] = {}
+        project = project_with([machine("10.0.0.1", max_builds=2)] * 2)
+        project.builds[1].jobs = 6
+
+        def choose_jobs(project: Project, build: Build, concurrent: int) -> int:
+            chosen.append((build.build_name, concurrent))
+            return 5
+
+        def build_function(project: Project, build: Build) -> bool:
+            jobs[build.build_name] = build.jobs
+            return True
+
+        BuildScheduler.run(project, build_function, choose_jobs=choose_jobs)
+
+        assert chosen == [("build_0", 2)]
+        assert jobs == {"build_0": 5, "build_1": 3}
+        assert project.builds[0].jobs is None
+
+    def test_machines_are_prepared_once_before_their_builds(self, mocker):
+        shell = mocker.patch("amphimixis.core.build_scheduler.Shell")
+        shell.return_value.connect.return_value.machine_profile.return_value.nproc = 8
+        prepared: list[str | None] = []
+        started: list[tuple[str | None, bool]] = []
+        lock = threading.Lock()
+
+        def prepare(project: Project, build_machine: MachineInfo) -> bool:
+            time.sleep(0.05)
+            with lock:
+                prepared.append(build_machine.address)
+            return True
+
+        def build_function(project: Project, build: Build) -> bool:
+            address = build.build_machine.address
+            with lock:
+                started.append((address, address in prepared))
+            return True
+
+        project = project_with(
+            [machine("10.0.0.1", max_builds=2)] * 3 + [machine("10.0.0.2")] * 2
+        )
+
+        results = BuildScheduler.run(project, build_function, None, prepare)
+
+        assert results == [True] * 5
+        assert sorted(prepared) == ["10.0.0.1", "10.0.0.2"]
+        assert all(ready for _, ready in started)
+
+    def test_failed_preparation_fails_builds_of_the_machine(self):
+        recorder = Recorder()
+        finished: list[tuple[str, bool]] = []
+        project = project_with([machine("10.0.0.1")] * 2 + [machine("10.0.0.2")])
+
+        results = BuildScheduler.run(
+            project,
+            recorder,
+            lambda build, ok: finished.append((build.build_name, ok)),
+            lambda project, build_machine: build_machine.address != "10.0.0.1",
+        )
+
+        assert results == [False, False, True]
+        assert sorted(finished) == [
+            ("build_0", False),
+            ("build_1", False),
+            ("build_2", True),
+        ]
+        assert recorder.peak_by_machine == {"10.0.0.2": 1}
+        assert not project.builds[0].successfully_built
+
+    def test_concurrency(self):
+        first = machine("10.0.0.1", max_builds=4)
+        second = machine("10.0.0.2", max_builds=4)
+        project = project_with([first] * 3 + [second], max_parallel_builds=2)
+
+        assert BuildScheduler.concurrency(project) == {
+            session_key(first): 2,
+            session_key(second): 1,
+        }
+
+    @pytest.mark.parametrize(
+        "jobs, nproc, concurrent, expected",
+        [
+            (None, 8, 1, None),
+            (6, 8, 1, 6),
+            (None, 8, 2, 4),
+            (6, 8, 4, 1),
+            (None, 2, 3, 1),
+        ],
+    )
+    def test_split_jobs(self, jobs, nproc, concurrent, expected):
+        assert BuildScheduler.split_jobs(jobs, nproc, concurrent) == expected
@@ -1,21 +1,33 @@
 """Tests for build systems: CMake, Make, Ninja"""
 
+import json
 import os
+import subprocess
 import pytest
 
 from unittest.mock import MagicMock, patch
 
 
+from amphimixis.core.build_systems import (
+    compiler_cache,
+    ninja_log,
+    peak_memory,
+    time_trace,
+)
 from amphimixis.core.build_systems.cmake import CMake
 from amphimixis.core.build_systems.make import Make
 from amphimixis.core.build_systems.ninja import Ninja
 from amphimixis.core.general import (
     Arch,
     Build,
+    CompilerCache,
+    CompilerCacheStats,
     CompilerFlags,
     CompilerFlagsAttrs,
     MachineInfo,
     Project,
+    TargetTime,
+    TimeTraceSummary,
     Toolchain,
     ToolchainAttrs,
 )
@@ -31,6 +43,11 @@ def remote_machine():
     return MachineInfo(Arch.X86, "192.168.1.100", None)
 
 
+@pytest.fixture(autouse=True)
+def build_logs_in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
 @pytest.fixture
 def mock_project(tmp_path):
     return Project(path=str(tmp_path))
@@ -48,9 +65,22 @@ def mock_shell():
     shell_mock.get_source_dir.return_value = "/mock/source"
     shell_mock.connect.return_value = shell_mock
     shell_mock.run.return_value = (0, [["4"]], [[""]])
+    shell_mock.execute.return_value = (1, [], ["No such file or directory"])
+    shell_mock.machine_profile.return_value.gnu_time = False
     return shell_mock
 
 
+def execute_in_bash(command: str) -> tuple[int, list[str], list[str]]:
+    result = subprocess.run(
+        ["bash", "-c", command], capture_output=True, text=True, check=False
+    )
+    return (
+        result.returncode,
+        result.stdout.splitlines(keepends=True),
+        result.stderr.splitlines(keepends=True),
+    )
+
+
 @pytest.mark.unit
 class TestMake:
     """Tests for Make build system"""
@@ -410,10 +440,11 @@ class TestCMake:
         assert "CMAKE_BUILD_TYPE=Release" in combined_output
 
     def test_cmake_and_build_steps(self, cmake_system, mock_shell):
-        mock_shell.run.side_effect = [
-            (0, [["Configuring..."]], [[""]]),
-            (0, [["Building..."]], [[""]]),
-        ]
+        mock_shell.run.return_value = (
+            0,
+            [[""], ["Configuring..."], ["Building..."]],
+            [],
+        )
 
         build = Build(
             build_machine=MachineInfo(Arch.X86, None, None),
@@ -432,7 +463,42 @@ class TestCMake:
         ):
             cmake_system.build(build)
 
-        assert mock_shell.run.call_count >= 2
+        # the directory is changed in the same call, builds may share the session
+        cd_cmd, conf_cmd, run_cmd = mock_shell.run.call_args.args
+        assert cd_cmd.startswith("cd ")
+        assert conf_cmd.startswith("cmake ")
+        assert run_cmd.startswith("cmake --build")
+
+    def test_build_streams_output_to_build_log(self, cmake_system, mock_shell):
+        def run(*commands, sink=None, pipelined=False, total_timeout=None):
+            if sink is not None:
+                for command in commands:
+                    if not command.startswith("cd "):
+                        sink.write_stdout(f"{command.split()[0]} output\n")
+            return (0, [[] for _ in commands], [[] for _ in commands])
+
+        mock_shell.run.side_effect = run
+        build = Build(
+            build_machine=MachineInfo(Arch.X86, None, None),
+            run_machine=MachineInfo(Arch.X86, None, None),
+            build_name="test",
+            executables=[],
+            toolchain=None,
+            sysroot=None,
+            compiler_flags=None,
+            config_flags=None,
+        )
+
+        with patch(
+            "amphimixis.core.build_systems.cmake.BuildSystem.find_relative_path",
+            return_value=file,
+        ):
+            err, stdout, _ = cmake_system.build(build)
+
+        assert err == 0
+        assert stdout == "cmake output\ncmake output\n"
+        with open("test.buildlog", encoding="UTF-8") as log:
+            assert log.read() == stdout
 
 
 @pytest.mark.unit
@@ -473,3 +539,526 @@ class TestBuildSystemIntegration:
         assert "/custom/gcc" in combined_output
         assert "/custom/g++" in combined_output
         assert "-O3" in combined_output
+
+
+@pytest.mark.unit
+class TestCompilerCache:
+    """Tests for launching compilers through a compiler cache"""
+
+    ccache_before = ["direct_cache_hit\t2\n", "cache_miss\t5\n"]
+    ccache_after = [
+        "direct_cache_hit\t10\n",
+        "preprocessed_cache_hit\t1\n",
+        "cache_miss\t6\n",
+        "cache_size_kibibyte\t300\n",
+    ]
+
+    @pytest.fixture
+    def cache_shell(self, mock_shell):
+        mock_shell.get_home.return_value = "/home/user"
+        mock_shell.execute.side_effect = [
+            (0, self.ccache_before, []),
+            (0, self.ccache_after, []),
+            (1, [], ["No such file or directory"]),
+        ]
+        return mock_shell
+
+    @staticmethod
+    def cached_build(toolchain: Toolchain | None = None) -> Build:
+        return Build(
+            build_machine=MachineInfo(Arch.X86, None, None),
+            run_machine=MachineInfo(Arch.X86, None, None),
+            build_name="cached",
+            executables=[],
+            toolchain=toolchain,
+            sysroot=None,
+            compiler_flags=None,
+            config_flags=None,
+            compiler_cache=CompilerCache.CCACHE,
+        )
+
+    def test_cmake_launches_compilers_through_cache(self, mock_project, cache_shell):
+        build = self.cached_build()
+
+        with (
+            patch(
+                "amphimixis.core.build_systems.cmake.Shell", return_value=cache_shell
+            ),
+            patch(
+                "amphimixis.core.build_systems.cmake.BuildSystem.find_relative_path",
+                return_value=file,
+            ),
+        ):
+            CMake(mock_project, Ninja(mock_project)).build(build)
+
+        _, conf_cmd, run_cmd = cache_shell.run.call_args_list[-1].args
+        cache_env = "CCACHE_DIR=/home/user/amphimixis/compiler_cache/ccache "
+        assert conf_cmd.startswith(cache_env)
+        assert run_cmd.startswith(cache_env)
+        assert "-DCMAKE_C_COMPILER_LAUNCHER=ccache" in conf_cmd
+        assert "-DCMAKE_CXX_COMPILER_LAUNCHER=ccache" in conf_cmd
+        assert build.compiler_cache_stats == CompilerCacheStats(9, 1, 300)
+
+    def test_make_wraps_compilers(self, mock_project, cache_shell):
+        toolchain = Toolchain()
+        toolchain.set(ToolchainAttrs.C_COMPILER, "/custom/gcc")
+        build = self.cached_build(toolchain)
+
+        with (
+            patch("amphimixis.core.build_systems.make.Shell", return_value=cache_shell),
+            patch(
+                "amphimixis.core.build_systems.make.BuildSystem.find_relative_path",
+                return_value=file,
+            ),
+        ):
+            Make(mock_project)._build_install_clean(build, configure=True)
+
+        cd_cmd, command = cache_shell.run.call_args_list[0].args
+        assert cd_cmd.startswith("cd ")
+        assert command.startswith("CCACHE_DIR=")
+        assert command.endswith("CC='ccache /custom/gcc' CXX='ccache g++' ")
+        assert build.compiler_cache_stats == CompilerCacheStats(9, 1, 300)
+
+    def test_sccache_stats(self, mock_shell):
+        mock_shell.get_home.return_value = "/home/user"
+        report = {
+            "stats": {
+                "cache_hits": {"counts": {"C/C++": 7, "Rust": 1}},
+                "cache_misses": {"counts": {"C/C++": 3}},
+            },
+            "cache_size": 2048,
+        }
+        mock_shell.execute.return_value = (0, [json.dumps(report)], [])
+
+        stats = compiler_cache.read_stats(mock_shell, CompilerCache.SCCACHE)
+
+        assert stats == CompilerCacheStats(8, 3, 2)
+        assert mock_shell.execute.call_args.args[0].startswith(
+            "SCCACHE_DIR=/home/user/amphimixis/compiler_cache/sccache sccache"
+        )
+
+    def test_missing_cache_leaves_no_stats(self, mock_shell):
+        mock_shell.get_home.return_value = "/home/user"
+        mock_shell.execute.return_value = (127, [], ["ccache: command not found\n"])
+        build = self.cached_build()
+
+        with compiler_cache.collect_stats(mock_shell, build):
+            pass
+
+        assert build.compiler_cache_stats is None
+
+
+@pytest.mark.unit
+class TestIncrementalBuild:
+    """Tests for reusing the configuration of the previous build"""
+
+    @pytest.fixture
+    def local_shell(self, mock_shell, tmp_path):
+        mock_shell.get_project_workdir.return_value = str(tmp_path)
+        mock_shell.get_source_dir.return_value = str(tmp_path / "source")
+        mock_shell.execute.side_effect = execute_in_bash
+        (tmp_path / "source").mkdir()
+        (tmp_path / "incremental").mkdir()
+        return mock_shell
+
+    @staticmethod
+    def incremental_build(config_flags: str) -> Build:
+        return Build(
+            build_machine=MachineInfo(Arch.X86, None, None),
+            run_machine=MachineInfo(Arch.X86, None, None),
+            build_name="incremental",
+            executables=[],
+            toolchain=None,
+            sysroot=None,
+            compiler_flags=None,
+            config_flags=config_flags,
+            incremental=True,
+        )
+
+    def cmake_build(self, mock_project, shell, build):
+        shell.run.reset_mock()
+        with (
+            patch("amphimixis.core.build_systems.cmake.Shell", return_value=shell),
+            patch(
+                "amphimixis.core.build_systems.cmake.BuildSystem.find_relative_path",
+                return_value="",
+            ),
+        ):
+            CMake(mock_project, Ninja(mock_project)).build(build)
+        cd_cmd, *commands = shell.run.call_args_list[-1].args
+        assert cd_cmd.startswith("cd ")
+        return commands
+
+    def make_build(self, mock_project, shell, build):
+        shell.run.reset_mock()
+        with (
+            patch("amphimixis.core.build_systems.make.Shell", return_value=shell),
+            patch(
+                "amphimixis.core.build_systems.make.BuildSystem.find_relative_path",
+                return_value="",
+            ),
+        ):
+            Make(mock_project)._build_install_clean(build, configure=True)
+        assert all(call.args[0].startswith("cd ") for call in shell.run.call_args_list)
+        return [call.args[1:] for call in shell.run.call_args_list]
+
+    def test_cmake_skips_configuring(self, mock_project, local_shell, tmp_path):
+        build = self.incremental_build("-DOPTION=ON")
+
+        commands = self.cmake_build(mock_project, local_shell, build)
+        assert len(commands) == 2
+        assert build.rebuild_reason == "no configuration of a previous build"
+
+        commands = self.cmake_build(mock_project, local_shell, build)
+        assert len(commands) == 2
+        assert build.rebuild_reason == "CMakeCache.txt is missing"
+
+        (tmp_path / "incremental" / "CMakeCache.txt").touch()
+        commands = self.cmake_build(mock_project, local_shell, build)
+        assert len(commands) == 1
+        assert commands[0].startswith("cmake --build")
+        assert build.rebuild_reason is None
+
+        build.config_flags = "-DOPTION=OFF"
+        commands = self.cmake_build(mock_project, local_shell, build)
+        assert len(commands) == 2
+        assert build.rebuild_reason == "configuration changed"
+
+    def test_cmake_failed_build_configures_again(self, mock_project, local_shell):
+        build = self.incremental_build("-DOPTION=ON")
+        local_shell.run.side_effect = lambda *commands, **_: (1, [[""]], [[""]])
+
+        self.cmake_build(mock_project, local_shell, build)
+        commands = self.cmake_build(mock_project, local_shell, build)
+
+        assert len(commands) == 2
+
+    def test_make_keeps_objects(self, mock_project, local_shell):
+        build = self.incremental_build("all")
+
+        runs = self.make_build(mock_project, local_shell, build)
+        assert runs[0][0] == "make clean || true"
+        assert "make clean" not in runs[-1]
+        assert build.rebuild_reason == "no configuration of a previous build"
+
+        runs = self.make_build(mock_project, local_shell, build)
+        assert runs[0][0].startswith("make all")
+        assert "make clean" not in runs[-1]
+        assert build.rebuild_reason is None
+
+        build.config_flags = "other"
+        runs = self.make_build(mock_project, local_shell, build)
+        assert runs[0][0] == "make clean || true"
+        assert build.rebuild_reason == "configuration changed"
+
+    def test_make_cleans_without_incremental(self, mock_project, local_shell):
+        build = self.incremental_build("all")
+        build.incremental = False
+
+        runs = self.make_build(mock_project, local_shell, build)
+
+        assert runs[0][0].startswith("make all")
+        assert runs[-1][-1] == "make clean"
+        assert build.rebuild_reason is None
+
+
+@pytest.mark.unit
+class TestNinjaLog:
+    """Tests for reading building times from the Ninja log"""
+
+    log = [
+        "# ninja log v5\n",
+        "0\t900\t1\told.o\taaa\n",
+        "0\t100\t1\ta.c.o\t111\n",
+        "100\t150\t1\tc.c.o\t333\n",
+        "0\t300\t1\tb.c.o\t222\n",
+        "300\t500\t1\tlib.a\t444\n",
+        "300\t500\t1\tlib.h\t444\n",
+        "500\t700\t1\tmain\t555\n",
+    ]
+
+    def test_parse_keeps_last_building(self):
+        targets = ninja_log.parse(self.log)
+
+        assert [target.target for target in targets] == [
+            "a.c.o",
+            "c.c.o",
+            "b.c.o",
+            "lib.a lib.h",
+            "main",
+        ]
+        assert targets[3] == TargetTime("lib.a lib.h", 300, 500)
+        assert targets[3].duration_ms == 200
+
+    def test_parse_keeps_edge_finishing_after_later_start(self):
+        log = [
+            "0\t300\t1\ta.o\t111\n",
+            "300\t500\t1\tc.o\t333\n",
+            "0\t900\t1\tb.o\t222\n",
+            "900\t1000\t1\tapp\t555\n",
+        ]
+
+        assert [target.target for target in ninja_log.parse(log)] == [
+            "a.o",
+            "c.o",
+            "b.o",
+            "app",
+        ]
+
+    def test_parse_lists_outputs_of_edge_once(self):
+        log = [
+            "0\t100\t1\tlib.a\t444\n",
+            "0\t100\t1\tlib.h\t444\n",
+            "0\t100\t1\tlib.a\t444\n",
+        ]
+
+        assert ninja_log.parse(log) == [TargetTime("lib.a lib.h", 0, 100)]
+
+    def test_parse_skips_malformed_lines(self):
+        log = [
+            "0\t100\t1\ta.c.o\t111\n",
+            "x\t200\t1\tb.c.o\t222\n",
+            "100\t300\t1\tc.c.o\n",
+            "\n",
+            "100\t300\t1\tmain\t555\n",
+        ]
+
+        assert [target.target for target in ninja_log.parse(log)] == ["a.c.o", "main"]
+
+    def test_critical_path(self):
+        path = ninja_log.critical_path(ninja_log.parse(self.log))
+
+        assert [target.target for target in path] == ["b.c.o", "lib.a lib.h", "main"]
+        assert ninja_log.critical_path([]) == []
+
+    def test_slowest_translation_units(self):
+        units = ninja_log.slowest_translation_units(ninja_log.parse(self.log), 2)
+
+        assert [target.target for target in units] == ["b.c.o", "a.c.o"]
+
+    def test_chrome_trace_puts_parallel_edges_on_lanes(self):
+        trace = ninja_log.chrome_trace(ninja_log.parse(self.log))
+
+        lanes = {event["name"]: event["tid"] for event in trace["traceEvents"]}
+        assert lanes == {
+            "a.c.o": 0,
+            "b.c.o": 1,
+            "c.c.o": 0,
+            "lib.a lib.h": 0,
+            "main": 0,
+        }
+        assert trace["traceEvents"][0]["dur"] == 100000
+
+    def test_collect_saves_report_and_trace(self, mock_shell, tmp_path):
+        build = TestCompilerCache.cached_build()
+        mock_shell.execute.return_value = (0, self.log, [])
+
+        ninja_log.collect(mock_shell, build, "/mock/builds/cached")
+
+        assert (
+            mock_shell.execute.call_args.args[0] == "cat /mock/builds/cached/.ninja_log"
+        )
+        assert build.target_times is not None
+        assert len(build.target_times) == 5
+        report = (tmp_path / "cached.buildtimes").read_text()
+        assert "Critical path: 0.700 s" in report
+        assert "0.300 s  b.c.o" in report
+        trace = json.loads((tmp_path / "cached.buildtrace.json").read_text())
+        assert len(trace["traceEvents"]) == 5
+
+    def test_collect_without_log(self, mock_shell, tmp_path):
+        build = TestCompilerCache.cached_build()
+
+        ninja_log.collect(mock_shell, build, "/mock/builds/cached")
+
+        assert build.target_times is None
+        assert not (tmp_path / "cached.buildtimes").exists()
+
+
+@pytest.mark.unit
+class TestTimeTrace:
+    """Tests for merging clang time traces"""
+
+    @staticmethod
+    def trace(*events: tuple[str, int, str | None]) -> dict:
+        return {
+            "traceEvents": [
+                {
+                    "ph": "X",
+                    "name": name,
+                    "dur": duration,
+                    "args": {} if detail is None else {"detail": detail},
+                }
+                for name, duration, detail in events
+            ],
+            "beginningOfTime": 1,
+        }
+
+    @staticmethod
+    def clang_build(toolchain: Toolchain | None = None) -> Build:
+        return Build(
+            build_machine=MachineInfo(Arch.X86, None, None),
+            run_machine=MachineInfo(Arch.X86, None, None),
+            build_name="traced",
+            executables=[],
+            toolchain=toolchain,
+            sysroot=None,
+            compiler_flags=None,
+            config_flags=None,
+            time_trace=True,
+        )
+
+    def test_is_clang(self):
+        clang = Toolchain()
+        clang.set(ToolchainAttrs.CXX_COMPILER, "/opt/llvm/bin/clang++-18")
+        gcc = Toolchain()
+        gcc.set(ToolchainAttrs.CXX_COMPILER, "/usr/bin/riscv64-linux-gnu-g++")
+
+        assert time_trace.is_clang(clang)
+        assert not time_trace.is_clang(gcc)
+        assert not time_trace.is_clang(None)
+
+    def test_add_flags(self):
+        flags = CompilerFlags()
+        flags.set(CompilerFlagsAttrs.CXX_FLAGS, "-O2")
+
+        flags = time_trace.add_flags(time_trace.add_flags(flags))
+
+        assert flags.get(CompilerFlagsAttrs.CXX_FLAGS) == "-O2 -ftime-trace"
+        assert flags.get(CompilerFlagsAttrs.C_FLAGS) == "-ftime-trace"
+        assert time_trace.add_flags(None).data == {
+            CompilerFlagsAttrs.C_FLAGS: "-ftime-trace",
+            CompilerFlagsAttrs.CXX_FLAGS: "-ftime-trace",
+        }
+
+    def test_summarize(self):
+        traces = [
+            self.trace(
+                ("Frontend", 3000, None),
+                ("Source", 2000, "vector"),
+                ("Source", 500, "map"),
+                ("InstantiateClass", 700, "std::vector<int>"),
+                ("Backend", 1000, None),
+                ("Total Frontend", 3000, None),
+            ),
+            self.trace(
+                ("Frontend", 1000, None),
+                ("Source", 400, "map"),
+                ("InstantiateFunction", 100, "std::sort<int *>"),
+                ("Backend", 4000, None),
+            ),
+        ]
+
+        summary = time_trace.summarize(traces, count=1)
+
+        assert summary == TimeTraceSummary(
+            translation_units=2,
+            frontend_ms=4,
+            backend_ms=5,
+            headers={"vector": 2},
+            templates={"std::vector<int>": 0.7},
+        )
+
+    def test_collect_merges_and_removes_traces(self, mock_shell, tmp_path):
+        objects = tmp_path / "objects" / "CMakeFiles"
+        objects.mkdir(parents=True)
+        for name, duration in (("a.cpp.json", 1000), ("b.cpp.json", 2000)):
+            (objects / name).write_text(
+                json.dumps(self.trace(("Frontend", duration, None)))
+            )
+        (objects / "compile_commands.json").write_text("[]")
+        mock_shell.execute.side_effect = execute_in_bash
+        build = self.clang_build()
+
+        time_trace.collect(mock_shell, build, str(tmp_path / "objects"), remove=True)
+
+        assert build.time_trace_summary is not None
+        assert build.time_trace_summary.translation_units == 2
+        assert build.time_trace_summary.frontend_ms == 3
+        assert "Frontend: 0.003 s" in (tmp_path / "traced.timetrace").read_text()
+        assert sorted(path.name for path in objects.iterdir()) == [
+            "compile_commands.json"
+        ]
+
+    def test_collect_without_traces(self, mock_shell, tmp_path):
+        mock_shell.execute.side_effect = execute_in_bash
+        build = self.clang_build()
+
+        time_trace.collect(mock_shell, build, str(tmp_path))
+
+        assert build.time_trace_summary is None
+        assert not (tmp_path / "traced.timetrace").exists()
+
+    def test_cmake_collects_from_build_folder(self, mock_project, mock_shell):
+        build = self.clang_build()
+
+        with (
+            patch("amphimixis.core.build_systems.cmake.Shell", return_value=mock_shell),
+            patch(
+                "amphimixis.core.build_systems.cmake.BuildSystem.find_relative_path",
+                return_value=file,
+            ),
+        ):
+            CMake(mock_project, Make(mock_project)).build(build)
+
+        command = mock_shell.execute.call_args.args[0]
+        assert command.startswith("find /mock/builds/project_build/traced ")
+
+
+@pytest.mark.unit
+class TestPeakMemory:
+    """Tests for measuring the memory used by building"""
+
+    def test_measure_with_gnu_time(self, mock_shell):
+        mock_shell.machine_profile.return_value.gnu_time = True
+
+        command = peak_memory.measure(mock_shell, "CCACHE_DIR=/c make", "/b")
+
+        assert command == (
+            "/usr/bin/time -f %M -o /b/.amphimixis_peak_memory_kb env CCACHE_DIR=/c make"
+        )
+
+    def test_measure_without_gnu_time(self, mock_shell):
+        assert peak_memory.measure(mock_shell, "make", "/b") == "make"
+
+    def test_read(self, mock_shell, tmp_path):
+        mock_shell.execute.side_effect = execute_in_bash
+        (tmp_path / ".amphimixis_peak_memory_kb").write_text(
+            "Command exited with non-zero status 2\n123456\n"
+        )
+
+        assert peak_memory.read(mock_shell, str(tmp_path)) == 123456
+
+        peak_memory.forget(mock_shell, str(tmp_path))
+
+        assert peak_memory.read(mock_shell, str(tmp_path)) is None
+
+    def test_oom_killed(self, tmp_path):
+        log = tmp_path / "build.buildlog"
+        log.write_text("c++: fatal error: Killed signal terminated program cc1plus\n")
+
+        assert peak_memory.oom_killed(str(log))
+
+        log.write_text("main.c:1: error: expected ';'\n")
+
+        assert not peak_memory.oom_killed(str(log))
+        assert not peak_memory.oom_killed(str(tmp_path / "missing"))
+
+    def test_cmake_measures_building(self, mock_project, mock_shell):
+        mock_shell.machine_profile.return_value.gnu_time = True
+        build = TestCompilerCache.cached_build()
+        build.compiler_cache = None
+
+        with (
+            patch("amphimixis.core.build_systems.cmake.Shell", return_value=mock_shell),
+            patch(
+                "amphimixis.core.build_systems.cmake.BuildSystem.find_relative_path",
+                return_value=file,
+            ),
+        ):
+            CMake(mock_project, Make(mock_project)).build(build)
+
+        _, conf_cmd, run_cmd = mock_shell.run.call_args_list[-1].args
+        assert conf_cmd.startswith("cmake ")
+        assert run_cmd.startswith("/usr/bin/time -f %M -o ")
+        assert "env cmake --build" in run_cmd
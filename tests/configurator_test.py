@@ -8,7 +8,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 import amphimixis.core.configurator as configurator
-from amphimixis.core.general import Arch, Project
+from amphimixis.core.general import Arch, CompilerCache, Project, TransferMethod
 
 
 @pytest.mark.unit
@@ -37,6 +37,7 @@ class TestConfiguratorWithTestData:
         """Mock Shell.connect for remote machines to avoid connection errors"""
         mock_shell = MagicMock()
         mock_shell.run.return_value = (0, [["riscv64"]], [])
+        mock_shell.machine_profile.return_value.arch = "riscv64"
         mock_shell.connect.return_value = mock_shell
 
         with patch("amphimixis.core.configurator.Shell") as mock_shell_class:
@@ -128,6 +129,44 @@ class TestConfiguratorWithTestData:
         build1 = project.builds[0]
         assert build1.jobs == 3
 
+    def test_parse_config_recipe_timeouts(self, temp_project_dir, mock_shell_remote):
+        """Test that recipe timeouts are correctly parsed
+        Expect: Build has timeouts of the recipe, None if they are not set"""
+        project = Project(temp_project_dir)
+
+        configurator.parse_config(project, self.TEST_CONFIG_FILE)
+
+        build1, build2 = project.builds
+        assert build1.build_timeout == 3600
+        assert build1.run_timeout == 60
+        assert build2.build_timeout is None
+        assert build2.run_timeout is None
+
+    def test_parse_config_recipe_compiler_cache(
+        self, temp_project_dir, mock_shell_remote
+    ):
+        """Test that recipe compiler cache is correctly parsed
+        Expect: Build has the compiler cache of the recipe, None if it is not set"""
+        project = Project(temp_project_dir)
+
+        configurator.parse_config(project, self.TEST_CONFIG_FILE)
+
+        build1, build2 = project.builds
+        assert build1.compiler_cache == CompilerCache.CCACHE
+        assert build2.compiler_cache is None
+
+    def test_parse_config_platform_transfer(self, temp_project_dir, mock_shell_remote):
+        """Test that platform transfer method is correctly parsed
+        Expect: Machine has the transfer method of the platform, rsync if it is not set
+        """
+        project = Project(temp_project_dir)
+
+        configurator.parse_config(project, self.TEST_CONFIG_FILE)
+
+        build2 = project.builds[1]
+        assert build2.build_machine.transfer == TransferMethod.RSYNC
+        assert build2.run_machine.transfer == TransferMethod.SFTP
+
     def test_parse_config_executables(self, temp_project_dir, mock_shell_remote):
         """Test that executables are correctly parsed
         Expect: Builds have correct executables list"""
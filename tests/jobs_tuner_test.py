@@ -0,0 +1,143 @@
+"""Tests for choosing the number of building jobs"""
+
+import pytest
+
+from amphimixis.core.build_registry import BuildRegistry
+from amphimixis.core.general import (
+    Arch,
+    Build,
+    BuildResources,
+    CompilerCache,
+    CompilerCacheStats,
+    MachineInfo,
+    Project,
+)
+from amphimixis.core.jobs_tuner import JobsTuner
+
+GIB = 1024 * 1024
+
+
+@pytest.fixture(autouse=True)
+def registry_in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def built(seconds: float | None = 60.0, jobs: int = 4) -> Build:
+    build = Build(
+        build_machine=MachineInfo(Arch.X86, None, None),
+        run_machine=MachineInfo(Arch.X86, None, None),
+        build_name="release",
+        executables=[],
+        toolchain=None,
+        sysroot=None,
+        compiler_flags=None,
+        config_flags=None,
+        jobs=jobs,
+    )
+    build.resources = BuildResources(jobs, seconds, 2 * GIB)
+    return build
+
+
+@pytest.mark.unit
+class TestTune:
+    """Tests for JobsTuner.tune"""
+
+    @pytest.mark.parametrize(
+        "nproc, available_kb, concurrent, expected",
+        [
+            (64, 256 * GIB, 1, 64),
+            (64, 256 * GIB, 4, 16),
+            (4, 2 * GIB, 1, 2),
+            (4, 2 * GIB, 2, 1),
+            (4, 0, 1, 4),
+            (1, 512, 3, 1),
+        ],
+    )
+    def test_processors_and_memory(self, nproc, available_kb, concurrent, expected):
+        assert JobsTuner.tune(nproc, available_kb, concurrent, []) == expected
+
+    def test_memory_of_previous_buildings(self):
+        history = [BuildResources(8, 100.0, 3 * GIB)]
+
+        assert JobsTuner.tune(32, 32 * GIB, 1, history) == 8
+
+    def test_out_of_memory_halves_jobs(self):
+        history = [BuildResources(8, None, None, oom_killed=True)]
+
+        assert JobsTuner.tune(16, 64 * GIB, 1, history) == 4
+
+    def test_fewer_jobs_that_were_faster(self):
+        history = [BuildResources(16, 100.0), BuildResources(8, 90.0)]
+
+        assert JobsTuner.tune(16, 0, 1, history) == 8
+
+    def test_more_jobs_are_tried(self):
+        history = [BuildResources(8, 90.0)]
+
+        assert JobsTuner.tune(16, 0, 1, history) == 16
+
+
+@pytest.mark.unit
+class TestHistory:
+    """Tests for the resources of buildings remembered by the registry"""
+
+    def test_remember(self):
+        BuildRegistry.remember(built(60.0))
+
+        assert JobsTuner.history("release") == [BuildResources(4, 60.0, 2 * GIB)]
+        assert JobsTuner.history("debug") == []
+
+    def test_history_is_limited(self):
+        for seconds in range(15):
+            BuildRegistry.remember(built(float(seconds)))
+
+        history = JobsTuner.history("release")
+        assert len(history) == 10
+        assert history[-1].seconds == 14.0
+
+    def test_time_of_reused_work_is_not_remembered(self):
+        failed = built()
+        failed.successfully_built = False
+        incremental = built()
+        incremental.incremental = True
+        cached = built()
+        cached.compiler_cache = CompilerCache.CCACHE
+        cached.compiler_cache_stats = CompilerCacheStats(hits=3, misses=1)
+
+        for build in (failed, incremental, cached):
+            BuildRegistry.remember(build)
+
+        assert [record.seconds for record in JobsTuner.history("release")] == [
+            None,
+            None,
+            None,
+        ]
+
+    def test_skipped_build_is_not_remembered(self):
+        build = built()
+        build.resources = None
+
+        BuildRegistry.remember(build)
+
+        assert JobsTuner.history("release") == []
+
+
+@pytest.mark.unit
+class TestChooseJobs:
+    """Tests for JobsTuner.choose_jobs"""
+
+    def test_choose_jobs(self, mocker):
+        shell = mocker.patch("amphimixis.core.jobs_tuner.Shell")
+        connected = shell.return_value.connect.return_value
+        connected.machine_profile.return_value.nproc = 8
+        connected.execute.return_value = (0, [f"{3 * GIB}\n"], [])
+        build = built()
+        build.jobs = None
+
+        assert JobsTuner.choose_jobs(Project(path="/mock"), build, 1) == 3
+
+    def test_unreachable_machine(self, mocker):
+        shell = mocker.patch("amphimixis.core.jobs_tuner.Shell")
+        shell.return_value.connect.side_effect = OSError("unreachable")
+
+        assert JobsTuner.choose_jobs(Project(path="/mock"), built(), 1) is None
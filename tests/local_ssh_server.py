@@ -0,0 +1,372 @@
+"""Local SSH server running real `bash` for tests of the remote shell without Docker.
+
+Tests get it with the `ssh_server` fixture imported from this module.
+"""
+
+import contextlib
+import errno
+import os
+import shutil
+import socket
+import subprocess
+import threading
+from collections.abc import Callable, Iterator
+from typing import IO, Any
+
+import paramiko
+import pytest
+from paramiko.common import (
+    AUTH_FAILED,
+    AUTH_SUCCESSFUL,
+    OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED,
+    OPEN_SUCCEEDED,
+)
+from paramiko.sftp import SFTP_OK
+
+import amphimixis.core as amphimixis
+
+SSH_USER = "amphimixis"
+SSH_PASSWORD = "amphimixis"
+_READ_CHUNK_SIZE = 32768
+# seconds to set up a connection or a channel on a loaded machine
+_SETUP_TIMEOUT = 60
+
+
+class _SSHServerInterface(paramiko.ServerInterface):
+    """Accept the password of `SSH_USER` and record the requests of session channels.
+
+    Commands are not started here: an exception would kill the transport,
+    and the reply to the request would race with their output.
+    `LocalSSHServer` starts them once the channel is accepted, see `wait_request`.
+    """
+
+    def __init__(self) -> None:
+        self._requests: dict[int, list[str] | None] = {}
+        self._requested = threading.Condition()
+
+    def get_allowed_auths(self, username: str) -> str:
+        return "password"
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        if username == SSH_USER and password == SSH_PASSWORD:
+            return AUTH_SUCCESSFUL
+        return AUTH_FAILED
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        if kind == "session":
+            return OPEN_SUCCEEDED
+        return OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, *args: Any) -> bool:
+        return True
+
+    def check_channel_shell_request(self, channel: paramiko.Channel) -> bool:
+        self._record(channel, ["bash", "--noprofile", "--norc"])
+        return True
+
+    def check_channel_exec_request(
+        self, channel: paramiko.Channel, command: bytes
+    ) -> bool:
+        self._record(channel, ["bash", "-c", command.decode("UTF-8")])
+        return True
+
+    def check_channel_subsystem_request(
+        self, channel: paramiko.Channel, name: str
+    ) -> bool:
+        # the subsystem is served by paramiko, there is no command to start
+        self._record(channel, None)
+        return super().check_channel_subsystem_request(channel, name)
+
+    def wait_request(self, channel: paramiko.Channel) -> list[str] | None:
+        """Wait for the shell or exec request of the channel.
+
+        :return: arguments of the command, None for a subsystem
+            or if there is no request in `_SETUP_TIMEOUT` seconds
+        """
+        with self._requested:
+            self._requested.wait_for(
+                lambda: channel.get_id() in self._requests, _SETUP_TIMEOUT
+            )
+            return self._requests.pop(channel.get_id(), None)
+
+    def _record(self, channel: paramiko.Channel, args: list[str] | None) -> None:
+        with self._requested:
+            self._requests[channel.get_id()] = args
+            self._requested.notify_all()
+
+
+def _serve_process(channel: paramiko.Channel, args: list[str], home: str) -> None:
+    try:
+        # pylint: disable-next=consider-using-with
+        process = subprocess.Popen(
+            args,
+            cwd=home,
+            env=os.environ | {"HOME": home},
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except OSError as e:
+        with contextlib.suppress(OSError):
+            channel.sendall_stderr(f"{e}\n".encode("UTF-8"))
+            channel.send_exit_status(127)
+        channel.close()
+        return
+
+    stdin = threading.Thread(
+        target=_forward_stdin, args=(channel, process), daemon=True
+    )
+    stderr = threading.Thread(
+        target=_forward_output,
+        args=(process.stderr, channel.sendall_stderr),
+        daemon=True,
+    )
+    stdin.start()
+    stderr.start()
+    _forward_output(process.stdout, channel.sendall)
+    stderr.join()
+
+    try:
+        channel.send_exit_status(process.wait())
+    finally:
+        channel.close()
+
+
+def _forward_stdin(channel: paramiko.Channel, process: subprocess.Popen) -> None:
+    try:
+        while data := channel.recv(_READ_CHUNK_SIZE):
+            process.stdin.write(data)  # type: ignore[union-attr]
+            process.stdin.flush()  # type: ignore[union-attr]
+    except OSError:
+        pass
+    finally:
+        with contextlib.suppress(OSError):
+            process.stdin.close()  # type: ignore[union-attr]
+
+
+def _forward_output(stream: Any, send: Any) -> None:
+    try:
+        while data := os.read(stream.fileno(), _READ_CHUNK_SIZE):
+            send(data)
+    except OSError:
+        pass
+    finally:
+        stream.close()
+
+
+def _sftp_error(error: OSError) -> int:
+    return paramiko.SFTPServer.convert_errno(error.errno or errno.EIO)
+
+
+class _SFTPHandle(paramiko.SFTPHandle):
+    def __init__(self, flags: int, path: str, file: IO[bytes]) -> None:
+        super().__init__(flags)
+        self.filename = path
+        self.readfile = self.writefile = file
+
+    def stat(self) -> paramiko.SFTPAttributes | int:
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return _sftp_error(e)
+
+    def chattr(self, attr: paramiko.SFTPAttributes) -> int:
+        try:
+            paramiko.SFTPServer.set_file_attr(self.filename, attr)
+        except OSError as e:
+            return _sftp_error(e)
+        return SFTP_OK
+
+
+class _SFTPServerInterface(paramiko.SFTPServerInterface):
+    """Serve the local file system, relative paths start at the home directory."""
+
+    def __init__(self, server: paramiko.ServerInterface, home: str) -> None:
+        super().__init__(server)
+        self._home = home
+
+    def canonicalize(self, path: str) -> str:
+        return os.path.normpath(os.path.join(self._home, path))
+
+    def list_folder(self, path: str) -> list[paramiko.SFTPAttributes] | int:
+        path = self.canonicalize(path)
+        try:
+            return [
+                paramiko.SFTPAttributes.from_stat(
+                    os.lstat(os.path.join(path, name)), name
+                )
+                for name in os.listdir(path)
+            ]
+        except OSError as e:
+            return _sftp_error(e)
+
+    def stat(self, path: str) -> paramiko.SFTPAttributes | int:
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self.canonicalize(path)))
+        except OSError as e:
+            return _sftp_error(e)
+
+    def lstat(self, path: str) -> paramiko.SFTPAttributes | int:
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self.canonicalize(path)))
+        except OSError as e:
+            return _sftp_error(e)
+
+    def open(
+        self, path: str, flags: int, attr: paramiko.SFTPAttributes
+    ) -> paramiko.SFTPHandle | int:
+        path = self.canonicalize(path)
+        mode = attr.st_mode if attr.st_mode is not None else 0o666
+        try:
+            fd = os.open(path, flags, mode)
+        except OSError as e:
+            return _sftp_error(e)
+
+        if flags & os.O_WRONLY:
+            file_mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            file_mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            file_mode = "rb"
+
+        # closed by the SFTP server with the handle
+        # pylint: disable-next=consider-using-with
+        return _SFTPHandle(flags, path, open(fd, file_mode))
+
+    def remove(self, path: str) -> int:
+        return self._call(os.remove, path)
+
+    def rename(self, oldpath: str, newpath: str) -> int:
+        return self._call(os.rename, oldpath, newpath)
+
+    def posix_rename(self, oldpath: str, newpath: str) -> int:
+        return self._call(os.replace, oldpath, newpath)
+
+    def mkdir(self, path: str, attr: paramiko.SFTPAttributes) -> int:
+        return self._call(os.mkdir, path)
+
+    def rmdir(self, path: str) -> int:
+        return self._call(os.rmdir, path)
+
+    def chattr(self, path: str, attr: paramiko.SFTPAttributes) -> int:
+        return self._call(
+            lambda path: paramiko.SFTPServer.set_file_attr(path, attr), path
+        )
+
+    def symlink(self, target_path: str, path: str) -> int:
+        return self._call(lambda path: os.symlink(target_path, path), path)
+
+    def readlink(self, path: str) -> str | int:
+        try:
+            return os.readlink(self.canonicalize(path))
+        except OSError as e:
+            return _sftp_error(e)
+
+    def _call(self, function: Callable[..., Any], *paths: str) -> int:
+        try:
+            function(*(self.canonicalize(path) for path in paths))
+        except OSError as e:
+            return _sftp_error(e)
+        return SFTP_OK
+
+
+class LocalSSHServer:
+    """SSH server in the current process, commands run as the current user.
+
+    Connect to it with `machine`. Commands and SFTP paths start
+    at the home directory, which is `$HOME` of the commands.
+
+    :param str home: home directory of `SSH_USER`
+    """
+
+    _host_keys: list[paramiko.RSAKey] = []
+
+    def __init__(self, home: str) -> None:
+        if not LocalSSHServer._host_keys:  # generating a key takes a while
+            LocalSSHServer._host_keys.append(paramiko.RSAKey.generate(2048))
+
+        self.home = home
+        self._socket = socket.create_server(("127.0.0.1", 0))
+        self._transports: list[paramiko.Transport] = []
+        self._lock = threading.Lock()
+        self._acceptor = threading.Thread(target=self._accept, daemon=True)
+        self._acceptor.start()
+
+    @property
+    def machine(self) -> amphimixis.general.MachineInfo:
+        """Machine to connect to the server, files are copied over SFTP."""
+        return amphimixis.general.MachineInfo(
+            amphimixis.general.Arch.X86,
+            "127.0.0.1",
+            amphimixis.general.MachineAuthenticationInfo(
+                SSH_USER, SSH_PASSWORD, self._socket.getsockname()[1]
+            ),
+            transfer=amphimixis.general.TransferMethod.SFTP,
+        )
+
+    def close(self) -> None:
+        """Stop accepting connections and close the open ones."""
+        self._socket.close()
+        with self._lock:
+            transports = list(self._transports)
+        for transport in transports:
+            transport.close()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                return
+
+            # a slow negotiation must not keep the next client waiting
+            threading.Thread(
+                target=self._serve_connection, args=(connection,), daemon=True
+            ).start()
+
+    def _serve_connection(self, connection: socket.socket) -> None:
+        # like `sshd` does for interactive sessions
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        transport = paramiko.Transport(connection)
+        transport.banner_timeout = _SETUP_TIMEOUT
+        transport.handshake_timeout = _SETUP_TIMEOUT
+        transport.auth_timeout = _SETUP_TIMEOUT
+        transport.add_server_key(self._host_keys[0])
+        transport.set_subsystem_handler(
+            "sftp", paramiko.SFTPServer, _SFTPServerInterface, self.home
+        )
+        with self._lock:
+            self._transports.append(transport)
+
+        server = _SSHServerInterface()
+        try:
+            # returns once the keys are exchanged, the client authenticates next
+            transport.start_server(server=server)
+        except (paramiko.SSHException, EOFError):
+            transport.close()
+            return
+
+        while transport.is_active():
+            channel = transport.accept(timeout=1)
+            if channel is not None:
+                threading.Thread(
+                    target=self._serve_channel, args=(server, channel), daemon=True
+                ).start()
+
+    def _serve_channel(
+        self, server: _SSHServerInterface, channel: paramiko.Channel
+    ) -> None:
+        args = server.wait_request(channel)
+        if args is not None:
+            _serve_process(channel, args, self.home)
+
+
+@pytest.fixture
+def ssh_server(tmp_path) -> Iterator[LocalSSHServer]:
+    """SSH server with a temporary home directory."""
+    home = tmp_path / "home"
+    home.mkdir()
+    server = LocalSSHServer(str(home))
+    yield server
+    server.close()
+    shutil.rmtree(home, ignore_errors=True)
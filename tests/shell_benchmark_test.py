@@ -0,0 +1,161 @@
+"""Throughput of `Shell` with `_LocalShellHandler` and with `_ParamikoHandler`
+connected to the local SSH server of `local_ssh_server.py`.
+
+They depend on the speed of the machine, so they run only when asked
+with `pytest -m benchmark`, and CI does not run them.
+Measurements are printed at the end of the session.
+The asserted floors only catch regressions of an order of magnitude.
+"""
+
+import os
+import time
+
+import pytest
+from local_ssh_server import ssh_server  # noqa: F401 pylint: disable=unused-import
+
+import amphimixis.core as amphimixis
+from amphimixis.core.shell.session_pool import SessionPool
+from amphimixis.core.shell.shell import Shell
+
+pytestmark = pytest.mark.benchmark
+
+project = amphimixis.general.Project("/tmp/amphimixis", [])  # type: ignore
+local_machine = amphimixis.general.MachineInfo(amphimixis.general.Arch.X86, None, None)
+
+COMMANDS = 200
+LINES = 200_000
+FILE_SIZE = 16 * 1024 * 1024
+SMALL_FILES = 200
+MIB = 1024 * 1024
+
+
+class _BenchmarkReport:
+    """Plugin printing the recorded measurements at the end of the session."""
+
+    def __init__(self) -> None:
+        self.results: list[tuple[str, float, str]] = []
+
+    def pytest_terminal_summary(self, terminalreporter) -> None:
+        if not self.results:
+            return
+
+        terminalreporter.section("benchmarks")
+        for nodeid, value, unit in self.results:
+            terminalreporter.write_line(f"{value:>14,.1f} {unit:<12} {nodeid}")
+
+
+_report = _BenchmarkReport()
+
+
+@pytest.fixture
+def record_benchmark(request, record_property):
+    """Record a measurement, all of them are printed at the end of the session."""
+    if not request.config.pluginmanager.is_registered(_report):
+        request.config.pluginmanager.register(_report)
+
+    def record(value: float, unit: str) -> None:
+        _report.results.append((request.node.nodeid, value, unit))
+        record_property(unit, value)
+
+    return record
+
+
+@pytest.fixture(autouse=True)
+def only_when_asked(request):
+    if "benchmark" not in request.config.getoption("markexpr"):
+        pytest.skip("benchmarks run with `pytest -m benchmark`")
+
+
+@pytest.fixture(params=["local", "ssh"])
+def shell(request, ssh_server):
+    if request.param == "local":
+        # the session of the handler is measured, not a process per command
+        shell = Shell(project, local_machine, direct_local=False)
+    else:
+        shell = Shell(project, ssh_server.machine)
+
+    yield shell.connect()
+    SessionPool.close_all()
+
+
+@pytest.fixture
+def remote_dir(shell, ssh_server, tmp_path):
+    if shell.machine.address is None:
+        path = tmp_path / "remote"
+        path.mkdir()
+        return str(path)
+    return ssh_server.home
+
+
+def measure(function, *args) -> float:
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def test_run_commands_per_second(shell, record_benchmark):
+    shell.run("true")  # warm up
+
+    elapsed = measure(lambda: [shell.run("true") for _ in range(COMMANDS)])
+
+    record_benchmark(COMMANDS / elapsed, "commands/s")
+    assert COMMANDS / elapsed > 100
+
+
+def test_pipelined_commands_per_second(shell, record_benchmark):
+    result = []
+
+    elapsed = measure(
+        lambda: result.append(shell.run(*["true"] * COMMANDS, pipelined=True))
+    )
+
+    assert result[0][0] == 0
+    record_benchmark(COMMANDS / elapsed, "commands/s")
+    assert COMMANDS / elapsed > 100
+
+
+def test_output_lines_per_second(shell, record_benchmark):
+    result = []
+
+    elapsed = measure(lambda: result.append(shell.run(f"seq 1 {LINES}")))
+
+    assert len(result[0][1][0]) == LINES
+    record_benchmark(LINES / elapsed, "lines/s")
+    assert LINES / elapsed > 20_000
+
+
+def test_copy_to_remote_bandwidth(shell, remote_dir, tmp_path, record_benchmark):
+    source = tmp_path / "file.bin"
+    source.write_bytes(os.urandom(FILE_SIZE))
+
+    elapsed = measure(shell.copy_to_remote, str(source), f"{remote_dir}/file.bin")
+
+    assert os.path.getsize(f"{remote_dir}/file.bin") == FILE_SIZE
+    record_benchmark(FILE_SIZE / MIB / elapsed, "MiB/s")
+    assert FILE_SIZE / MIB / elapsed > 2
+
+
+def test_copy_to_host_bandwidth(shell, remote_dir, tmp_path, record_benchmark):
+    with open(f"{remote_dir}/file.bin", "wb") as file:
+        file.write(os.urandom(FILE_SIZE))
+
+    elapsed = measure(
+        shell.copy_to_host, f"{remote_dir}/file.bin", str(tmp_path / "file.bin")
+    )
+
+    assert os.path.getsize(tmp_path / "file.bin") == FILE_SIZE
+    record_benchmark(FILE_SIZE / MIB / elapsed, "MiB/s")
+    assert FILE_SIZE / MIB / elapsed > 2
+
+
+def test_copy_small_files_per_second(shell, remote_dir, tmp_path, record_benchmark):
+    source = tmp_path / "files"
+    source.mkdir()
+    for index in range(SMALL_FILES):
+        (source / f"{index}.txt").write_bytes(os.urandom(4096))
+
+    elapsed = measure(shell.copy_to_remote, str(source), f"{remote_dir}/files")
+
+    assert len(os.listdir(f"{remote_dir}/files")) == SMALL_FILES
+    record_benchmark(SMALL_FILES / elapsed, "files/s")
+    assert SMALL_FILES / elapsed > 20
@@ -1,28 +1,96 @@
 # pylint: skip-file
+import ast
+import asyncio
+import csv
+import io
+import json
 import os
 import shlex
+import shutil
 import socket
 import subprocess
 import sys
+import tarfile
 import threading
+import time
 from ctypes import ArgumentError
 
+import paramiko
 import pytest
+from local_ssh_server import ssh_server  # noqa: F401 pylint: disable=unused-import
 
 import amphimixis.core as amphimixis
 from amphimixis.core.general import constants
-from amphimixis.core.shell.shell import Shell
+from amphimixis.core.general.tools import sync_manifest_filename
+from amphimixis.core.shell import agent
+from amphimixis.core.shell.agent_client import (
+    AGENT_DIRECTORY,
+    AgentClient,
+    AgentPool,
+    _AgentRunner,
+    agent_path,
+    start_agent,
+)
+from amphimixis.core.shell.async_shell import AsyncShell
+from amphimixis.core.shell.local_shell_handler import (
+    _LocalCommandPipe,
+    _LocalShellHandler,
+)
+from amphimixis.core.shell.machine_profile import (
+    MachineProfile,
+    parse_probe_output,
+    probe_command,
+)
+from amphimixis.core.shell.machine_transfer import copy_between_machines
+from amphimixis.core.shell.metrics import (
+    MetricKind,
+    ShellMetric,
+    ShellMetrics,
+    host_size,
+    rsync_transferred_size,
+)
+from amphimixis.core.shell.output_sink import OutputSink
+from amphimixis.core.shell.paramiko_shell_handler import (
+    _ChannelLineReader,
+    _ParamikoHandler,
+    _wrap_command,
+)
+from amphimixis.core.shell.session_pool import SessionPool
+from amphimixis.core.shell import TransferMethod
+from amphimixis.core.shell.sftp_transfer import SftpTransfer, sftp_path
+from amphimixis.core.shell.shell import TIMEOUT_EXIT_CODE, Shell
+from amphimixis.core.shell.shell_interface import IShellHandler
+from amphimixis.core.shell.source_sync import sync_directory
+from amphimixis.core.shell.watchdog import Watchdog
 
 project = amphimixis.general.Project("/tmp/amphimixis", [])  # type: ignore
 READING_BARRIER_STDOUT = 'echo "\nREADING_BARRIER_FLAG:$?"'
 READING_BARRIER_STDERR = 'echo "\nREADING_BARRIER_FLAG">&2'
+RSYNC_STATS = (
+    "Number of files: 3 (reg: 2, dir: 1)\n"
+    "Total file size: 9,999,999 bytes\n"
+    "Total transferred file size: 1,234,567 bytes\n"
+)
 
 
-class FakeHandler:
+class FakeHandler(IShellHandler):
     def __init__(self, stdout_lines=None, stderr_lines=None):
         self.stdout_lines = list(stdout_lines or [])
         self.stderr_lines = list(stderr_lines or [])
         self.commands = []
+        self.alive = True
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def exec_command(self, command, cwd=None, env=None):
+        raise NotImplementedError
+
+    def open_pipe(self, command, cwd=None):
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.alive = False
 
     def run(self, command: str) -> None:
         self.commands.append(command)
@@ -38,7 +106,990 @@ class FakeHandler:
         return ""
 
 
+@pytest.fixture(autouse=True)
+def empty_session_pool():
+    SessionPool.close_all()
+    yield
+    SessionPool.close_all()
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.requested_sizes = []
+
+    def recv(self, size: int) -> bytes:
+        self.requested_sizes.append(size)
+        if self.chunks:
+            return self.chunks.pop(0)
+        return b""
+
+
 @pytest.mark.unit
+class TestChannelLineReader:
+    def test_splits_chunk_into_lines(self):
+        stream = FakeStream([b"first\nsecond\nthird\n"])
+        reader = _ChannelLineReader(stream.recv)
+
+        assert reader.readline() == "first\n"
+        assert reader.readline() == "second\n"
+        assert reader.readline() == "third\n"
+        assert reader.readline() == ""
+        assert all(size > 1 for size in stream.requested_sizes)
+
+    def test_keeps_partial_line_between_chunks(self):
+        stream = FakeStream([b"par", b"tial\nne", b"xt\n"])
+        reader = _ChannelLineReader(stream.recv)
+
+        assert reader.readline() == "partial\n"
+        assert reader.readline() == "next\n"
+
+    def test_returns_tail_without_newline_on_close(self):
+        stream = FakeStream([b"line\ntail"])
+        reader = _ChannelLineReader(stream.recv)
+
+        assert reader.readline() == "line\n"
+        assert reader.readline() == "tail"
+        assert reader.readline() == ""
+
+    def test_decodes_multibyte_char_split_across_chunks(self):
+        encoded = "привет\n".encode("UTF-8")
+        stream = FakeStream([encoded[:3], encoded[3:]])
+        reader = _ChannelLineReader(stream.recv)
+
+        assert reader.readline() == "привет\n"
+
+
+@pytest.mark.unit
+class TestShellMetrics:
+    @pytest.fixture(autouse=True)
+    def empty_metrics(self):
+        ShellMetrics.clear()
+        yield
+        ShellMetrics.clear()
+
+    def metric(self, command):
+        return ShellMetric(
+            kind=MetricKind.RUN,
+            machine="localhost",
+            command=command,
+            started=1.0,
+            latency=0.5,
+            stdout_bytes=3,
+            stdout_lines=1,
+        )
+
+    def test_export_writes_json_and_forgets_metrics(self, tmp_path):
+        ShellMetrics.record(self.metric("echo a"))
+        ShellMetrics.record(self.metric("echo b"))
+        path = tmp_path / "metrics.json"
+
+        assert ShellMetrics.export(str(path))
+
+        rows = json.loads(path.read_text())
+        assert [row["command"] for row in rows] == ["echo a", "echo b"]
+        assert rows[0]["kind"] == "run"
+        assert rows[0]["latency"] == 0.5
+        assert ShellMetrics.metrics() == []
+
+    def test_export_writes_csv_by_extension(self, tmp_path):
+        ShellMetrics.record(self.metric("echo a"))
+        path = tmp_path / "metrics.csv"
+
+        assert ShellMetrics.export(str(path))
+
+        with open(path, encoding="utf-8", newline="") as file:
+            rows = list(csv.DictReader(file))
+        assert len(rows) == 1
+        assert rows[0]["command"] == "echo a"
+        assert rows[0]["stdout_bytes"] == "3"
+
+    def test_export_skips_empty_metrics(self, tmp_path):
+        path = tmp_path / "metrics.json"
+
+        assert not ShellMetrics.export(str(path))
+        assert not path.exists()
+
+    def test_host_size_sums_files_of_folder(self, tmp_path):
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "a").write_bytes(b"x" * 10)
+        (tmp_path / "sub" / "b").write_bytes(b"x" * 5)
+
+        assert host_size(str(tmp_path)) == 15
+        assert host_size(str(tmp_path / "a")) == 10
+        assert host_size(str(tmp_path / "missing")) == 0
+
+    def test_rsync_transferred_size(self):
+        assert rsync_transferred_size(RSYNC_STATS) == 1234567
+        assert rsync_transferred_size("Total transferred file size: 0 bytes\n") == 0
+        assert rsync_transferred_size("") == 0
+
+    def test_run_records_output_size_and_round_trips(self):
+        stdout_lines = ["hello\n", "\n", "READING_BARRIER_FLAG:0\n"]
+        stdout_lines += ["\n", "READING_BARRIER_FLAG:0\n"]
+        handler = FakeHandler(
+            stdout_lines=stdout_lines,
+            stderr_lines=["\n", "READING_BARRIER_FLAG\n"] * 2,
+        )
+        shell = Shell(project, TestShell.local_machine)
+        shell._shell = handler
+
+        shell.run("echo hello", "true")
+
+        (metric,) = ShellMetrics.metrics()
+        assert metric.kind == MetricKind.RUN
+        assert metric.machine == "localhost"
+        assert metric.command == "echo hello\ntrue"
+        assert metric.exit_code == 0
+        assert metric.round_trips == 2
+        assert metric.stdout_lines == 5
+        assert metric.stdout_bytes == sum(len(line) for line in stdout_lines)
+        assert metric.stderr_lines == 4
+
+    def test_pipelined_run_is_one_round_trip(self):
+        shell = Shell(project, TestShell.local_machine)
+        shell._create_local_shell()
+
+        shell.run("echo a", "echo b", "(exit 4)", pipelined=True)
+
+        (metric,) = ShellMetrics.metrics()
+        assert metric.round_trips == 1
+        assert metric.exit_code == 4
+        assert metric.latency > 0
+
+    def test_copy_records_bytes_moved(self, tmp_path):
+        source = tmp_path / "src"
+        source.mkdir()
+        (source / "file").write_bytes(b"x" * 100)
+        destination = tmp_path / "dst"
+        destination.mkdir()
+        shell = Shell(project, TestShell.local_machine)
+
+        assert shell.copy_to_host(str(source), str(destination))
+
+        (metric,) = ShellMetrics.metrics()
+        assert metric.kind == MetricKind.COPY
+        assert metric.command == f"{source} -> {destination}"
+        assert metric.bytes_moved == 100
+        assert metric.round_trips == 0
+
+
+@pytest.mark.unit
+class TestWatchdog:
+    def test_calls_on_timeout_after_the_deadline(self):
+        timed_out = threading.Event()
+
+        with Watchdog(0.05, None, timed_out.set, lambda: None) as watchdog:
+            assert timed_out.wait(5)
+            assert watchdog.expired
+
+    def test_restart_postpones_the_deadline(self):
+        timed_out = threading.Event()
+
+        with Watchdog(0.3, None, timed_out.set, lambda: None) as watchdog:
+            for _ in range(3):
+                time.sleep(0.1)
+                watchdog.restart()
+            assert not timed_out.is_set()
+
+        assert not watchdog.expired
+
+    def test_total_timeout_is_not_restarted(self):
+        timed_out = threading.Event()
+
+        with Watchdog(10, 0.2, timed_out.set, lambda: None) as watchdog:
+            for _ in range(5):
+                time.sleep(0.1)
+                watchdog.restart()
+            assert timed_out.wait(5)
+
+    def test_calls_on_stuck_if_not_cancelled_after_grace_period(self):
+        stuck = threading.Event()
+
+        with Watchdog(0.01, None, lambda: None, stuck.set, grace_period=0.05):
+            assert stuck.wait(5)
+
+    def test_cancel_stops_callbacks(self):
+        timed_out = threading.Event()
+
+        with Watchdog(0.1, None, timed_out.set, lambda: None):
+            pass
+
+        assert not timed_out.wait(0.3)
+
+
+@pytest.mark.unit
+class TestExecute:
+    local_machine = amphimixis.general.MachineInfo(
+        amphimixis.general.Arch.X86, None, None
+    )
+
+    def test_wrap_command_sets_cwd_and_env(self):
+        wrapped = _wrap_command("make -j4", "/tmp/my dir", {"CC": "gcc -O2"})
+
+        assert wrapped == (
+            "bash --noprofile --norc -c "
+            + shlex.quote("cd '/tmp/my dir' && export CC='gcc -O2' && make -j4")
+            + " 0<&-"
+        )
+
+    def test_execute_uses_cwd_and_env(self, tmp_path, mocker):
+        mocker.patch.object(Shell, "set_paranoid", return_value=(-1, True))
+        shell = Shell(project, self.local_machine).connect()
+
+        error, stdout, stderr = shell.execute(
+            'pwd; echo "$GREETING" >&2', cwd=str(tmp_path), env={"GREETING": "hi"}
+        )
+
+        assert error == 0
+        assert stdout == [f"{tmp_path}\n"]
+        assert stderr == ["hi\n"]
+
+    def test_execute_does_not_depend_on_run_state(self, tmp_path, mocker):
+        mocker.patch.object(Shell, "set_paranoid", return_value=(-1, True))
+        shell = Shell(project, self.local_machine).connect()
+
+        shell.run(f"cd {tmp_path}")
+        _, stdout, _ = shell.execute("pwd")
+
+        assert stdout == [f"{os.getcwd()}\n"]
+
+    def test_execute_runs_commands_concurrently(self, mocker):
+        mocker.patch.object(Shell, "set_paranoid", return_value=(-1, True))
+        shell = Shell(project, self.local_machine).connect()
+        results = []
+
+        def sleep_and_echo(i: int):
+            results.append(shell.execute(f"sleep 1; echo {i}; exit {i}"))
+
+        threads = [threading.Thread(target=sleep_and_echo, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=3)
+
+        assert not any(thread.is_alive() for thread in threads)
+        assert sorted(results) == [(i, [f"{i}\n"], []) for i in range(4)]
+
+
+@pytest.mark.unit
+class TestCopyBetweenMachines:
+    local_machine = amphimixis.general.MachineInfo(
+        amphimixis.general.Arch.X86, None, None
+    )
+    remote_machine = amphimixis.general.MachineInfo(
+        amphimixis.general.Arch.X86,
+        "192.0.2.1",
+        amphimixis.general.MachineAuthenticationInfo("user", None, 22),
+    )
+
+    def test_wrap_command_keeps_stdin_for_pipes(self):
+        assert _wrap_command("tar -xf -", keep_stdin=True) == (
+            "bash --noprofile --norc -c " + shlex.quote("tar -xf -")
+        )
+
+    def test_relays_folders_through_pipes(self, tmp_path, mocker):
+        mocker.patch.object(Shell, "set_paranoid", return_value=(-1, True))
+        source_dir = tmp_path / "builds"
+        (source_dir / "build_a" / "bin").mkdir(parents=True)
+        (source_dir / "build_a" / "bin" / "app").write_text("app")
+        (source_dir / "build_b").mkdir()
+        (source_dir / "build_b" / "lib.so").write_text("lib")
+        (source_dir / "build_c").mkdir()
+        destination_dir = tmp_path / "run" / "builds"
+
+        assert copy_between_machines(
+            Shell(project, self.local_machine),
+            str(source_dir),
+            ["build_a", "build_b"],
+            Shell(project, self.local_machine),
+            str(destination_dir),
+        )
+        assert (destination_dir / "build_a" / "bin" / "app").read_text() == "app"
+        assert (destination_dir / "build_b" / "lib.so").read_text() == "lib"
+        assert not (destination_dir / "build_c").exists()
+
+    def test_relay_fails_for_missing_folder(self, tmp_path, mocker):
+        mocker.patch.object(Shell, "set_paranoid", return_value=(-1, True))
+
+        assert not copy_between_machines(
+            Shell(project, self.local_machine),
+            str(tmp_path),
+            ["missing"],
+            Shell(project, self.local_machine),
+            str(tmp_path / "out"),
+        )
+
+    def test_remote_machines_copy_directly(self, mocker):
+        source = Shell(project, self.remote_machine)
+        execute = mocker.patch.object(source, "execute", return_value=(0, [], []))
+        relay = mocker.patch("amphimixis.core.shell.machine_transfer._relay")
+
+        assert copy_between_machines(
+            source, "/src", ["build"], Shell(project, self.remote_machine), "/dst"
+        )
+        command = execute.call_args.args[0]
+        assert command.startswith("set -o pipefail; tar -chf - build | ssh ")
+        assert "user@192.0.2.1" in command
+        assert execute.call_args.kwargs == {"cwd": "/src"}
+        relay.assert_not_called()
+
+    def test_falls_back_to_relay_when_direct_ssh_fails(self, mocker):
+        source = Shell(project, self.remote_machine)
+        mocker.patch.object(source, "execute", return_value=(255, [], ["denied\n"]))
+        relay = mocker.patch(
+            "amphimixis.core.shell.machine_transfer._relay", return_value=True
+        )
+
+        assert copy_between_machines(
+            source, "/src", ["build"], Shell(project, self.remote_machine), "/dst"
+        )
+        relay.assert_called_once()
+
+
+class TestSyncDirectory:
+    remote_machine = amphimixis.general.MachineInfo(
+        amphimixis.general.Arch.X86,
+        "192.0.2.1",
+        amphimixis.general.MachineAuthenticationInfo("user", None, 22),
+    )
+
+    @pytest.fixture
+    def shell(self, tmp_path, monkeypatch, mocker):
+        """Remote shell whose commands are executed locally."""
+        monkeypatch.chdir(tmp_path)
+        handler = _LocalShellHandler()
+        shell = Shell(project, self.remote_machine)
+        mocker.patch.object(shell, "execute", side_effect=handler.exec_command)
+        pipe = mocker.patch.object(shell, "open_pipe", side_effect=handler.open_pipe)
+        yield shell, pipe
+        handler.close()
+
+    @pytest.fixture
+    def source(self, tmp_path):
+        source = tmp_path / "project"
+        (source / "src").mkdir(parents=True)
+        (source / "src" / "main.c").write_text("int main() {}")
+        (source / "CMakeLists.txt").write_text("project(p)")
+        (source / "empty").mkdir()
+        return source
+
+    def test_first_sync_sends_everything(self, shell, source, tmp_path):
+        shell, _ = shell
+        destination = tmp_path / "remote"
+
+        assert sync_directory(shell, str(source), str(destination))
+        assert (
+            destination / "project" / "src" / "main.c"
+        ).read_text() == "int main() {}"
+        assert (destination / "project" / "CMakeLists.txt").exists()
+        assert (destination / "project" / "empty").is_dir()
+        assert os.path.exists(sync_manifest_filename(self.remote_machine))
+
+    def test_second_sync_sends_only_changed_files(
+        self, shell, source, tmp_path, mocker
+    ):
+        shell, pipe = shell
+        destination = tmp_path / "remote"
+        assert sync_directory(shell, str(source), str(destination))
+
+        (source / "src" / "main.c").write_text("int main() { return 1; }")
+        os.utime(source / "CMakeLists.txt")  # touched, but not changed
+        add = mocker.spy(tarfile.TarFile, "add")
+
+        assert sync_directory(shell, str(source), str(destination))
+        assert [call.kwargs["arcname"] for call in add.call_args_list] == [
+            os.path.join("src", "main.c")
+        ]
+        assert pipe.call_count == 2
+        assert (
+            destination / "project" / "src" / "main.c"
+        ).read_text() == "int main() { return 1; }"
+
+    def test_replaced_remote_folder_is_sent_again(self, shell, source, tmp_path):
+        shell, _ = shell
+        destination = tmp_path / "remote"
+        assert sync_directory(shell, str(source), str(destination))
+
+        shutil.rmtree(destination)
+
+        assert sync_directory(shell, str(source), str(destination))
+        assert (destination / "project" / "src" / "main.c").exists()
+
+
+class TestAsyncShell:
+    local_machine = amphimixis.general.MachineInfo(
+        amphimixis.general.Arch.X86, None, None
+    )
+
+    def test_run_collects_output_of_every_command(self, tmp_path):
+        shell = AsyncShell(project, self.local_machine)
+
+        error, stdout, stderr = asyncio.run(
+            shell.run("pwd", 'echo "$NAME" >&2', cwd=str(tmp_path), env={"NAME": "x"})
+        )
+
+        assert error == 0
+        assert stdout == [[f"{tmp_path}\n"], []]
+        assert stderr == [[], ["x\n"]]
+
+    def test_run_stops_after_first_failed_command(self):
+        shell = AsyncShell(project, self.local_machine)
+
+        error, stdout, _ = asyncio.run(shell.run("exit 3", "echo should_not_run"))
+
+        assert error == 3
+        assert stdout == [[]]
+
+    def test_run_commands_concurrently(self):
+        shell = AsyncShell(project, self.local_machine)
+
+        async def run_all():
+            return await asyncio.gather(
+                *(shell.run(f"sleep 1; echo {i}") for i in range(4))
+            )
+
+        results = asyncio.run(asyncio.wait_for(run_all(), timeout=3))
+
+        assert results == [(0, [[f"{i}\n"]], [[]]) for i in range(4)]
+
+    def test_copy_to_remote_copies_local_file(self, tmp_path):
+        source = tmp_path / "source.txt"
+        source.write_text("content")
+        destination = tmp_path / "destination.txt"
+        shell = AsyncShell(project, self.local_machine)
+
+        assert asyncio.run(shell.copy_to_remote(str(source), str(destination)))
+        assert destination.read_text() == "content"
+
+    def test_copy_to_host_uses_remote_source(self, mocker):
+        remote_machine = amphimixis.general.MachineInfo(
+            amphimixis.general.Arch.X86,
+            "example.com",
+            amphimixis.general.MachineAuthenticationInfo("user", None, 2222),
+        )
+        process = mocker.AsyncMock()
+        process.returncode = 0
+        process.communicate.return_value = (RSYNC_STATS.encode(), None)
+        create = mocker.patch(
+            "asyncio.create_subprocess_exec", mocker.AsyncMock(return_value=process)
+        )
+
+        shell = AsyncShell(project, remote_machine, transfer=TransferMethod.RSYNC)
+        assert asyncio.run(shell.copy_to_host("/tmp/src", "/tmp/dst"))
+        assert create.call_args.args[-2:] == ("user@example.com:/tmp/src", "/tmp/dst")
+        assert ShellMetrics.metrics()[-1].bytes_moved == 1234567
+
+
+@pytest.mark.unit
+class FakeSftp:
+    """SFTP client working on a local folder standing for the remote home."""
+
+    def __init__(self, home):
+        self.home = home
+        self.puts = []
+        self.closed = False
+
+    def _path(self, path):
+        return os.path.join(self.home, path)
+
+    def stat(self, path):
+        return paramiko.SFTPAttributes.from_stat(os.stat(self._path(path)))
+
+    def listdir_attr(self, path):
+        return [
+            paramiko.SFTPAttributes.from_stat(
+                os.lstat(os.path.join(self._path(path), name)), name
+            )
+            for name in os.listdir(self._path(path))
+        ]
+
+    def mkdir(self, path):
+        os.mkdir(self._path(path))
+
+    def put(self, local, remote):
+        self.puts.append(remote)
+        shutil.copyfile(local, self._path(remote))
+
+    def get(self, remote, local, prefetch=True):
+        shutil.copyfile(self._path(remote), local)
+
+    def chmod(self, path, mode):
+        os.chmod(self._path(path), mode)
+
+    def utime(self, path, times):
+        os.utime(self._path(path), times)
+
+    def close(self):
+        self.closed = True
+
+
+class TestSftpTransfer:
+    @pytest.fixture
+    def tree(self, tmp_path):
+        source = tmp_path / "src"
+        (source / "sub").mkdir(parents=True)
+        (source / "a.txt").write_text("a")
+        (source / "sub" / "b.txt").write_text("b")
+        home = tmp_path / "home"
+        home.mkdir()
+        return source, home
+
+    def test_sftp_path_strips_home(self):
+        assert sftp_path("~") == "."
+        assert sftp_path("~/dir/file") == "dir/file"
+        assert sftp_path("/abs/path") == "/abs/path"
+
+    def test_upload_folder_without_slash_copies_it_into_destination(self, tree):
+        source, home = tree
+        (home / "dst").mkdir()
+        sftp = FakeSftp(home)
+
+        assert SftpTransfer(lambda: sftp).upload(str(source), "~/dst") is True
+        assert (home / "dst" / "src" / "a.txt").read_text() == "a"
+        assert (home / "dst" / "src" / "sub" / "b.txt").read_text() == "b"
+        assert sftp.closed
+
+    def test_upload_folder_with_slash_creates_path(self, tree):
+        source, home = tree
+
+        transfer = SftpTransfer(lambda: FakeSftp(home))
+        assert transfer.upload(f"{source}/", "~/new/dst") is True
+        assert (home / "new" / "dst" / "a.txt").read_text() == "a"
+        assert (home / "new" / "dst" / "sub" / "b.txt").read_text() == "b"
+
+    def test_upload_skips_unchanged_files(self, tree):
+        source, home = tree
+        sftp = FakeSftp(home)
+        transfer = SftpTransfer(lambda: sftp, workers=1)
+
+        assert transfer.upload(f"{source}/", "dst") is True
+        os.utime(source / "a.txt", (0, 0))
+        sftp.puts.clear()
+
+        assert transfer.upload(f"{source}/", "dst") is True
+        assert sftp.puts == ["dst/a.txt"]
+
+    def test_download_folder_and_file(self, tree, tmp_path):
+        source, home = tree
+        shutil.copytree(source, home / "remote")
+        transfer = SftpTransfer(lambda: FakeSftp(home))
+
+        assert transfer.download("~/remote", str(tmp_path / "out")) is True
+        assert (tmp_path / "out" / "sub" / "b.txt").read_text() == "b"
+
+        assert transfer.download("remote/a.txt", str(tmp_path / "file")) is True
+        assert (tmp_path / "file").read_text() == "a"
+
+    def test_returns_false_when_source_is_missing(self, tree, tmp_path):
+        _, home = tree
+        transfer = SftpTransfer(lambda: FakeSftp(home))
+
+        assert transfer.download("missing", str(tmp_path / "out")) is False
+        assert transfer.upload(str(tmp_path / "missing"), "dst") is False
+
+
+class TestLocalShellHandler:
+    def test_read_streams_keeps_data_after_the_callback_stops(self):
+        handler = _LocalShellHandler()
+        try:
+            handler.run("echo out1; echo err1 >&2; echo stop; echo out2")
+            handler.run("echo stop >&2; echo err2 >&2")
+            stdout, stderr = [], []
+
+            def reader(lines):
+                def read(line):
+                    lines.append(line)
+                    return line == "stop\n"
+
+                return read
+
+            handler.read_streams(reader(stdout), reader(stderr))
+
+            assert stdout == ["out1\n", "stop\n"]
+            assert stderr == ["err1\n", "stop\n"]
+            assert handler.stdout_readline() == "out2\n"
+            assert handler.stderr_readline() == "err2\n"
+        finally:
+            handler.close()
+
+    def test_run_does_not_start_threads(self, mocker):
+        mocker.patch.object(Shell, "set_paranoid", return_value=(-1, True))
+        shell = Shell(project, TestExecute.local_machine).connect()
+        mocker.patch("threading.Thread", side_effect=AssertionError)
+
+        error, stdout, stderr = shell.run("echo out; echo err >&2", "false")
+
+        assert error == 1
+        assert stdout == [["out\n"], []]
+        assert stderr == [["err\n"], []]
+
+
+class TestDirectRun:
+    def test_keeps_working_directory_and_exported_variables(self, tmp_path):
+        shell = Shell(project, TestExecute.local_machine).connect()
+
+        shell.run(f"cd {tmp_path}", "export BUILD_TYPE=Release; LOCAL=1")
+        error, stdout, _ = shell.run('pwd; echo "$BUILD_TYPE:$LOCAL"')
+
+        assert error == 0
+        assert stdout == [[f"{tmp_path}\n", "Release:\n"]]
+
+    def test_exit_keeps_previous_state(self, tmp_path):
+        shell = Shell(project, TestExecute.local_machine).connect()
+        shell.run(f"cd {tmp_path}")
+
+        error, _, _ = shell.run("cd / && exit 3")
+        assert error == 3
+
+        _, stdout, _ = shell.run("pwd")
+        assert stdout == [[f"{tmp_path}\n"]]
+
+    def test_collects_output_without_trailing_newline(self):
+        shell = Shell(project, TestExecute.local_machine).connect()
+
+        error, stdout, stderr = shell.run("printf 'a\\nb'; printf err >&2", "cat")
+
+        assert error == 0
+        assert stdout == [["a\n", "b"], []]
+        assert stderr == [["err"], []]
+
+    def test_does_not_wait_for_background_jobs(self):
+        shell = Shell(project, TestExecute.local_machine).connect()
+        started = time.monotonic()
+
+        error, stdout, _ = shell.run("sleep 30 & echo $!")
+
+        assert error == 0
+        assert time.monotonic() - started < 10
+        shell.run(f"kill {stdout[0][0].strip()}")
+
+    def test_shells_run_at_the_same_time(self):
+        shells = [Shell(project, TestExecute.local_machine).connect() for _ in range(2)]
+        threads = [
+            threading.Thread(target=shell.run, args=("sleep 1",)) for shell in shells
+        ]
+        started = time.monotonic()
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert time.monotonic() - started < 1.9
+
+
+class TestAgent:
+    @pytest.fixture
+    def client(self):
+        client = AgentClient(_LocalCommandPipe(f"exec python3 -u {agent.__file__}"))
+        yield client
+        client.close()
+
+    def test_frames_round_trip(self):
+        frames = agent.encode_frame(
+            {"op": "out", "id": 1}, b"\0\xff"
+        ) + agent.encode_frame({"op": "exit"})
+        stream = io.BytesIO(frames)
+
+        assert agent.read_frame(stream.read) == ({"op": "out", "id": 1}, b"\0\xff")
+        assert agent.read_frame(stream.read) == ({"op": "exit"}, b"")
+        assert agent.read_frame(stream.read) is None
+
+    def test_parses_on_python_3_7(self):
+        with open(agent.__file__, encoding="UTF-8") as file:
+            ast.parse(file.read(), feature_version=(3, 7))
+
+    def test_close_tolerates_lost_connection(self, client, mocker):
+        close = mocker.patch.object(
+            client._pipe, "close", side_effect=OSError("Socket is closed")
+        )
+
+        client.close()
+
+        close.assert_called_once()
+
+    def test_truncated_frame(self):
+        stream = io.BytesIO(agent.encode_frame({"op": "exit"}, b"data")[:-1])
+
+        with pytest.raises(EOFError):
+            agent.read_frame(stream.read)
+
+    def test_runs_command(self, client):
+        stdout, stderr = bytearray(), bytearray()
+
+        result = client.run(
+            "printf '\\0\\377'; echo err >&2; exit 3", stdout.extend, stderr.extend
+        )
+
+        assert result.exit_code == 3
+        assert bytes(stdout) == b"\0\xff"
+        assert bytes(stderr) == b"err\n"
+        assert result.user_time is not None and result.max_rss_kb
+
+    def test_runs_commands_at_the_same_time(self, client):
+        threads = [
+            threading.Thread(
+                target=client.run, args=("sleep 1", lambda _: None, lambda _: None)
+            )
+            for _ in range(3)
+        ]
+        started = time.monotonic()
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert time.monotonic() - started < 2.5
+
+    def test_kills_command(self, client):
+        started = time.monotonic()
+        killer = threading.Timer(0.5, client.kill, args=(1,))
+        killer.start()
+
+        result = client.run("sleep 30; echo late", lambda _: None, lambda _: None)
+
+        assert result.exit_code == -9
+        assert time.monotonic() - started < 10
+
+    def test_runner_keeps_working_directory_and_exported_variables(
+        self, client, tmp_path
+    ):
+        runner = _AgentRunner(client)
+        lines: list[str] = []
+
+        runner.run(f"cd {tmp_path} && export BUILD_TYPE=Release", print, print)
+        result = runner.run('pwd; echo "$BUILD_TYPE"', lines.append, print)
+
+        assert result.exit_code == 0
+        assert lines == [f"{tmp_path}\n", "Release\n"]
+
+    def test_starts_agent_once(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        handler = _LocalShellHandler()
+
+        for _ in range(2):
+            client = start_agent(handler)
+            assert client.run("true", print, print).exit_code == 0
+            client.close()
+
+        assert os.listdir(tmp_path / AGENT_DIRECTORY) == [
+            os.path.basename(agent_path())
+        ]
+        handler.close()
+
+    def test_direct_run_records_resource_usage(self):
+        ShellMetrics.clear()
+        shell = Shell(project, TestExecute.local_machine).connect()
+
+        shell.run("true")
+
+        metric = ShellMetrics.metrics()[-1]
+        assert metric.user_time is not None and metric.system_time is not None
+        assert metric.max_rss_kb
+        ShellMetrics.clear()
+
+
+class TestLocalSSHServer:
+    @pytest.fixture(autouse=True)
+    def close_sessions(self):
+        yield
+        AgentPool.close_all()
+        # a later server may get the port of this one
+        SessionPool.close_all()
+
+    def test_runs_commands_in_shared_session(self, ssh_server):
+        shell = Shell(project, ssh_server.machine).connect()
+
+        shell.run("cd build_dir 2>/dev/null || mkdir build_dir && cd build_dir")
+        error, stdout, stderr = shell.run("pwd", "echo err >&2; (exit 3)")
+
+        assert error == 3
+        assert stdout == [[f"{ssh_server.home}/build_dir\n"], []]
+        assert stderr == [[], ["err\n"]]
+
+    def test_executes_command(self, ssh_server):
+        shell = Shell(project, ssh_server.machine).connect()
+
+        assert shell.execute("echo $HOME") == (0, [f"{ssh_server.home}\n"], [])
+
+    def test_closes_channel_of_failed_exec(self, ssh_server, mocker):
+        shell = Shell(project, ssh_server.machine).connect()
+        handler = shell._shell
+        assert isinstance(handler, _ParamikoHandler)
+        channels = []
+        open_session = handler._transport.open_session
+
+        def record_session():
+            channels.append(open_session())
+            return channels[-1]
+
+        mocker.patch.object(handler._transport, "open_session", record_session)
+        mocker.patch.object(
+            paramiko.Channel, "exec_command", side_effect=paramiko.SSHException("no")
+        )
+
+        with pytest.raises(OSError):
+            handler.open_exec_channel("true")
+
+        assert channels[0].closed
+
+    def test_pipes_take_exec_channel_slots(self, ssh_server):
+        shell = Shell(project, ssh_server.machine).connect()
+        handler = shell._shell
+        assert isinstance(handler, _ParamikoHandler)
+        handler._exec_channels = threading.BoundedSemaphore(1)
+
+        pipe = handler.open_pipe("cat")
+        assert not handler._exec_channels.acquire(blocking=False)
+        pipe.close()
+        pipe.close()
+
+        assert handler._exec_channels.acquire(blocking=False)
+
+    def test_session_sends_small_writes_at_once(self, ssh_server):
+        shell = Shell(project, ssh_server.machine).connect()
+
+        assert isinstance(shell._shell, _ParamikoHandler)
+        transport = shell._shell.client.get_transport()
+        assert transport is not None
+        assert transport.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+
+    def test_copies_folder_both_ways(self, ssh_server, tmp_path):
+        source = tmp_path / "source"
+        (source / "nested").mkdir(parents=True)
+        (source / "nested" / "file.bin").write_bytes(os.urandom(100_000))
+        shell = Shell(project, ssh_server.machine).connect()
+
+        assert shell.copy_to_remote(str(source), f"{ssh_server.home}/copy")
+        assert shell.copy_to_host(f"{ssh_server.home}/copy", str(tmp_path / "back"))
+
+        assert (tmp_path / "back" / "nested" / "file.bin").read_bytes() == (
+            source / "nested" / "file.bin"
+        ).read_bytes()
+
+    def test_runs_commands_through_agent(self, ssh_server):
+        shell = Shell(project, ssh_server.machine, agent=True).connect()
+
+        shell.run("mkdir -p build_dir && cd build_dir", "export BUILD_TYPE=Release")
+        error, stdout, _ = shell.run('pwd; echo "$BUILD_TYPE"')
+
+        assert isinstance(shell._runner, _AgentRunner)
+        assert error == 0
+        assert stdout == [[f"{ssh_server.home}/build_dir\n", "Release\n"]]
+
+    def test_agent_timeout_kills_command(self, ssh_server):
+        shell = Shell(project, ssh_server.machine, agent=True).connect()
+        started = time.monotonic()
+
+        error, stdout, _ = shell.run("sleep 60 && echo late", timeout=1)
+
+        assert error == TIMEOUT_EXIT_CODE
+        assert stdout == [[]]
+        # killed well before the command would end, even on a loaded machine
+        assert time.monotonic() - started < 30
+
+
+class TestMachineProfile:
+    remote_machine = amphimixis.general.MachineInfo(
+        amphimixis.general.Arch.X86,
+        "192.0.2.1",
+        amphimixis.general.MachineAuthenticationInfo("user", None, 22),
+    )
+    probe_output = [
+        "boot_id=b00t\n",
+        "home=/home/user\n",
+        "arch=riscv64\n",
+        "nproc=4\n",
+        "mem_total_kb=8000000\n",
+        "cpu_model= SiFive U74\n",
+        "perf_event_paranoid=2\n",
+        "gnu_time=1\n",
+        "perf_version=perf version 6.1\n",
+        "perf_archive=1\n",
+        "perf_events=cycles instructions cpu-clock\n",
+    ]
+
+    @pytest.fixture(autouse=True)
+    def in_tmp_path(self, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+
+    def test_parse_probe_output(self):
+        profile = parse_probe_output(self.probe_output)
+
+        assert profile == MachineProfile(
+            boot_id="b00t",
+            home="/home/user",
+            arch="riscv64",
+            nproc=4,
+            mem_total_kb=8000000,
+            cpu_model="SiFive U74",
+            perf_event_paranoid=2,
+            perf_version="perf version 6.1",
+            perf_archive=True,
+            perf_events=["cycles", "instructions", "cpu-clock"],
+            gnu_time=True,
+        )
+
+    def test_parse_probe_output_without_perf(self):
+        profile = parse_probe_output(self.probe_output[:7])
+
+        assert profile.perf_version is None
+        assert not profile.perf_archive
+        assert profile.perf_events == []
+        assert not profile.gnu_time
+
+    def test_parse_probe_output_raises_when_incomplete(self):
+        with pytest.raises(ValueError):
+            parse_probe_output(["boot_id=b00t\n"])
+
+    def test_probe_runs_locally(self):
+        profile = parse_probe_output(
+            subprocess.run(
+                ["bash", "-c", probe_command()], capture_output=True, text=True
+            ).stdout.splitlines()
+        )
+
+        assert profile.home == os.path.expanduser("~")
+        assert profile.nproc == os.cpu_count()
+        assert profile.boot_id != ""
+
+    def test_profile_is_cached_until_reboot(self, mocker):
+        shell = Shell(project, self.remote_machine)
+        execute = mocker.patch.object(
+            shell, "execute", return_value=(0, self.probe_output, [])
+        )
+        assert shell.machine_profile().arch == "riscv64"
+
+        shell = Shell(project, self.remote_machine)
+        execute = mocker.patch.object(
+            shell, "execute", return_value=(0, ["boot_id=b00t\n"], [])
+        )
+        assert shell.machine_profile().nproc == 4
+        assert '[ "$boot_id" = b00t ]' in execute.call_args.args[0]
+
+        shell = Shell(project, self.remote_machine)
+        rebooted = ["boot_id=other\n"] + self.probe_output[1:3]
+        mocker.patch.object(shell, "execute", return_value=(0, rebooted, []))
+        assert shell.machine_profile().nproc == 1
+
+    def test_ensure_paranoid_sets_level_once_per_boot(self, mocker):
+        shell = Shell(project, self.remote_machine)
+        mocker.patch.object(shell, "execute", return_value=(0, self.probe_output, []))
+        set_paranoid = mocker.patch.object(
+            shell, "set_paranoid", return_value=(-1, True)
+        )
+        assert shell.ensure_paranoid(-1)
+        set_paranoid.assert_called_once_with(-1)
+
+        shell = Shell(project, self.remote_machine)
+        mocker.patch.object(shell, "execute", return_value=(0, ["boot_id=b00t\n"], []))
+        set_paranoid = mocker.patch.object(shell, "set_paranoid")
+        assert shell.ensure_paranoid(-1)
+        set_paranoid.assert_not_called()
+
+
 class TestShell:
     local_machine = amphimixis.general.MachineInfo(
         amphimixis.general.Arch.X86, None, None
@@ -102,6 +1153,25 @@ class TestShell:
             READING_BARRIER_STDERR,
         ]
 
+    def test_run_streams_lines_to_sink(self, tmp_path):
+        handler = FakeHandler(
+            stdout_lines=["hello\n", "world\n", "\n", "READING_BARRIER_FLAG:0\n"],
+            stderr_lines=["warn\n", "\n", "READING_BARRIER_FLAG\n"],
+        )
+        shell = Shell(project, self.local_machine)
+        shell._shell = handler
+        log_path = tmp_path / "build.log"
+
+        with OutputSink(str(log_path), tail_lines=1) as sink:
+            error, stdout, stderr = shell.run("echo test", sink=sink)
+
+        assert error == 0
+        assert stdout == [[]]
+        assert stderr == [[]]
+        assert sink.stdout_tail == "world\n"
+        assert sink.stderr_tail == "warn\n"
+        assert sorted(log_path.read_text().splitlines()) == ["hello", "warn", "world"]
+
     def test_run_stops_after_first_failed_command(self):
         handler = FakeHandler(
             stdout_lines=["\n", "READING_BARRIER_FLAG:7\n"],
@@ -121,6 +1191,85 @@ class TestShell:
             READING_BARRIER_STDERR,
         ]
 
+    def test_pipelined_run_splits_output_by_command(self, tmp_path):
+        shell = Shell(project, self.local_machine)
+        shell._create_local_shell()
+
+        error, stdout, stderr = shell.run(
+            f"cd {tmp_path}",
+            "pwd; echo err >&2",
+            "printf 'no newline'",
+            pipelined=True,
+        )
+
+        assert error == 0
+        assert stdout == [[], [f"{tmp_path}\n"], ["no newline"]]
+        assert stderr == [[], ["err\n"], []]
+
+    def test_pipelined_run_stops_after_first_failed_command(self):
+        shell = Shell(project, self.local_machine)
+        shell._create_local_shell()
+
+        error, stdout, stderr = shell.run(
+            "echo first", "(exit 5)", "echo should_not_run", pipelined=True
+        )
+
+        assert error == 5
+        assert stdout == [["first\n"], []]
+        assert stderr == [[], []]
+
+        error, stdout, _ = shell.run("echo again", "true", pipelined=True)
+        assert error == 0
+        assert stdout == [["again\n"], []]
+
+    @pytest.mark.parametrize("direct", [True, False])
+    def test_run_kills_command_on_timeout(self, tmp_path, direct):
+        shell = Shell(project, self.local_machine, direct_local=direct).connect()
+        started = time.monotonic()
+
+        error, stdout, _ = shell.run(
+            f"(sleep 30; touch {tmp_path}/child) & sleep 30 && echo late",
+            "echo should_not_run",
+            timeout=0.5,
+        )
+
+        assert error == TIMEOUT_EXIT_CODE
+        assert stdout == [[]]
+        assert time.monotonic() - started < 10
+        error, stdout, _ = shell.run("echo alive")
+        assert error == 0
+        assert stdout == [["alive\n"]]
+        # the class does not match the command line of `bash` running the pattern
+        error, stdout, _ = shell.run(f"pgrep -f 'touch {tmp_path}/chil[d]'")
+        assert error == 1
+
+    @pytest.mark.parametrize("direct", [True, False])
+    def test_pipelined_run_kills_batch_on_total_timeout(self, direct):
+        shell = Shell(project, self.local_machine, direct_local=direct).connect()
+
+        error, stdout, _ = shell.run(
+            "echo first",
+            "sleep 30",
+            "echo should_not_run",
+            pipelined=True,
+            total_timeout=0.5,
+        )
+
+        assert error == TIMEOUT_EXIT_CODE
+        assert stdout[0] == ["first\n"]
+        error, stdout, _ = shell.run("echo alive", "true", pipelined=True)
+        assert error == 0
+        assert stdout == [["alive\n"], []]
+
+    @pytest.mark.parametrize("direct", [True, False])
+    def test_run_within_timeout_keeps_exit_code(self, direct):
+        shell = Shell(project, self.local_machine, direct_local=direct).connect()
+
+        error, stdout, _ = shell.run("echo fast", "(exit 3)", timeout=10)
+
+        assert error == 3
+        assert stdout == [["fast\n"], []]
+
     def test_run_drains_real_stderr_pipe_without_deadlock(self):
         shell = Shell(project, self.local_machine)
         shell._create_local_shell()
@@ -176,7 +1325,35 @@ class TestShell:
         assert shell._shell is handler
         assert shell._is_local is True
         local_factory.assert_called_once_with()
-        paranoid.assert_called_once_with(-1)
+        paranoid.assert_not_called()
+
+    def test_connect_reuses_session_of_the_same_machine(self, mocker):
+        handler = FakeHandler()
+        local_factory = mocker.patch(
+            "amphimixis.core.shell.shell._LocalShellHandler", return_value=handler
+        )
+        paranoid = mocker.patch.object(Shell, "set_paranoid", return_value=(-1, True))
+
+        first = Shell(project, self.local_machine).connect()
+        second = Shell(project, self.local_machine).connect()
+
+        assert first._shell is second._shell is handler
+        local_factory.assert_called_once_with()
+        paranoid.assert_not_called()
+
+    def test_connect_replaces_dead_session(self, mocker):
+        dead, alive = FakeHandler(), FakeHandler()
+        mocker.patch(
+            "amphimixis.core.shell.shell._LocalShellHandler",
+            side_effect=[dead, alive],
+        )
+        mocker.patch.object(Shell, "set_paranoid", return_value=(-1, True))
+
+        Shell(project, self.local_machine).connect()
+        dead.alive = False
+        shell = Shell(project, self.local_machine).connect()
+
+        assert shell._shell is alive
 
     def test_connect_raises_for_remote_machine_without_auth(self):
         machine = amphimixis.general.MachineInfo(
@@ -205,7 +1382,7 @@ class TestShell:
         assert shell._shell is handler
         assert shell._is_local is False
         remote_factory.assert_called_once_with(self.remote_machine, 33)
-        paranoid.assert_called_once_with(-1)
+        paranoid.assert_not_called()
 
     def test_get_project_workdir_returns_cwd_for_local_machine(self, mocker):
         shell = Shell(project, self.local_machine)
@@ -253,23 +1430,35 @@ class TestShell:
         assert shell.get_home() == "/home/local"
         expanduser.assert_called_once_with("~")
 
-    def test_get_home_reads_remote_home_and_caches_it(self, mocker):
+    def test_get_home_reads_remote_home_and_caches_it(
+        self, mocker, monkeypatch, tmp_path
+    ):
+        monkeypatch.chdir(tmp_path)
         shell = Shell(project, self.remote_machine)
         shell._is_connected = True
         shell._is_local = False
-        run = mocker.patch.object(
-            shell, "run", return_value=(0, [["/home/remote\n"]], [[]])
+        execute = mocker.patch.object(
+            shell,
+            "execute",
+            return_value=(
+                0,
+                ["boot_id=1\n", "home=/home/remote\n", "arch=x86_64\n"],
+                [],
+            ),
         )
 
         assert shell.get_home() == "/home/remote"
         assert shell.get_home() == "/home/remote"
-        run.assert_called_once_with("echo ~")
+        execute.assert_called_once()
 
-    def test_get_home_raises_when_remote_lookup_fails(self, mocker):
+    def test_get_home_raises_when_remote_lookup_fails(
+        self, mocker, monkeypatch, tmp_path
+    ):
+        monkeypatch.chdir(tmp_path)
         shell = Shell(project, self.remote_machine)
         shell._is_connected = True
         shell._is_local = False
-        mocker.patch.object(shell, "run", return_value=(1, [[]], [["boom\n"]]))
+        mocker.patch.object(shell, "execute", return_value=(1, [], ["boom\n"]))
 
         with pytest.raises(RuntimeError):
             shell.get_home()
@@ -282,8 +1471,8 @@ class TestShell:
         copy_local.assert_called_once_with("/tmp/src", "/tmp/dst")
 
     def test_copy_to_remote_formats_remote_destination(self, mocker):
-        shell = Shell(project, self.remote_machine)
-        copy_remote = mocker.patch.object(shell, "_copy_remote", return_value=True)
+        shell = Shell(project, self.remote_machine, transfer=TransferMethod.RSYNC)
+        copy_remote = mocker.patch.object(shell, "_copy_remote", return_value=(True, 0))
 
         assert shell.copy_to_remote("/tmp/src", "/tmp/dst") is True
         copy_remote.assert_called_once_with(
@@ -294,8 +1483,8 @@ class TestShell:
         )
 
     def test_copy_to_host_formats_remote_source(self, mocker):
-        shell = Shell(project, self.remote_machine)
-        copy_remote = mocker.patch.object(shell, "_copy_remote", return_value=True)
+        shell = Shell(project, self.remote_machine, transfer=TransferMethod.RSYNC)
+        copy_remote = mocker.patch.object(shell, "_copy_remote", return_value=(True, 0))
 
         assert shell.copy_to_host("/tmp/src", "/tmp/dst") is True
         copy_remote.assert_called_once_with(
@@ -305,6 +1494,33 @@ class TestShell:
             2222,
         )
 
+    def test_transfer_method_comes_from_machine(self):
+        sftp_machine = amphimixis.general.MachineInfo(
+            amphimixis.general.Arch.X86,
+            "example.com",
+            amphimixis.general.MachineAuthenticationInfo("user", "secret", 2222),
+            transfer=TransferMethod.SFTP,
+        )
+
+        assert Shell(project, self.remote_machine).transfer == TransferMethod.RSYNC
+        assert Shell(project, sftp_machine).transfer == TransferMethod.SFTP
+        assert (
+            Shell(project, sftp_machine, transfer=TransferMethod.RSYNC).transfer
+            == TransferMethod.RSYNC
+        )
+
+    def test_copy_to_remote_uses_sftp_on_pooled_session(self, mocker):
+        shell = Shell(project, self.remote_machine, transfer=TransferMethod.SFTP)
+        handler = mocker.Mock(spec=_ParamikoHandler)
+        shell._shell = handler
+        shell._is_connected = True
+        copy_remote = mocker.patch.object(shell, "_copy_remote")
+        upload = mocker.patch.object(SftpTransfer, "upload", return_value=True)
+
+        assert shell.copy_to_remote("/tmp/src", "/tmp/dst") is True
+        upload.assert_called_once_with("/tmp/src", "/tmp/dst")
+        copy_remote.assert_not_called()
+
     @pytest.mark.parametrize(("return_code", "expected"), [(0, True), (1, False)])
     def test_copy_local_returns_bool_from_cp(self, return_code, expected, mocker):
         shell = Shell(project, self.local_machine)
@@ -317,9 +1533,15 @@ class TestShell:
         self, return_code, expected, mocker
     ):
         shell = Shell(project, self.remote_machine)
-        call = mocker.patch("subprocess.call", return_value=return_code)
+        call = mocker.patch(
+            "subprocess.run",
+            return_value=subprocess.CompletedProcess([], return_code, RSYNC_STATS),
+        )
 
-        assert shell._copy_remote("/tmp/src", "/tmp/dst", "secret", 2222) is expected
+        assert shell._copy_remote("/tmp/src", "/tmp/dst", "secret", 2222) == (
+            expected,
+            1234567 if expected else 0,
+        )
         args = call.call_args.args[0]
         assert args[:4] == ["sshpass", "-p", "secret", "rsync"]
         assert "--checksum" in args
@@ -337,9 +1559,15 @@ class TestShell:
         self, return_code, expected, mocker
     ):
         shell = Shell(project, self.remote_machine)
-        call = mocker.patch("subprocess.call", return_value=return_code)
+        call = mocker.patch(
+            "subprocess.run",
+            return_value=subprocess.CompletedProcess([], return_code, RSYNC_STATS),
+        )
 
-        assert shell._copy_remote("/tmp/src", "/tmp/dst", None, 2222) is expected
+        assert shell._copy_remote("/tmp/src", "/tmp/dst", None, 2222) == (
+            expected,
+            1234567 if expected else 0,
+        )
         args = call.call_args.args[0]
         assert args[:2] == ["sshpass", "rsync"]
         assert "--checksum" in args